@@ -1,9 +1,77 @@
-from AI_expectimax import expectimax_decision
+import time
+import constants as c
+from AI_expectimax import expectimax_decision, SearchTimeout
+from transposition import TranspositionTable
+from search_stats import SearchStats
 
 class AI:
-    def __init__(self):
-        self.depth = 4  # Set the depth for Expectimax
+    def __init__(self, cache_size=200000, cache_replacement='lru', prob_threshold=None, depth=4, max_depth=12, executor=None, stats_sink=None,
+                 opening_book=c.OPENING_BOOK_FILE):
+        self.depth = depth  # Set the depth for Expectimax
+        # With a threshold, chance paths less likely than it are cut off and depth counts player moves
+        self.prob_threshold = prob_threshold
+        # Deepest iteration tried when get_move runs against a time budget
+        self.max_depth = max_depth
+        # Positions stay cached between moves, since consecutive searches overlap. Only values searched at the
+        # same depth are reused, as in the tables of pool workers, so a move is the same with or without an executor
+        self.table = TranspositionTable(cache_size, cache_replacement, exact_depth=True) if cache_size else None
+        self.cache_stats = None
+        # Optional process pool from AI_expectimax.make_executor for parallel root moves
+        self.executor = executor
+        self.last_depth = None  # Depth of the search that produced the last move
+        # Optional callable (for example search_stats.JsonlSink) that receives the stats record of every move
+        self.stats_sink = stats_sink
+        self.last_stats = None
+        # Path of an opening_book file (the one opening_book.py writes by default), or None to always search
+        self.opening_book = opening_book
+        self.book = None  # The OpeningBook, loaded on the first move; False when there is none to use
+        self.book_moves = 0  # Moves taken from the book instead of a search
 
-    def get_move(self, board):
+    def book_move(self, board):
+        """The move the opening book has for ``board``, or None when it has none."""
+        if self.book is None:
+            import opening_book  # The book needs the bitboard tables, which only it uses here
+            # Only a book built with the same heuristics, depth and threshold plays the moves the search would
+            config = opening_book.book_config(self.depth, self.prob_threshold)
+            self.book = opening_book.load_book(self.opening_book, config) or False
+            if self.book:
+                print(f"Using the opening book '{self.opening_book}' ({len(self.book)} positions)")
+        return self.book.move(board) if self.book else None
+
+    def get_move(self, board, time_budget_ms=None):
+        move = self.book_move(board)
+        if move is not None:
+            self.book_moves += 1
+            self.last_depth = self.book.config['depth']
+            return move
+        # Search statistics are only collected when someone receives them
+        stats = SearchStats() if self.stats_sink is not None else None
         # Use Expectimax for decision-making
-        return expectimax_decision(board, self.depth)
+        if time_budget_ms is None:
+            move = expectimax_decision(board, self.depth, self.table, self.prob_threshold, executor=self.executor, stats=stats)
+            self.last_depth = self.depth
+        else:
+            move = self.iterative_deepening(board, time_budget_ms, stats)
+        if self.table is not None:
+            self.cache_stats = self.table.stats()
+        if stats is not None:
+            self.last_stats = stats.record()
+            self.stats_sink(self.last_stats)
+        return move
+
+    def iterative_deepening(self, board, time_budget_ms, stats=None):
+        """Search at depth 1, 2, 3, ... until the budget runs out and return the deepest completed result."""
+        deadline = time.monotonic() + time_budget_ms / 1000
+        # Depth 1 always completes so that there is a move to return
+        move = expectimax_decision(board, 1, self.table, self.prob_threshold, executor=self.executor, stats=stats)
+        self.last_depth = 1
+        for depth in range(2, self.max_depth + 1):
+            if time.monotonic() >= deadline:
+                break
+            try:
+                move = expectimax_decision(board, depth, self.table, self.prob_threshold, deadline, self.executor, stats)
+            except SearchTimeout:
+                break
+            self.last_depth = depth
+        return move
+
@@ -1,6 +1,10 @@
-import copy
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 import constants as c
 import logic
+from transposition import TranspositionTable
+from search_stats import SearchStats
 from AI_heuristicsForExpectimax import AI_Heuristics  # Import your heuristics
 
 # Define commands for movement
@@ -11,20 +15,229 @@ commands = {
     c.KEY_RIGHT: logic.right
 }
 
-# Initialize heuristics
-heuristics = AI_Heuristics()
+# The heuristics load best_weights, so they are created on first use rather than at import
+heuristics = None
 
-def expectimax_decision(board, depth=4):  # Start with depth 4
+def get_heuristics():
+    """The AI_Heuristics of this process, loaded on first use."""
+    global heuristics
+    if heuristics is None:
+        heuristics = AI_Heuristics()
+    return heuristics
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the deadline passed to expectimax_decision expires."""
+
+# Per-process transposition table of pool workers, set up by _init_worker
+_worker_table = None
+
+class SearchSpace:
+    """The packed engine, cache key and leaf evaluation of a search on ``size`` x ``size`` boards.
+
+    The search moves packed boards (bitboards on 4x4) with packed.engine_for(size);
+    list-of-lists boards only come in and go out at expectimax_decision.
+    """
+
+    def __init__(self, size):
+        import packed  # The packed engines (and their row tables) are built on first use
+        self.size = size
+        self.engine = packed.engine_for(size)
+        self.moves = list(self.engine.commands.values())
+        evaluate = get_heuristics().evaluate_unweighted
+        if size != 4:
+            # Packed boards of different sizes can be equal ints, and worker tables outlive a game
+            self.key = lambda board: (size, board)
+        elif evaluate.is_symmetric:
+            # All 8 rotations and reflections of a position have the same value and share a key
+            import symmetry
+            self.key = symmetry.canonical_key
+        else:
+            self.key = lambda board: board
+        # Per-row table lookups; on 4x4 pool workers share the tables when row_tables.bin is mapped
+        self.evaluate = evaluate.for_size(size).evaluate_packed
+
+def make_executor(max_workers=None, cache_size=200000):
+    """Create a persistent process pool for expectimax_decision(executor=...).
+
+    Every worker imports this module (and so loads AI_Heuristics) once, and
+    keeps its own exact-depth transposition table of ``cache_size`` entries.
+    """
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(cache_size,))
+
+def _init_worker(cache_size):
+    global _worker_table
+    _worker_table = TranspositionTable(cache_size, exact_depth=True) if cache_size else None
+
+def _worker_root_move(size, new_board, depth, prob_threshold, deadline, with_stats=False):
+    """Score one root move (a packed board) in a pool worker.
+
+    With ``with_stats`` returns (score, node counts, seconds) instead of the score.
+    """
+    space = SearchSpace(size)
+    stats = SearchStats() if with_stats else None
+    start = time.perf_counter()
+    if prob_threshold is not None:
+        score = expectimax_pruned(new_board, depth - 1, 1.0, False, prob_threshold, None, deadline, stats, space)
+    else:
+        score = expectimax(new_board, depth - 1, False, _worker_table, deadline, stats, space)
+    if stats is None:
+        return score
+    return score, stats.counts(), time.perf_counter() - start
+
+def _worker_spawns(size, new_board, cell, depth, prob_threshold, n_empty, deadline, with_stats=False):
+    """Score the 2 and the 4 spawn on one cell of a root chance node in a pool worker.
+
+    ``cell`` is the lowest bit of the empty cell in the packed board.
+    With ``with_stats`` returns ((score_2, score_4), node counts, seconds) instead of the scores.
+    """
+    space = SearchSpace(size)
+    stats = SearchStats() if with_stats else None
+    start = time.perf_counter()
+    if prob_threshold is not None:
+        score_2 = expectimax_pruned(new_board | cell, depth - 1, 0.9 / n_empty, True, prob_threshold, None, deadline,
+                                    stats, space)
+        score_4 = expectimax_pruned(new_board | (cell << 1), depth - 1, 0.1 / n_empty, True, prob_threshold, None,
+                                    deadline, stats, space)
+    else:
+        score_2 = expectimax(new_board | cell, depth - 2, True, _worker_table, deadline, stats, space)
+        score_4 = expectimax(new_board | (cell << 1), depth - 2, True, _worker_table, deadline, stats, space)
+    if stats is None:
+        return score_2, score_4
+    return (score_2, score_4), stats.counts(), time.perf_counter() - start
+
+def _empty_cells(engine, board):
+    """Lowest bit of every empty cell of a packed board, in row-major order."""
+    empty = engine.empty_mask(board)
+    cells = []
+    while empty:
+        low = empty & -empty
+        cells.append(low)
+        empty ^= low
+    return cells
+
+def _splits_into_spawns(space, new_board, depth, prob_threshold):
+    """Whether the root chance node after a move would be expanded (rather than evaluated)."""
+    if prob_threshold is not None:
+        return 1.0 >= prob_threshold
+    # A root move leaves a board with a legal move, so only a win makes it terminal
+    return depth - 1 > 0 and not space.engine.has_won(new_board)
+
+def _parallel_root_scores(space, board, depth, prob_threshold, deadline, executor, stats=None):
+    """Score the legal root moves on ``executor``, in the same order and with the same sums as the serial search.
+
+    With ``stats`` the workers count their nodes and the root move times are their summed search times.
+    """
+    with_stats = stats is not None
+    root_moves = [(move, new_board) for move, new_board, points in space.engine.legal_moves(board)]
+
+    workers = getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+    split = len(root_moves) < workers
+
+    jobs = []
+    for move, new_board in root_moves:
+        empty_cells = _empty_cells(space.engine, new_board)
+        if split and empty_cells and _splits_into_spawns(space, new_board, depth, prob_threshold):
+            futures = [executor.submit(_worker_spawns, space.size, new_board, cell, depth, prob_threshold,
+                                       len(empty_cells), deadline, with_stats)
+                       for cell in empty_cells]
+            jobs.append((move, futures))
+        else:
+            jobs.append((move, executor.submit(_worker_root_move, space.size, new_board, depth, prob_threshold,
+                                               deadline, with_stats)))
+
+    try:
+        return _collect_root_scores(jobs, stats)
+    except BaseException:
+        # After a timeout (or any error) nothing waits for the other jobs: the queued ones are dropped and
+        # the running ones stop at the same deadline, so the pool is free for the next search
+        for move, job in jobs:
+            for future in (job if isinstance(job, list) else [job]):
+                future.cancel()
+        raise
+
+def _collect_root_scores(jobs, stats):
+    """(move, score) of every job of _parallel_root_scores, waiting for them in order."""
+    with_stats = stats is not None
+    scores = []
+    for move, job in jobs:
+        if isinstance(job, list):
+            # Add the spawn values up in the same order as the chance branch of expectimax
+            score_sum = 0
+            seconds = 0
+            for future in job:
+                result = future.result()
+                if with_stats:
+                    result, counts, spawn_seconds = result
+                    stats.add_counts(counts)
+                    seconds += spawn_seconds
+                score_2, score_4 = result
+                score_sum += 0.9 * score_2
+                score_sum += 0.1 * score_4
+            score = score_sum / len(job)
+        else:
+            score = job.result()
+            if with_stats:
+                score, counts, seconds = score
+                stats.add_counts(counts)
+        if with_stats:
+            stats.root_move(move, score, seconds)
+        scores.append((move, score))
+    return scores
+
+def expectimax_decision(board, depth=4, table=None, prob_threshold=None, deadline=None, executor=None, stats=None):  # Start with depth 4
+    """Return the best move for the list-of-lists ``board``.
+
+    ``table`` is an optional TranspositionTable shared by the whole search;
+    its hit/miss/eviction counters are reset at the start of every call.
+    When ``prob_threshold`` is given the search runs in probability-pruned
+    mode (see expectimax_pruned) and ``depth`` counts player moves only.
+    ``deadline`` is a time.monotonic() value, a clock that pool workers
+    share with this process; once it passes the search
+    is abandoned with SearchTimeout.
+    With an ``executor`` from make_executor the root moves (or, when there are
+    fewer moves than workers, the root spawns) are searched in parallel.
+    The workers use their own exact-depth tables instead of ``table``, and
+    the move is the same as the one of a serial search without a table or
+    with an exact-depth one.
+    ``stats`` is an optional search_stats.SearchStats that receives the node
+    counts and timings of this call as one iteration.
+    """
+    space = SearchSpace(len(board))
+    packed_board = space.engine.to_bitboard(board)
+    if stats is None:
+        return _search_root(space, packed_board, depth, table, prob_threshold, deadline, executor, None)
+    stats.begin_iteration(board)
+    try:
+        move = _search_root(space, packed_board, depth, table, prob_threshold, deadline, executor, stats)
+    except SearchTimeout:
+        stats.end_iteration(depth, completed=False, table=table)
+        raise
+    stats.end_iteration(depth, table=table)
+    return move
+
+def _search_root(space, board, depth, table, prob_threshold, deadline, executor, stats):
     best_move = None
     best_score = -float('inf')
 
-    for move in commands:
-        new_board, done, points = commands[move](board)
-        if not done:
-            continue
+    if executor is not None:
+        for move, score in _parallel_root_scores(space, board, depth, prob_threshold, deadline, executor, stats):
+            if score > best_score:
+                best_score = score
+                best_move = move
+        return best_move
 
-        # Call expectimax with depth-1
-        score = expectimax(new_board, depth - 1, False)
+    if table is not None:
+        table.reset_stats()
+
+    for move, new_board, points in space.engine.legal_moves(board):
+        start = time.perf_counter() if stats is not None else None
+        if prob_threshold is not None:
+            score = expectimax_pruned(new_board, depth - 1, 1.0, False, prob_threshold, table, deadline, stats, space)
+        else:
+            # Call expectimax with depth-1
+            score = expectimax(new_board, depth - 1, False, table, deadline, stats, space)
+        if stats is not None:
+            stats.root_move(move, score, time.perf_counter() - start)
 
         if score > best_score:
             best_score = score
@@ -32,50 +245,145 @@ def expectimax_decision(board, depth=4):  # Start with depth 4
 
     return best_move
 
-def expectimax(board, depth, is_maximizing_player):
-    # Base case: stop when depth is 0 or game is over
-    if depth == 0 or logic.game_state(board) != 'not over':
-        return evaluate_board(board)  # Use the combined heuristic evaluation
+def expectimax(board, depth, is_maximizing_player, table=None, deadline=None, stats=None, space=None):
+    """Expectimax value of a packed ``board`` of ``space``; a list-of-lists board is packed first when ``space`` is None."""
+    if space is None:
+        space = SearchSpace(len(board))
+        board = space.engine.to_bitboard(board)
+    # Base case: stop when depth is 0 or game is over. A lost board has no legal
+    # move and no empty cell, which the player and chance branches find out themselves.
+    if depth == 0 or space.engine.has_won(board):
+        if stats is not None:
+            stats.leaf_evaluations += 1
+        return space.evaluate(board)  # Use the combined heuristic evaluation
+
+    if deadline is not None and time.monotonic() > deadline:
+        raise SearchTimeout()
+
+    if table is not None:
+        key = (space.key(board), is_maximizing_player)
+        cached = table.lookup(key, depth)
+        if cached is not None:
+            return cached
 
     if is_maximizing_player:
         # Maximizing player (AI's turn)
+        if stats is not None:
+            stats.max_nodes += 1
         best_score = -float('inf')
-        for move in commands:
-            new_board, done, points = commands[move](board)
+        for move in space.moves:
+            new_board, done, points = move(board)
             if not done:
                 continue
-            score = expectimax(new_board, depth - 1, False)
+            score = expectimax(new_board, depth - 1, False, table, deadline, stats, space)
             best_score = max(best_score, score)
-        return best_score
+        if best_score == -float('inf'):
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return space.evaluate(board)  # No legal move: the game is lost
     else:
         # Minimizing player (chance node: simulate placing new tiles)
-        empty_cells = logic.get_empty_cells(board)
-        if not empty_cells:
-            return evaluate_board(board)  # No empty cells, evaluate the board
+        empty = space.engine.empty_mask(board)
+        if not empty:
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return space.evaluate(board)  # No empty cells, evaluate the board
+        if stats is not None:
+            stats.chance_nodes += 1
+
+        n_empty = bin(empty).count("1")
+        score_sum = 0
+        while empty:
+            # Lowest bit of the next empty cell: exponent 1 is a '2', exponent 2 a '4'
+            cell = empty & -empty
+            score_sum += 0.9 * expectimax(board | cell, depth - 1, True, table, deadline, stats, space)  # 90% chance of adding a 2
+            score_sum += 0.1 * expectimax(board | (cell << 1), depth - 1, True, table, deadline, stats, space)  # 10% chance of adding a 4
+            empty ^= cell
+
+        best_score = score_sum / n_empty  # Average the score
+
+    if table is not None:
+        table.store(key, depth, best_score)
+    return best_score
+
+def expectimax_pruned(board, depth, probability, is_maximizing_player, prob_threshold, table=None, deadline=None,
+                      stats=None, space=None):
+    """Expectimax where ``depth`` counts player moves and unlikely chance paths are cut off.
+
+    ``probability`` is the cumulative probability of the spawns that led to
+    ``board``; a chance node reached with less than ``prob_threshold`` is
+    scored with the static evaluation instead of being expanded. Boards are
+    packed as in expectimax.
+    """
+    if space is None:
+        space = SearchSpace(len(board))
+        board = space.engine.to_bitboard(board)
+    if is_maximizing_player:
+        if depth == 0 or space.engine.has_won(board):
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return space.evaluate(board)
+    elif probability < prob_threshold:
+        if stats is not None:
+            stats.leaf_evaluations += 1
+        return space.evaluate(board)
+
+    if deadline is not None and time.monotonic() > deadline:
+        raise SearchTimeout()
+
+    if table is not None:
+        # Tagged so that pruned values never mix with full-width ones. Which chance nodes below are cut off
+        # depends on the path probability, so it is part of the key; the paths that lead to one board
+        # through the same spawns in another order multiply up the same probability and still share it.
+        key = (space.key(board), is_maximizing_player, 'pruned', probability)
+        cached = table.lookup(key, depth)
+        if cached is not None:
+            return cached
+
+    if is_maximizing_player:
+        if stats is not None:
+            stats.max_nodes += 1
+        best_score = -float('inf')
+        for move in space.moves:
+            new_board, done, points = move(board)
+            if not done:
+                continue
+            score = expectimax_pruned(new_board, depth - 1, probability, False, prob_threshold, table, deadline, stats,
+                                      space)
+            best_score = max(best_score, score)
+        if best_score == -float('inf'):
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return space.evaluate(board)
+    else:
+        empty = space.engine.empty_mask(board)
+        if not empty:
+            if stats is not None:
+                stats.leaf_evaluations += 1
+            return space.evaluate(board)
+        if stats is not None:
+            stats.chance_nodes += 1
 
+        # Chance layers do not use up depth; only the path probability shrinks
+        n_empty = bin(empty).count("1")
+        probability_2 = probability * 0.9 / n_empty
+        probability_4 = probability * 0.1 / n_empty
         score_sum = 0
-        for cell in empty_cells:
-            # Simulate adding '2' and '4' tiles to the board
-            board_2 = copy.deepcopy(board)
-            board_4 = copy.deepcopy(board)
-            board_2[cell[0]][cell[1]] = 2
-            board_4[cell[0]][cell[1]] = 4
+        while empty:
+            cell = empty & -empty
+            score_sum += 0.9 * expectimax_pruned(board | cell, depth, probability_2, True, prob_threshold, table,
+                                                 deadline, stats, space)
+            score_sum += 0.1 * expectimax_pruned(board | (cell << 1), depth, probability_4, True, prob_threshold,
+                                                 table, deadline, stats, space)
+            empty ^= cell
 
-            # Expectimax for both possibilities
-            score_sum += 0.9 * expectimax(board_2, depth - 1, True)  # 90% chance of adding a 2
-            score_sum += 0.1 * expectimax(board_4, depth - 1, True)  # 10% chance of adding a 4
+        best_score = score_sum / n_empty
 
-        return score_sum / len(empty_cells)  # Average the score
+    if table is not None:
+        table.store(key, depth, best_score)
+    return best_score
 
 def evaluate_board(board):
     """Evaluate the board using the heuristic approach."""
-    # Simply use the heuristics' evaluation on the board matrix
-    score = 0
-    for strategy in heuristics.strategies:
-        strategy_function = heuristics.strategy_functions.get(strategy, None)
-        if strategy_function:
-            score += strategy_function(board)
-    return score
-
-    
- 
\ No newline at end of file
+    # Unweighted sum of the configured heuristics, compiled once by AI_Heuristics
+    return (heuristics or get_heuristics()).evaluate_unweighted(board)
@@ -1,6 +1,5 @@
 import constants as c
 import random
-import numpy as np
 import logic  # Keeping import of logic for actual move commands
 
 # Defining commands dictionary locally to avoid circular import issues
@@ -46,10 +45,7 @@ def heuristic_empty_tile(matrix):
     """Selects the move that maximizes the number of empty tiles."""
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
+    for key, game, _ in logic.legal_moves(matrix):
         n_empty = sum(row.count(0) for row in game)
         if n_empty > best_score:
             best_score = n_empty
@@ -60,13 +56,11 @@ def heuristic_empty_tile(matrix):
 
 def heuristic_monotonicity(matrix):
     """Selects the move that maximizes the monotonicity of rows or columns."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(game[i][j] <= game[i + 1][j] for i in range(c.GRID_LEN - 1) for j in range(c.GRID_LEN))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(game[i][j] <= game[i + 1][j] for i in range(n - 1) for j in range(n))
         if score > best_score:
             best_score = score
             return_key = key
@@ -74,13 +68,11 @@ def heuristic_monotonicity(matrix):
 
 def heuristic_smoothness(matrix):
     """Selects the move that minimizes the difference between neighboring tiles."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(abs(game[i][j] - game[i][j + 1]) for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(abs(game[i][j] - game[i][j + 1]) for i in range(n) for j in range(n - 1))
         if score < best_score or best_score == -1:
             best_score = score
             return_key = key
@@ -89,13 +81,11 @@ def heuristic_smoothness(matrix):
 
 def heuristic_merge_opportunities(matrix):
     """Selects moves that maximize merge opportunities."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(game[i][j] == game[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(game[i][j] == game[i][j + 1] for i in range(n) for j in range(n - 1))
         if score > best_score:
             best_score = score
             return_key = key
@@ -105,10 +95,7 @@ def heuristic_max_score(matrix):
     """Selects moves that maximize the score."""
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, points = commands[key](matrix)
-        if not done:
-            continue
+    for key, game, points in logic.legal_moves(matrix):
         if points > best_score:
             best_score = points
             return_key = key
@@ -116,13 +103,11 @@ def heuristic_max_score(matrix):
 
 def heuristic_max_free_lines(matrix):
     """Selects moves that maximize the number of free lines (rows/columns with zeroes)."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(game[i].count(0) for i in range(c.GRID_LEN))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(game[i].count(0) for i in range(n))
         if score > best_score:
             best_score = score
             return_key = key
@@ -132,13 +117,11 @@ def heuristic_max_free_lines(matrix):
 
 def heuristic_same_row_col(matrix):
     """Prefers moves that keep same tiles in rows or columns for future merges."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(game[i][j] == game[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(game[i][j] == game[i][j + 1] for i in range(n) for j in range(n - 1))
         if score > best_score:
             best_score = score
             return_key = key
@@ -146,13 +129,11 @@ def heuristic_same_row_col(matrix):
 
 def heuristic_tile_grouping(matrix):
     """Selects moves that group similar tiles together."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(game[i][j] == game[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(game[i][j] == game[i][j + 1] for i in range(n) for j in range(n - 1))
         if score > best_score:
             best_score = score
             return_key = key
@@ -162,10 +143,7 @@ def heuristic_avoid_blocking_large_tiles(matrix):
     """Prefers moves that avoid blocking large tiles with small ones."""
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
+    for key, game, _ in logic.legal_moves(matrix):
         max_tile = max(max(row) for row in game)
         if max_tile > best_score:
             best_score = max_tile
@@ -174,13 +152,11 @@ def heuristic_avoid_blocking_large_tiles(matrix):
 
 def heuristic_adjacent_same_tiles(matrix):
     """Selects moves that keep adjacent tiles of the same value together."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(game[i][j] == game[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(game[i][j] == game[i][j + 1] for i in range(n) for j in range(n - 1))
         if score > best_score:
             best_score = score
             return_key = key
@@ -188,14 +164,62 @@ def heuristic_adjacent_same_tiles(matrix):
 
 def heuristic_balance_spread(matrix):
     """Selects moves that balance the spread of tiles across the board."""
+    n = len(matrix)
     best_score = -1
     return_key = None
-    for key in commands.keys():
-        game, done, _ = commands[key](matrix)
-        if not done:
-            continue
-        score = sum(abs(game[i][j] - game[i][j + 1]) for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+    for key, game, _ in logic.legal_moves(matrix):
+        score = sum(abs(game[i][j] - game[i][j + 1]) for i in range(n) for j in range(n - 1))
         if score < best_score or best_score == -1:
             best_score = score
             return_key = key
     return return_key
+
+# Batched versions: score the four moves of a whole batch of games at once.
+# ``new``, ``moved`` and ``points`` are the (4, B, ...) results of batch_engine.all_moves.
+
+def _count_zeros(values):
+    return (values == 0).sum(axis=(2, 3))
+
+def _vertical_monotonicity(values):
+    return (values[:, :, :-1, :] <= values[:, :, 1:, :]).sum(axis=(2, 3))
+
+def _horizontal_difference(values):
+    return abs(values[:, :, :, :-1] - values[:, :, :, 1:]).sum(axis=(2, 3))
+
+def _horizontal_pairs(values):
+    return (values[:, :, :, :-1] == values[:, :, :, 1:]).sum(axis=(2, 3))
+
+# Strategy name -> (score function of (values, points), True if higher scores are better)
+BATCH_STRATEGIES = {
+    "empty_tile": (lambda values, points: _count_zeros(values), True),
+    "monotonicity": (lambda values, points: _vertical_monotonicity(values), True),
+    "smoothness": (lambda values, points: _horizontal_difference(values), False),
+    "merge_opportunities": (lambda values, points: _horizontal_pairs(values), True),
+    "max_score": (lambda values, points: points, True),
+    "max_free_lines": (lambda values, points: _count_zeros(values), True),
+    "same_row_col": (lambda values, points: _horizontal_pairs(values), True),
+    "tile_grouping": (lambda values, points: _horizontal_pairs(values), True),
+    "adjacent_same_tiles": (lambda values, points: _horizontal_pairs(values), True),
+    "balance_spread": (lambda values, points: _horizontal_difference(values), False)
+}
+
+def batch_AI_play(boards, new, moved, points, strategy="empty_tile"):
+    """Batched AI_play: pick a move for every board of a batch_engine.BatchGame step.
+
+    Returns one batch_engine.MOVES index per board, or batch_engine.NO_MOVE when
+    no move changes the board. Ties go to the first move, as in AI_play.
+    """
+    # Only the batched path needs NumPy and the engine's tables
+    import numpy as np
+    import batch_engine
+
+    if strategy not in BATCH_STRATEGIES:
+        choice = np.random.randint(0, 4, size=len(boards))
+    else:
+        score_function, maximize = BATCH_STRATEGIES[strategy]
+        scores = score_function(batch_engine.to_values(new), points).astype(np.float64)
+        if maximize:
+            choice = np.where(moved, scores, -np.inf).argmax(axis=0)
+        else:
+            choice = np.where(moved, scores, np.inf).argmin(axis=0)
+    return np.where(moved.any(axis=0), choice, batch_engine.NO_MOVE)
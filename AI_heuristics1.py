@@ -1,16 +1,19 @@
 import constants as c
-import numpy as np
 import logic
-import pandas as pd
+import results_store
+import evaluator
 
-# تابعی برای خواندن استراتژی‌های برتر از فایل اکسل
+# تابعی برای خواندن استراتژی‌های برتر از فایل نتایج
 def get_top_strategies(n=5):
     """Reads the simulation results and selects the top N strategies."""
-    df = pd.read_excel("top_strategies.xlsx")
-    df_grouped = df.groupby('Strategy').agg({'Max Tile': 'max', 'Avg Score': 'mean'}).reset_index()
-    df_sorted = df_grouped.sort_values(by=['Max Tile', 'Avg Score'], ascending=[False, False])
-    top_strategies = df_sorted.head(n)
-    return top_strategies['Strategy'].values
+    groups = {}
+    for row in results_store.read_rows("top_strategies"):
+        groups.setdefault(row['Strategy'], []).append(row)
+    # Max of 'Max Tile' and mean of 'Avg Score' per strategy, best first
+    summary = [(strategy, max(row['Max Tile'] for row in rows), sum(row['Avg Score'] for row in rows) / len(rows))
+               for strategy, rows in sorted(groups.items())]
+    summary.sort(key=lambda item: (-item[1], -item[2]))
+    return [strategy for strategy, max_tile, avg_score in summary[:n]]
 
 # تعریف دستورات برای حرکت‌ها
 commands = {
@@ -35,41 +38,18 @@ class AI_Heuristics:
         for i, strategy in enumerate(strategies):
             self.heuristic_weights[strategy] = weights[i]
 
+        # همه‌ی هیورستیک‌ها یک بار در یک تابع تک‌گذره کامپایل می‌شوند
+        self.evaluate = evaluator.compile_evaluator(list(self.heuristic_weights), list(self.heuristic_weights.values()),
+                                                    evaluator.WEIGHTED_STRATEGIES)
+
     def get_move(self, matrix):
         best_move = None
         best_score = -float('inf')
 
         # استفاده از استراتژی‌های برتر ذخیره‌شده در کلاس
-        for key in commands:
-            game, done, points = commands[key](matrix)
-            if not done:
-                continue
-
+        for key, game, points in logic.legal_moves(matrix):
             # محاسبه امتیاز وزنی با استفاده از وزن‌ها و تمام هیورستیک‌های انتخاب شده
-            score = 0
-            for strategy, weight in self.heuristic_weights.items():
-                if strategy == "empty_tile":
-                    score += weight * self.heuristic_empty_tile(game)
-                elif strategy == "monotonicity":
-                    score += weight * self.heuristic_monotonicity(game)
-                elif strategy == "smoothness":
-                    score += weight * self.calculate_smoothness(game)
-                elif strategy == "merge_opportunities":
-                    score += weight * self.heuristic_merge_opportunities(game)
-                elif strategy == "max_score":
-                    score += weight * self.heuristic_max_score(game)
-                elif strategy == "max_free_lines":
-                    score += weight * self.heuristic_max_free_lines(game)
-                elif strategy == "same_row_col":
-                    score += weight * self.heuristic_same_row_col(game)
-                elif strategy == "tile_grouping":
-                    score += weight * self.heuristic_tile_grouping(game)
-                elif strategy == "adjacent_same_tiles":
-                    score += weight * self.heuristic_adjacent_same_tiles(game)
-                elif strategy == "balance_spread":
-                    score += weight * self.heuristic_balance_spread(game)
-                else:
-                    score += weight * self.heuristic_random()
+            score = self.evaluate(game)
 
             if score > best_score:
                 best_score = score
@@ -85,31 +65,34 @@ class AI_Heuristics:
 
     def heuristic_monotonicity(self, matrix):
         """Measures the monotonicity of the grid."""
+        n = len(matrix)
         total = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 total += abs(matrix[i][j] - matrix[i][j + 1])
-        for i in range(c.GRID_LEN - 1):
-            for j in range(c.GRID_LEN):
+        for i in range(n - 1):
+            for j in range(n):
                 total += abs(matrix[i][j] - matrix[i + 1][j])
         return -total
 
     def calculate_smoothness(self, matrix):
         """Returns a score that reflects how smooth the board is."""
+        n = len(matrix)
         smoothness = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 smoothness += abs(matrix[i][j] - matrix[i][j + 1])
-        for i in range(c.GRID_LEN - 1):
-            for j in range(c.GRID_LEN):
+        for i in range(n - 1):
+            for j in range(n):
                 smoothness += abs(matrix[i][j] - matrix[i + 1][j])
         return -smoothness
 
     def heuristic_merge_opportunities(self, matrix):
         """Counts the number of possible merges."""
+        n = len(matrix)
         merges = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 if matrix[i][j] == matrix[i][j + 1]:
                     merges += 1
         return merges
@@ -120,39 +103,48 @@ class AI_Heuristics:
 
     def heuristic_max_free_lines(self, matrix):
         """Counts the number of free lines (rows/columns with zeroes)."""
-        return sum(1 for row in matrix if row.count(0) == c.GRID_LEN)
+        return sum(1 for row in matrix if row.count(0) == len(row))
 
     def heuristic_same_row_col(self, matrix):
         """Counts the number of same tiles in the same row or column."""
+        n = len(matrix)
         same_tiles = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 if matrix[i][j] == matrix[i][j + 1]:
                     same_tiles += 1
         return same_tiles
 
     def heuristic_tile_grouping(self, matrix):
         """Counts how many tiles are grouped together."""
+        n = len(matrix)
         groups = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 if matrix[i][j] == matrix[i][j + 1]:
                     groups += 1
         return groups
 
     def heuristic_adjacent_same_tiles(self, matrix):
         """Counts the number of adjacent same tiles."""
+        n = len(matrix)
         adjacent_tiles = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 if matrix[i][j] == matrix[i][j + 1]:
                     adjacent_tiles += 1
         return adjacent_tiles
 
     def heuristic_balance_spread(self, matrix):
         """Measures how balanced the tiles are spread across the board."""
+        n = len(matrix)
         total_spread = 0
-        for i in range(c.GRID_LEN):
+        for i in range(n):
             total_spread += sum(matrix[i])
         return total_spread
 
+# ساخت AI با وزن‌های داده‌شده؛ برای پردازه‌های game_farm قابل pickle است
+def make_weighted_ai(weights, strategies):
+    ai = AI_Heuristics()  # Instantiate the AI class with combined heuristics
+    ai.set_weights(weights, strategies)
+    return ai
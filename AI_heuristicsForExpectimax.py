@@ -2,14 +2,15 @@
 import constants as c
 import logic
 import random
-import pandas as pd
+import results_store
+import evaluator
 
-# Load strategies and weights from Excel
+# Load strategies and weights saved by the weight search
 def load_best_strategies_and_weights():
-    """Loads the top strategies and weights from the Excel file."""
-    df = pd.read_excel("best_weights.xlsx")
-    strategies = df['strategy'].values
-    weights = df['weights'].values
+    """Loads the top strategies and weights from the results store."""
+    rows = results_store.read_rows("best_weights")
+    strategies = [row['strategy'] for row in rows]
+    weights = [row['weights'] for row in rows]
     return strategies, weights
 
 commands = {c.KEY_UP: logic.up,
@@ -36,14 +37,15 @@ class AI_Heuristics:
             'balance_spread': self.heuristic_balance_spread
         }
 
+        # The configured strategies compiled once into single-pass evaluators:
+        # weighted for heuristic_evaluation, and with every weight 1 for expectimax leaves
+        self.evaluate = evaluator.compile_evaluator(self.strategies, self.heuristic_weights,
+                                                    evaluator.EXPECTIMAX_STRATEGIES, skip_unknown=True)
+        self.evaluate_unweighted = evaluator.compile_evaluator(self.strategies, [1] * len(self.strategies),
+                                                               evaluator.EXPECTIMAX_STRATEGIES, skip_unknown=True)
+
     def heuristic_evaluation(self, matrix):
-        total_score = 0
-        for i, strategy in enumerate(self.strategies):
-            heuristic_function = self.strategy_functions.get(strategy, None)
-            if heuristic_function:
-                heuristic_score = heuristic_function(matrix)
-                total_score += self.heuristic_weights[i] * heuristic_score
-        return total_score
+        return self.evaluate(matrix)
 
 
     def get_move(self, matrix):
@@ -51,18 +53,8 @@ class AI_Heuristics:
         best_score = -float('inf')
         heuristic_scores = {}
 
-        for key in commands:
-            game, done, points = commands[key](matrix)
-            if not done:
-                continue
-
-            score = 0
-            # Loop through strategies and apply corresponding heuristic function
-            for i, strategy in enumerate(self.strategies):
-                heuristic_function = self.strategy_functions.get(strategy, None)
-                if heuristic_function:
-                    heuristic_score = heuristic_function(game)
-                    score += self.heuristic_weights[i] * heuristic_score
+        for key, game, points in logic.legal_moves(matrix):
+            score = self.evaluate(game)
 
             heuristic_scores[key] = score
 
@@ -84,20 +76,22 @@ class AI_Heuristics:
 
     def calculate_smoothness(self, matrix):
         """Calculates smoothness by evaluating the difference between neighboring tiles."""
+        n = len(matrix)
         smoothness = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 smoothness += abs(matrix[i][j] - matrix[i][j + 1])
-        for i in range(c.GRID_LEN - 1):
-            for j in range(c.GRID_LEN):
+        for i in range(n - 1):
+            for j in range(n):
                 smoothness += abs(matrix[i][j] - matrix[i + 1][j])
         return -smoothness  # Smoothness is better with smaller values, so return negative.
 
     def heuristic_monotonicity(self, matrix):
         """Evaluates the monotonicity of rows and columns."""
+        n = len(matrix)
         score = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 if matrix[i][j] <= matrix[i][j + 1]:
                     score += 1
         return score
@@ -105,7 +99,8 @@ class AI_Heuristics:
 
     def heuristic_merge_opportunities(self, matrix):
         """Counts the number of merge opportunities."""
-        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+        n = len(matrix)
+        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(n) for j in range(n - 1))
         return score
 
     def heuristic_max_score(self, matrix):
@@ -119,24 +114,28 @@ class AI_Heuristics:
 
     def heuristic_same_row_col(self, matrix):
         """Prefers moves that keep the same tiles in rows or columns for future merges."""
-        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+        n = len(matrix)
+        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(n) for j in range(n - 1))
         return score
 
     def heuristic_tile_grouping(self, matrix):
         """Selects moves that group similar tiles together."""
-        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+        n = len(matrix)
+        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(n) for j in range(n - 1))
         return score
 
 
     def heuristic_adjacent_same_tiles(self, matrix):
         """Selects moves that keep adjacent tiles of the same value together."""
-        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(c.GRID_LEN) for j in range(c.GRID_LEN - 1))
+        n = len(matrix)
+        score = sum(matrix[i][j] == matrix[i][j + 1] for i in range(n) for j in range(n - 1))
         return score
 
     def heuristic_balance_spread(self, matrix):
         """Selects moves that balance the spread of tiles across the board."""
+        n = len(matrix)
         spread = 0
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN - 1):
+        for i in range(n):
+            for j in range(n - 1):
                 spread += abs(matrix[i][j] - matrix[i][j + 1])
         return -spread  # Less spread is better, so return the negative value.
@@ -0,0 +1,223 @@
+import numpy as np
+import constants as c
+import bitboard
+import seeding
+
+# B games are held as a (B, n, n) uint8 array of tile exponents (0 = empty,
+# 1 = 2, 2 = 4, ...), the same encoding as a bitboard nibble. On 4x4 boards a
+# row of four exponents is packed into a 16-bit code and moved with the
+# bitboard row tables; other sizes merge their rows column by column.
+
+ROW_LEFT = np.array(bitboard.ROW_LEFT_TABLE, dtype=np.uint16)
+ROW_RIGHT = np.array(bitboard.ROW_RIGHT_TABLE, dtype=np.uint16)
+ROW_SCORE = np.array(bitboard.ROW_SCORE_TABLE, dtype=np.int64)
+_SHIFTS = np.array([0, 4, 8, 12], dtype=np.uint16)
+
+# Index order of the move axis, the same order as logic.commands
+MOVES = [c.KEY_UP, c.KEY_DOWN, c.KEY_LEFT, c.KEY_RIGHT]
+NO_MOVE = -1
+
+# Values returned by game_state
+NOT_OVER = 0
+WIN = 1
+LOSE = 2
+
+
+def from_matrices(matrices):
+    """Convert a list of list-of-lists boards into a (B, n, n) exponent array."""
+    values = np.array(matrices, dtype=np.int64)
+    exponents = np.zeros(values.shape, dtype=np.uint8)
+    occupied = values > 0
+    exponents[occupied] = np.log2(values[occupied]).astype(np.uint8)
+    return exponents
+
+
+def to_values(boards):
+    """Tile values (0, 2, 4, ...) of an exponent array, as int64."""
+    return np.where(boards > 0, np.left_shift(1, boards.astype(np.int64)), 0)
+
+
+def to_matrices(boards):
+    """Convert a (B, n, n) exponent array back into list-of-lists boards."""
+    return to_values(boards).tolist()
+
+
+def _encode_rows(boards):
+    return np.bitwise_or.reduce(boards.astype(np.uint16) << _SHIFTS, axis=-1)
+
+
+def _decode_rows(codes):
+    return ((codes[..., None] >> _SHIFTS) & 0xF).astype(np.uint8)
+
+
+def _merge_rows_left(boards):
+    """Move the rows of boards of any size to the left; returns (new boards, points)."""
+    count, n = boards.shape[0], boards.shape[-1]
+    rows = boards.reshape(-1, n)
+    # Slide the tiles to the left, keeping their order
+    order = np.argsort(rows == 0, axis=1, kind='stable')
+    tiles = np.take_along_axis(rows, order, axis=1)
+    points = np.zeros(len(rows), dtype=np.int64)
+    for j in range(n - 1):
+        merging = (tiles[:, j] != 0) & (tiles[:, j] == tiles[:, j + 1])
+        if not merging.any():
+            continue
+        tiles[merging, j] += 1
+        points[merging] += np.left_shift(1, tiles[merging, j].astype(np.int64))
+        # The tiles after the merged pair move up by one
+        tiles[merging, j + 1:n - 1] = tiles[merging, j + 2:]
+        tiles[merging, n - 1] = 0
+    return tiles.reshape(boards.shape), points.reshape(count, n).sum(axis=-1)
+
+
+def _shift_rows(boards, backwards):
+    if boards.shape[-1] == 4:
+        codes = _encode_rows(boards)
+        new = _decode_rows((ROW_RIGHT if backwards else ROW_LEFT)[codes])
+        points = ROW_SCORE[codes].sum(axis=-1)
+        return new, points
+    if backwards:
+        new, points = _merge_rows_left(boards[..., ::-1])
+        return new[..., ::-1], points
+    return _merge_rows_left(boards)
+
+
+def move(boards, key):
+    """Apply one move to every board. Returns (new boards, moved mask, points), like logic.commands."""
+    if key == c.KEY_LEFT:
+        new, points = _shift_rows(boards, False)
+    elif key == c.KEY_RIGHT:
+        new, points = _shift_rows(boards, True)
+    else:
+        # Columns are moved as the rows of the transposed boards
+        new, points = _shift_rows(boards.transpose(0, 2, 1), key == c.KEY_DOWN)
+        new = new.transpose(0, 2, 1)
+    moved = (new != boards).any(axis=(1, 2))
+    return np.ascontiguousarray(new), moved, points
+
+
+def all_moves(boards):
+    """Apply the four moves to every board.
+
+    Returns arrays of shape (4, B, n, n), (4, B) and (4, B), indexed by MOVES.
+    """
+    results = [move(boards, key) for key in MOVES]
+    new = np.stack([result[0] for result in results])
+    moved = np.stack([result[1] for result in results])
+    points = np.stack([result[2] for result in results])
+    return new, moved, points
+
+
+def game_state(boards, moved=None):
+    """Vectorized logic.game_state: NOT_OVER, WIN or LOSE for every board.
+
+    ``moved`` can pass the (4, B) mask of all_moves when it is already known.
+    """
+    if moved is None:
+        moved = all_moves(boards)[1]
+    state = np.full(len(boards), LOSE, dtype=np.int8)
+    has_empty = (boards == 0).any(axis=(1, 2))
+    state[has_empty | moved.any(axis=0)] = NOT_OVER
+    state[(boards == bitboard.WIN_EXPONENT).any(axis=(1, 2))] = WIN
+    return state
+
+
+def spawn(boards, rng, mask=None, games=None):
+    """Add a 2 (90%) or a 4 (10%) on a uniformly chosen empty cell of every board selected by ``mask``.
+
+    ``rng`` is a numpy Generator or a seeding.BatchStreams; with streams,
+    ``games`` gives the stream index of every board (all of them by default)
+    and only the boards that get a tile use up draws. The cell and tile are
+    picked from two draws in the same way as logic.spawn_tile.
+    Boards are changed in place and returned.
+    """
+    count = len(boards)
+    flat = boards.reshape(count, -1)
+    empty = flat == 0
+    if mask is None:
+        mask = np.ones(count, dtype=bool)
+    mask = mask & empty.any(axis=1)
+    rows = np.nonzero(mask)[0]
+    if isinstance(rng, seeding.BatchStreams):
+        streams = rows if games is None else np.asarray(games)[rows]
+        cell_draws = rng.random(streams)
+        tile_draws = rng.random(streams)
+    else:
+        cell_draws = rng.random(len(rows))
+        tile_draws = rng.random(len(rows))
+    # Index of the chosen cell among the empty cells of its board, in row-major order
+    empty = empty[rows]
+    picks = (cell_draws * empty.sum(axis=1)).astype(np.int64)
+    ranks = np.cumsum(empty, axis=1) - 1
+    cells = (empty & (ranks == picks[:, None])).argmax(axis=1)
+    flat[rows, cells] = np.where(tile_draws < 0.1, 2, 1).astype(np.uint8)
+    return boards
+
+
+class BatchGame:
+    """B games advanced in lockstep; finished games are masked out of every step.
+
+    ``rng`` is a numpy Generator, or a seeding.BatchStreams with one stream per
+    game; with streams every game gets the same spawns as a Simulator game
+    seeded with the same value.
+    """
+
+    def __init__(self, count, rng=None, size=c.GRID_LEN, start_tiles=2):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.boards = np.zeros((count, size, size), dtype=np.uint8)
+        for _ in range(start_tiles):
+            spawn(self.boards, self.rng)
+        self.scores = np.zeros(count, dtype=np.int64)
+        self.moves = np.zeros(count, dtype=np.int64)
+        self.state = game_state(self.boards)
+
+    @property
+    def active(self):
+        return self.state == NOT_OVER
+
+    def step(self, choose_moves):
+        """Play one move in every active game.
+
+        ``choose_moves(boards, new, moved, points)`` gets the active boards and
+        their all_moves results and returns one MOVES index (or NO_MOVE) per board.
+        Returns the number of games still running.
+        """
+        rows = np.nonzero(self.active)[0]
+        if len(rows) == 0:
+            return 0
+        boards = self.boards[rows]
+        new, moved, points = all_moves(boards)
+        choice = np.asarray(choose_moves(boards, new, moved, points))
+
+        played = choice != NO_MOVE
+        index = np.where(played, choice, 0)
+        picks = np.arange(len(rows))
+        next_boards = np.where(played[:, None, None], new[index, picks], boards)
+        changed = played & moved[index, picks]
+        self.scores[rows] += np.where(played, points[index, picks], 0)
+        self.moves[rows] += played
+        spawn(next_boards, self.rng, changed, rows)
+        self.boards[rows] = next_boards
+
+        state = game_state(next_boards)
+        # A game whose AI has no move to play is over, like in Simulator
+        state[~played & (state == NOT_OVER)] = LOSE
+        self.state[rows] = state
+        return int((state == NOT_OVER).sum())
+
+    def run(self, choose_moves):
+        while self.step(choose_moves):
+            pass
+
+    def records(self):
+        """One record per game, with the same keys as Simulator records."""
+        values = to_values(self.boards)
+        max_tiles = values.max(axis=(1, 2))
+        tile_sums = values.sum(axis=(1, 2))
+        return [{
+            'Game': game + 1,
+            'Max Tile': int(max_tiles[game]),
+            'Total Score': int(self.scores[game]),
+            'Tile Sum': int(tile_sums[game]),
+            'Total Moves': int(self.moves[game])
+        } for game in range(len(self.boards))]
@@ -0,0 +1,309 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import logic
+import constants as c
+import seeding
+import packed
+import AI_heuristics
+import AI_expectimax
+
+# Share of a game's moves after which the positions of each phase are taken
+PHASES = {'early': (0.05, 0.15), 'mid': (0.4, 0.6), 'late': (0.85, 0.95)}
+SEARCH_DEPTHS = (2, 3, 4, 5, 6)
+# Board sizes of the per-size engine measurements, and the search depth used for them
+BOARD_SIZES = (3, 4, 5, 6)
+SIZE_SEARCH_DEPTH = 3
+# A regression is a metric that drops by more than this fraction of its baseline
+DEFAULT_THRESHOLD = 0.1
+
+
+def random_positions(count, seed=0, min_moves=10, max_moves=80):
+    """Play random moves from new games to build a reproducible list of positions."""
+    rng_state = random.getstate()
+    random.seed(seed)
+    positions = []
+    while len(positions) < count:
+        matrix = logic.new_game(c.GRID_LEN)
+        for _ in range(random.randint(min_moves, max_moves)):
+            key = random.choice(list(logic.commands))
+            new_matrix, done, points = logic.commands[key](matrix)
+            if done:
+                matrix = logic.add_two(new_matrix)
+            if logic.game_state(matrix) != 'not over':
+                break
+        if logic.game_state(matrix) == 'not over':
+            positions.append(matrix)
+    random.setstate(rng_state)
+    return positions
+
+
+def benchmark_parallel(depth=4, positions=8, workers=None, seed=0):
+    """Time expectimax_decision serially and on a process pool, and check that both pick the same moves."""
+    boards = random_positions(positions, seed)
+
+    start = time.perf_counter()
+    serial_moves = [AI_expectimax.expectimax_decision(board, depth) for board in boards]
+    serial_time = time.perf_counter() - start
+
+    executor = AI_expectimax.make_executor(workers)
+    try:
+        # Start the workers before timing so that process startup is not counted
+        executor.submit(int).result()
+        start = time.perf_counter()
+        parallel_moves = [AI_expectimax.expectimax_decision(board, depth, executor=executor) for board in boards]
+        parallel_time = time.perf_counter() - start
+    finally:
+        executor.shutdown()
+
+    if parallel_moves != serial_moves:
+        raise AssertionError(f"Parallel moves {parallel_moves} differ from serial moves {serial_moves}")
+
+    return {
+        'depth': depth,
+        'positions': len(boards),
+        'serial_time': serial_time,
+        'parallel_time': parallel_time,
+        'speedup': serial_time / parallel_time if parallel_time else float('inf')
+    }
+
+
+def phase_positions(phase, count, seed=0, size=c.GRID_LEN):
+    """Positions from the ``phase`` ('early', 'mid' or 'late') of seeded games of the greedy empty_tile strategy.
+
+    Position ``n`` comes from its own spawn stream, so a corpus depends only
+    on ``phase``, ``count``, ``seed`` and ``size``.
+    """
+    low, high = PHASES[phase]
+    positions = []
+    game = 0
+    # The 4x4 streams keep their original names, so that old baselines stay comparable
+    prefix = f"{seed}-{phase}" if size == 4 else f"{seed}-{size}x{size}-{phase}"
+    while len(positions) < count:
+        game += 1
+        stream = seeding.SeedStream(f"{prefix}-{game}")
+        matrix = logic.add_two(logic.add_two([[0] * size for _ in range(size)], stream), stream)
+        history = []
+        while True:
+            state, moves = logic.analyze(matrix)
+            if state != 'not over':
+                break
+            history.append(matrix)
+            key = AI_heuristics.heuristic_empty_tile(matrix)
+            matrix = logic.add_two(dict((move[0], move[1]) for move in moves)[key], stream)
+        if history:
+            start = int(low * len(history))
+            end = max(start + 1, int(high * len(history)))
+            positions.append(history[start + int(stream.random() * (end - start))])
+    return positions
+
+
+def _rate(function, items, min_time):
+    """Calls of ``function`` per second over ``items``, from the fastest of the passes run in ``min_time``."""
+    best = None
+    elapsed = 0.0
+    while best is None or elapsed < min_time:
+        start = time.perf_counter()
+        for item in items:
+            function(item)
+        duration = time.perf_counter() - start
+        elapsed += duration
+        best = duration if best is None else min(best, duration)
+    return len(items) / best if best else float('inf')
+
+
+def _count_search_nodes(board, depth):
+    """Number of expectimax calls made by one decision, counted in an untimed run."""
+    calls = [0]
+    search = AI_expectimax.expectimax
+
+    def counted(*args, **kwargs):
+        calls[0] += 1
+        return search(*args, **kwargs)
+
+    # The search calls itself through the module global, so every node goes through the wrapper
+    AI_expectimax.expectimax = counted
+    try:
+        AI_expectimax.expectimax_decision(board, depth)
+    finally:
+        AI_expectimax.expectimax = search
+    return calls[0]
+
+
+def size_suite(sizes=BOARD_SIZES, positions=20, search_positions=3, seed=0, min_time=0.2):
+    """Per-move cost of every engine on mid-game positions of each board size.
+
+    Moves/s of logic.move_into (list-of-lists), of the packed engine chosen by
+    packed.engine_for and of the batch engine, evaluations/s of the compiled
+    heuristics on lists and on packed boards, and decisions/s of a depth
+    SIZE_SEARCH_DEPTH search, per size.
+    """
+    import batch_engine
+
+    heuristics = AI_expectimax.get_heuristics()
+    results = {}
+    for size in sizes:
+        boards = phase_positions('mid', positions, seed, size)
+        label = f"size.{size}x{size}"
+        scratch = [[0] * size for _ in range(size)]
+        results[f"{label} logic moves/s"] = 4 * _rate(
+            lambda board: [logic.move_into(board, key, scratch) for key in logic.commands], boards, min_time)
+
+        engine = packed.engine_for(size)
+        packed_boards = [engine.to_bitboard(board) for board in boards]
+        moves = list(engine.commands.values())
+        results[f"{label} packed moves/s"] = 4 * _rate(lambda board: [move(board) for move in moves],
+                                                       packed_boards, min_time)
+
+        batch = batch_engine.from_matrices(boards)
+        results[f"{label} batch moves/s"] = 4 * len(boards) * _rate(batch_engine.all_moves, [batch], min_time)
+        results[f"{label} compiled evals/s"] = _rate(heuristics.evaluate_unweighted, boards, min_time)
+        results[f"{label} packed evals/s"] = _rate(heuristics.evaluate_unweighted.for_size(size).evaluate_packed,
+                                                   packed_boards, min_time)
+        results[f"{label} search depth {SIZE_SEARCH_DEPTH} decisions/s"] = _rate(
+            lambda board: AI_expectimax.expectimax_decision(board, SIZE_SEARCH_DEPTH), boards[:search_positions], 0)
+    return results
+
+
+def run_suite(positions=20, depths=SEARCH_DEPTHS, search_positions=3, seed=0, min_time=0.2, sizes=()):
+    """Measure the engine, the heuristics and the search on fixed corpora of early, mid and late positions.
+
+    Returns a flat {metric: rate} dict in which every rate is "higher is better":
+    moves/s per logic command, evaluations/s per heuristic, and decisions/s and
+    nodes/s of expectimax_decision per depth, plus the size_suite metrics of
+    ``sizes``.
+    """
+    corpora = {phase: phase_positions(phase, positions, seed) for phase in PHASES}
+    boards = [board for phase in PHASES for board in corpora[phase]]
+    results = {}
+
+    for key, move in logic.commands.items():
+        results[f"logic.{key} moves/s"] = _rate(move, boards, min_time)
+    results["logic.analyze boards/s"] = _rate(logic.analyze, boards, min_time)
+
+    heuristics = AI_expectimax.get_heuristics()
+    for name, function in heuristics.strategy_functions.items():
+        results[f"heuristic.{name} evals/s"] = _rate(function, boards, min_time)
+    results["heuristic.compiled evals/s"] = _rate(heuristics.evaluate, boards, min_time)
+
+    for depth in depths:
+        for phase in PHASES:
+            # Deep searches get a single timed pass; their run time is already long enough to be stable
+            search_boards = corpora[phase][:search_positions]
+            rate = _rate(lambda board: AI_expectimax.expectimax_decision(board, depth), search_boards,
+                         min_time if depth <= 4 else 0)
+            nodes = sum(_count_search_nodes(board, depth) for board in search_boards) / len(search_boards)
+            results[f"search.depth {depth} {phase} decisions/s"] = rate
+            results[f"search.depth {depth} {phase} nodes/s"] = rate * nodes
+    if sizes:
+        results.update(size_suite(sizes, positions, search_positions, seed, min_time))
+    return results
+
+
+def save_baseline(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return (metric, baseline rate, current rate, change) for every metric that got slower than ``threshold`` allows."""
+    regressions = []
+    for metric, old in sorted(baseline.items()):
+        new = results.get(metric)
+        if new is None or not old:
+            continue
+        change = new / old - 1
+        if change < -threshold:
+            regressions.append((metric, old, new, change))
+    return regressions
+
+
+def print_results(results, baseline=None):
+    for metric, rate in sorted(results.items()):
+        line = f"{metric:<48} {rate:>14,.1f}"
+        if baseline and baseline.get(metric):
+            line += f"  {rate / baseline[metric] - 1:+.1%}"
+        print(line)
+
+
+# Modules that a worker process or a CLI run imports, and the dependencies
+# whose import alone costs hundreds of milliseconds
+IMPORT_MODULES = ('logic', 'bitboard', 'evaluator', 'seeding', 'AI_heuristicsForExpectimax', 'AI_expectimax',
+                  'AI_heuristics', 'AI_heuristics1', 'simulator', 'game_farm', 'racing', 'weight_search',
+                  'optimize_strategies')
+HEAVY_MODULES = ('numpy', 'pandas', 'sklearn', 'tkinter')
+_IMPORT_SCRIPT = (
+    "import json, sys, time\n"
+    "sys.path.insert(0, {directory!r})\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "seconds = time.perf_counter() - start\n"
+    "print(json.dumps([seconds, [name for name in {heavy!r} if name in sys.modules]]))\n"
+)
+
+
+def benchmark_imports(modules=IMPORT_MODULES, repeats=3):
+    """Cold import time of every module, each in a fresh interpreter; best of ``repeats`` runs.
+
+    Returns {module: (seconds, heavy modules loaded)}. The interpreter
+    startup itself is not included.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module in modules:
+        best = None
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES, directory=directory)],
+                                    capture_output=True, text=True, check=True).stdout
+            seconds, heavy = json.loads(output)
+            if best is None or seconds < best[0]:
+                best = (seconds, heavy)
+        results[module] = best
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks for the 2048 engine and AI")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--positions", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--suite", action="store_true", help="Run the engine/heuristic/search suite instead of the parallel benchmark")
+    parser.add_argument("--depths", type=int, nargs="+", default=list(SEARCH_DEPTHS))
+    parser.add_argument("--sizes", type=int, nargs="*", default=[],
+                        help=f"Also measure the engines per board size, e.g. --sizes {' '.join(map(str, BOARD_SIZES))}")
+    parser.add_argument("--save", help="Write the suite results to this JSON baseline")
+    parser.add_argument("--compare", help="Compare the suite results with this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--imports", action="store_true", help="Time the cold import of the engine and AI modules")
+    args = parser.parse_args()
+
+    if args.imports:
+        for module, (seconds, heavy) in benchmark_imports().items():
+            print(f"{module:<28} {seconds * 1000:>8.1f} ms  {', '.join(heavy)}")
+        sys.exit(0)
+
+    if not args.suite:
+        result = benchmark_parallel(args.depth, args.positions, args.workers, args.seed)
+        print(f"Depth {result['depth']}, {result['positions']} positions: "
+              f"serial {result['serial_time']:.2f}s, parallel {result['parallel_time']:.2f}s, "
+              f"speedup {result['speedup']:.2f}x")
+        sys.exit(0)
+
+    results = run_suite(depths=args.depths, seed=args.seed, sizes=args.sizes)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.save:
+        save_baseline(results, args.save)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for metric, old, new, change in regressions:
+            print(f"REGRESSION {metric}: {old:,.1f} -> {new:,.1f} ({change:+.1%})")
+        sys.exit(1 if regressions else 0)
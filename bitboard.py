@@ -0,0 +1,254 @@
+import random
+import constants as c
+import packed
+
+# A bitboard packs the 4x4 grid into a single int: every cell holds the
+# exponent of its tile in 4 bits (0 = empty, 1 = 2, 2 = 4, ..., 11 = 2048).
+# Cell (i, j) lives in nibble i * 4 + j, so row i is the 16-bit word at
+# bit offset 16 * i and column 0 is the lowest nibble of each row.
+
+ROW_MASK = 0xFFFF
+CELL_MASK = 0xF
+WIN_EXPONENT = 11  # 2 ** 11 == 2048
+MAX_EXPONENT = 15  # Largest exponent a nibble can hold (32768)
+_WIN_PATTERN = 0xBBBBBBBBBBBBBBBB  # WIN_EXPONENT in every nibble
+
+
+def _reverse_row(row):
+    return ((row & 0xF) << 12) | ((row & 0xF0) << 4) | ((row >> 4) & 0xF0) | (row >> 12)
+
+
+def _build_row_tables():
+    """Precompute the result and the points of a left and right shift, and the empty cells, for all 65536 rows."""
+    row_left = [0] * 65536
+    row_right = [0] * 65536
+    row_score = [0] * 65536
+    row_empty = [0] * 65536
+    for row in range(65536):
+        line = [(row >> (4 * j)) & 0xF for j in range(4)]
+        row_empty[row] = sum(1 << j for j in range(4) if not line[j])
+        # Same steps as logic.cover_up / logic.merge / logic.cover_up on one row
+        tiles = [tile for tile in line if tile != 0]
+        merged = []
+        points = 0
+        j = 0
+        while j < len(tiles):
+            if j + 1 < len(tiles) and tiles[j] == tiles[j + 1] and tiles[j] < MAX_EXPONENT:
+                merged.append(tiles[j] + 1)
+                points += 1 << (tiles[j] + 1)
+                j += 2
+            else:
+                merged.append(tiles[j])
+                j += 1
+        result = 0
+        for k, tile in enumerate(merged):
+            result |= tile << (4 * k)
+        row_left[row] = result
+        row_score[row] = points
+    for row in range(65536):
+        # A right shift is a left shift of the mirrored row, mirrored back
+        row_right[row] = _reverse_row(row_left[_reverse_row(row)])
+    return row_left, row_right, row_score, row_empty
+
+
+# ROW_EMPTY_TABLE holds the empty cells of a row as a 4-bit mask, bit j for column j
+ROW_LEFT_TABLE, ROW_RIGHT_TABLE, ROW_SCORE_TABLE, ROW_EMPTY_TABLE = _build_row_tables()
+
+
+def to_bitboard(mat):
+    """Convert a list-of-lists board into a bitboard."""
+    board = 0
+    for i in range(4):
+        for j in range(4):
+            value = mat[i][j]
+            if value:
+                board |= (value.bit_length() - 1) << (4 * (i * 4 + j))
+    return board
+
+
+def from_bitboard(board):
+    """Convert a bitboard back into the list-of-lists form used by logic and the GUI."""
+    mat = []
+    for i in range(4):
+        row = []
+        for j in range(4):
+            exponent = (board >> (4 * (i * 4 + j))) & CELL_MASK
+            row.append(1 << exponent if exponent else 0)
+        mat.append(row)
+    return mat
+
+
+def transpose(board):
+    """Transpose the bitboard (swap rows and columns) without unpacking it."""
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+
+def _shift_rows(board, table):
+    r0 = board & ROW_MASK
+    r1 = (board >> 16) & ROW_MASK
+    r2 = (board >> 32) & ROW_MASK
+    r3 = board >> 48
+    new = table[r0] | (table[r1] << 16) | (table[r2] << 32) | (table[r3] << 48)
+    points = ROW_SCORE_TABLE[r0] + ROW_SCORE_TABLE[r1] + ROW_SCORE_TABLE[r2] + ROW_SCORE_TABLE[r3]
+    return new, points
+
+
+def left(board):
+    new, points = _shift_rows(board, ROW_LEFT_TABLE)
+    return new, new != board, points
+
+
+def right(board):
+    new, points = _shift_rows(board, ROW_RIGHT_TABLE)
+    return new, new != board, points
+
+
+def up(board):
+    new, points = _shift_rows(transpose(board), ROW_LEFT_TABLE)
+    new = transpose(new)
+    return new, new != board, points
+
+
+def down(board):
+    new, points = _shift_rows(transpose(board), ROW_RIGHT_TABLE)
+    new = transpose(new)
+    return new, new != board, points
+
+
+# Same keys and return values as logic.commands: (board, done, points)
+commands = {
+    c.KEY_UP: up,
+    c.KEY_DOWN: down,
+    c.KEY_LEFT: left,
+    c.KEY_RIGHT: right
+}
+
+
+def get_empty_cells(board):
+    """Return the (row, column) positions of the empty cells of a bitboard."""
+    empty_cells = []
+    for k in range(16):
+        if not (board >> (4 * k)) & CELL_MASK:
+            empty_cells.append((k >> 2, k & 3))
+    return empty_cells
+
+
+def count_empty(board):
+    """Return the number of empty cells of a bitboard."""
+    return bin(empty_mask(board)).count("1")
+
+
+def max_exponent(board):
+    """Return the exponent of the largest tile on a bitboard."""
+    best = 0
+    while board:
+        exponent = board & CELL_MASK
+        if exponent > best:
+            best = exponent
+        board >>= 4
+    return best
+
+
+def set_cell(board, i, j, value):
+    """Return the bitboard with cell (i, j) set to the tile ``value`` (0, 2, 4, ...)."""
+    shift = 4 * (i * 4 + j)
+    exponent = value.bit_length() - 1 if value else 0
+    return (board & ~(CELL_MASK << shift)) | (exponent << shift)
+
+
+def empty_mask(board):
+    """Mask with the lowest bit of every empty nibble set."""
+    # Fold every nibble onto its lowest bit; the nibbles that stayed zero are empty
+    occupied = board | (board >> 1)
+    occupied |= occupied >> 2
+    return ~occupied & 0x1111111111111111
+
+
+def empty_cells_mask(board):
+    """Mask with bit k set for every empty cell k = i * 4 + j, one table lookup per row."""
+    return (ROW_EMPTY_TABLE[board & ROW_MASK] | (ROW_EMPTY_TABLE[(board >> 16) & ROW_MASK] << 4)
+            | (ROW_EMPTY_TABLE[(board >> 32) & ROW_MASK] << 8) | (ROW_EMPTY_TABLE[board >> 48] << 12))
+
+
+def has_won(board):
+    """Whether a 2048 tile is on the bitboard, the 'win' case of game_state."""
+    # The cells holding the win exponent are the empty nibbles of the xor
+    return bool(empty_mask(board ^ _WIN_PATTERN))
+
+
+def spawn_tile(board, rng=random, empty=None):
+    """Place a 2 (90%) or a 4 (10%) on a uniformly chosen empty cell in constant time.
+
+    ``empty`` is the empty_cells_mask of the board, for callers that keep it
+    up to date. The draws are those of logic.spawn_tile: the cell, as the
+    k-th empty cell in row-major order, then the tile.
+    Returns (new board, cell index, tile), or (board, None, None) on a full board.
+    """
+    if empty is None:
+        empty = empty_cells_mask(board)
+    if not empty:
+        return board, None, None
+    cell = packed.select_bit(empty, int(rng.random() * bin(empty).count("1")))
+    exponent = 2 if rng.random() < 0.1 else 1
+    return board | (exponent << (4 * cell)), cell, 1 << exponent
+
+
+def add_two(board, rng=random):
+    """Place a 2 (90%) or a 4 (10%) on a uniformly chosen empty cell, drawing from ``rng`` like logic.add_two."""
+    return spawn_tile(board, rng)[0]
+
+
+def new_game():
+    board = add_two(0)
+    board = add_two(board)
+    return board
+
+
+def game_state(board):
+    """Return 'win', 'not over' or 'lose', matching logic.game_state."""
+    tmp = board
+    has_empty = False
+    while True:
+        exponent = tmp & CELL_MASK
+        if exponent == WIN_EXPONENT:
+            return 'win'
+        if exponent == 0:
+            has_empty = True
+        tmp >>= 4
+        if not tmp:
+            break
+    if has_empty or board < (1 << 60):
+        # The loop stops early on zero high nibbles, which are empty cells too
+        return 'not over'
+    for move in (left, up):
+        if move(board)[1]:
+            return 'not over'
+    return 'lose'
+
+
+def legal_moves(board):
+    """List of (key, new bitboard, points) for the moves that change the board, like logic.legal_moves."""
+    moves = []
+    for key, move in commands.items():
+        new, done, points = move(board)
+        if done:
+            moves.append((key, new, points))
+    return moves
+
+
+def analyze(board):
+    """Return (state, moves) of a bitboard with a single pass over the moves, like logic.analyze."""
+    moves = legal_moves(board)
+    if has_won(board):
+        state = 'win'
+    else:
+        # Without legal moves only the empty board, which has empty cells, is not lost, as in game_state
+        state = 'not over' if moves or empty_mask(board) else 'lose'
+    return state, moves
@@ -1,3 +1,5 @@
+import os
+
 SIZE = 400
 GRID_LEN = 4
 GRID_PADDING = 10
@@ -25,3 +27,6 @@ KEY_UP = "Up"
 KEY_DOWN = "Down"
 KEY_LEFT = "Left"
 KEY_RIGHT = "Right"
+
+# Where opening_book.py writes the opening book and AI_both.AI looks for it: next to the modules, not in the working directory
+OPENING_BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
@@ -0,0 +1,344 @@
+import json
+import mmap
+import os
+import sys
+from array import array
+import constants as c
+
+# Every heuristic of the AI modules is a linear combination of a few board
+# features. A weighted set of strategies is compiled once into a single
+# straight-line function that computes only the features it needs, in one
+# pass over the cells.
+
+FEATURES = ('empty', 'h_diff', 'v_diff', 'h_equal', 'h_ascending', 'tile_sum', 'max_tile', 'free_rows')
+
+# Strategy name -> {feature: coefficient}, as computed by AI_heuristicsForExpectimax.AI_Heuristics
+EXPECTIMAX_STRATEGIES = {
+    'empty_tile': {'empty': 1},
+    'smoothness': {'h_diff': -1, 'v_diff': -1},
+    'monotonicity': {'h_ascending': 1},
+    'merge_opportunities': {'h_equal': 1},
+    'max_score': {'tile_sum': 1},
+    'max_free_lines': {'free_rows': 1},
+    'same_row_col': {'h_equal': 1},
+    'tile_grouping': {'h_equal': 1},
+    'adjacent_same_tiles': {'h_equal': 1},
+    'balance_spread': {'h_diff': -1}
+}
+
+# The same for AI_heuristics1.AI_Heuristics, whose heuristics differ for a few names
+WEIGHTED_STRATEGIES = {
+    'empty_tile': {'empty': 1},
+    'monotonicity': {'h_diff': -1, 'v_diff': -1},
+    'smoothness': {'h_diff': -1, 'v_diff': -1},
+    'merge_opportunities': {'h_equal': 1},
+    'max_score': {'max_tile': 1},
+    'max_free_lines': {'free_rows': 1},
+    'same_row_col': {'h_equal': 1},
+    'tile_grouping': {'h_equal': 1},
+    'adjacent_same_tiles': {'h_equal': 1},
+    'balance_spread': {'tile_sum': 1}
+}
+
+
+def feature_coefficients(strategies, weights, strategy_features, skip_unknown=False):
+    """Fold weighted strategies into one coefficient per feature."""
+    coefficients = {}
+    for strategy, weight in zip(strategies, weights):
+        if strategy not in strategy_features:
+            if skip_unknown:
+                continue
+            raise ValueError(f"Unknown strategy: {strategy}")
+        for feature, coefficient in strategy_features[strategy].items():
+            coefficients[feature] = coefficients.get(feature, 0) + float(weight) * coefficient
+    return {feature: coefficient for feature, coefficient in coefficients.items() if coefficient != 0}
+
+
+def _feature_expressions(size):
+    cells = [[f"a{i * size + j}" for j in range(size)] for i in range(size)]
+    flat = [cell for row in cells for cell in row]
+    horizontal = [(cells[i][j], cells[i][j + 1]) for i in range(size) for j in range(size - 1)]
+    vertical = [(cells[i][j], cells[i + 1][j]) for i in range(size - 1) for j in range(size)]
+    return {
+        'empty': " + ".join(f"({a} == 0)" for a in flat),
+        'h_diff': " + ".join(f"abs({a} - {b})" for a, b in horizontal),
+        'v_diff': " + ".join(f"abs({a} - {b})" for a, b in vertical),
+        'h_equal': " + ".join(f"({a} == {b})" for a, b in horizontal),
+        'h_ascending': " + ".join(f"({a} <= {b})" for a, b in horizontal),
+        'tile_sum': " + ".join(flat),
+        'max_tile': f"max({', '.join(flat)})",
+        'free_rows': " + ".join(f"(({' | '.join(row)}) == 0)" for row in cells)
+    }
+
+
+def _compile_matrix_function(coefficients, size):
+    expressions = _feature_expressions(size)
+    rows = ", ".join("(" + ", ".join(f"a{i * size + j}" for j in range(size)) + ",)" for i in range(size))
+    terms = [f"{coefficient!r} * ({expressions[feature]})" for feature, coefficient in coefficients.items()]
+    source = f"def evaluate(matrix):\n    {rows} = matrix\n    return {' + '.join(terms) or '0'}\n"
+    namespace = {}
+    exec(compile(source, "<compiled evaluator>", "exec"), namespace)
+    return namespace['evaluate']
+
+
+# Features that rotating or reflecting the board can change (row-only counts and ordering)
+ASYMMETRIC_FEATURES = ('h_equal', 'h_ascending', 'free_rows')
+
+
+def is_symmetric(coefficients):
+    """Whether a weighted sum of features is the same for all 8 symmetries of a board."""
+    if any(feature in coefficients for feature in ASYMMETRIC_FEATURES):
+        return False
+    # Row and column differences swap under a transpose
+    return coefficients.get('h_diff', 0) == coefficients.get('v_diff', 0)
+
+
+def _row_features(values):
+    n = len(values)
+    return {
+        'empty': sum(value == 0 for value in values),
+        'h_diff': sum(abs(values[j] - values[j + 1]) for j in range(n - 1)),
+        'h_equal': sum(values[j] == values[j + 1] for j in range(n - 1)),
+        'h_ascending': sum(values[j] <= values[j + 1] for j in range(n - 1)),
+        'tile_sum': sum(values),
+        'free_rows': int(not any(values)),
+        'max_tile': max(values)
+    }
+
+
+# The row tables can be written once to a binary file (see write_tables) that
+# every process memory-maps, so workers share its pages instead of each one
+# building its own tables.
+TABLE_MAGIC = b"2048ROWT"
+# Default table file, in the working directory like the results tables
+TABLE_FILE = "row_tables.bin"
+ROW_CODES = 65536
+
+# Feature name -> its value for each of the 65536 row codes, loaded or built on first use
+_row_feature_tables = None
+# (tables, weighted coefficients) of the mapped TABLE_FILE; False when there is none
+_mapped_tables = None
+
+
+def build_row_feature_tables():
+    """Per-row features of every 16-bit row code, computed in memory."""
+    tables = {feature: [0] * ROW_CODES for feature in _row_features([0, 0, 0, 0])}
+    for code in range(ROW_CODES):
+        values = [1 << exponent if exponent else 0 for exponent in ((code >> (4 * j)) & 0xF for j in range(4))]
+        for feature, value in _row_features(values).items():
+            tables[feature][code] = value
+    return tables
+
+
+def write_tables(path=TABLE_FILE, evaluators=None):
+    """Write the row feature tables, and the weighted tables of ``evaluators`` ({name: CompiledEvaluator}), to ``path``.
+
+    The file is an 8-byte magic, a 4-byte header length, a JSON header and
+    the tables as consecutive arrays of 65536 native doubles. It is written
+    to a temporary file first, so readers never see a partial file.
+    """
+    tables = list(build_row_feature_tables().items())
+    weighted = {}
+    for name, compiled in (evaluators or {}).items():
+        row_table, column_table = compiled.weighted_tables()
+        tables += [(f"{name}.row", row_table), (f"{name}.column", column_table)]
+        weighted[name] = compiled.coefficients
+    header = json.dumps({'version': 1, 'byteorder': sys.byteorder,
+                         'tables': [name for name, values in tables], 'weighted': weighted}).encode('utf-8')
+    # Pad the header so that the tables start on an 8-byte boundary
+    header += b" " * (-(len(TABLE_MAGIC) + 4 + len(header)) % 8)
+    temporary = path + ".tmp"
+    with open(temporary, 'wb') as f:
+        f.write(TABLE_MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        for name, values in tables:
+            f.write(array('d', values).tobytes())
+    os.replace(temporary, path)
+    return path
+
+
+def load_tables(path=TABLE_FILE):
+    """Memory-map a file written by write_tables.
+
+    Returns ({table name: read-only sequence of 65536 floats}, {evaluator name:
+    coefficients}); the sequences read straight from the shared mapping.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if bytes(view[:len(TABLE_MAGIC)]) != TABLE_MAGIC:
+        raise ValueError(f"{path} is not a row table file")
+    start = len(TABLE_MAGIC) + 4
+    header_length = int.from_bytes(view[len(TABLE_MAGIC):start], 'little')
+    header = json.loads(bytes(view[start:start + header_length]).decode('utf-8'))
+    if header['byteorder'] != sys.byteorder:
+        raise ValueError(f"{path} was written on a {header['byteorder']}-endian machine")
+    offset = start + header_length
+    size = ROW_CODES * 8
+    tables = {}
+    for name in header['tables']:
+        tables[name] = view[offset:offset + size].cast('d')
+        offset += size
+    return tables, header['weighted']
+
+
+def mapped_tables():
+    """The tables of TABLE_FILE, mapped on first use; None when the file does not exist."""
+    global _mapped_tables
+    if _mapped_tables is None:
+        _mapped_tables = load_tables(TABLE_FILE) if os.path.exists(TABLE_FILE) else False
+    return _mapped_tables or None
+
+
+def row_feature_tables():
+    """Per-row features of every 16-bit row code, shared by all compiled evaluators.
+
+    They come from TABLE_FILE when it exists and are built in memory otherwise.
+    """
+    global _row_feature_tables
+    if _row_feature_tables is None:
+        mapped = mapped_tables()
+        if mapped is not None:
+            _row_feature_tables = {feature: mapped[0][feature] for feature in _row_features([0, 0, 0, 0])}
+        else:
+            _row_feature_tables = build_row_feature_tables()
+    return _row_feature_tables
+
+
+class CompiledEvaluator:
+    """Weighted sum of heuristics, compiled for one board size.
+
+    Calling it on a list-of-lists board runs the generated single-pass
+    function; a board of another size is passed on to the evaluator with the
+    same coefficients compiled for that size. evaluate_bitboard scores a 4x4
+    bitboard with per-row lookup tables, and evaluate_packed a packed board of
+    the evaluator's size (see packed.engine_for).
+    """
+
+    def __init__(self, coefficients, size=c.GRID_LEN):
+        self.coefficients = dict(coefficients)
+        self.size = size
+        self.evaluate = _compile_matrix_function(self.coefficients, size)
+        self._sizes = {size: self}
+        # Whether every rotation and reflection of a board gets the same score
+        self.is_symmetric = is_symmetric(self.coefficients)
+        self._row_table = None
+        self._column_table = None
+        self._max_table = None
+        self._transpose = None
+        self._packed_tables = None
+
+    def __call__(self, matrix):
+        if len(matrix) != self.size:
+            return self.for_size(len(matrix)).evaluate(matrix)
+        return self.evaluate(matrix)
+
+    def for_size(self, size):
+        """The evaluator with these coefficients for ``size`` x ``size`` boards, compiled on first use."""
+        compiled = self._sizes.get(size)
+        if compiled is None:
+            compiled = self._sizes[size] = CompiledEvaluator(self.coefficients, size)
+            compiled._sizes = self._sizes
+        return compiled
+
+    def weighted_tables(self):
+        """Weighted value of every 16-bit row code: (row-local features for rows, vertical ones for columns)."""
+        features = row_feature_tables()
+        row_table = [0.0] * ROW_CODES
+        for feature, coefficient in self.coefficients.items():
+            if feature in ('v_diff', 'max_tile'):
+                continue
+            table = features[feature]
+            row_table = [total + coefficient * value for total, value in zip(row_table, table)]
+        # A column of the board is a row of the transposed board
+        v_diff = self.coefficients.get('v_diff', 0)
+        return row_table, [v_diff * value for value in features['h_diff']]
+
+    def _build_tables(self):
+        mapped = mapped_tables()
+        tables = None
+        if mapped is not None:
+            # Reuse the weighted tables of the file when they were written for these coefficients
+            for name, coefficients in mapped[1].items():
+                if coefficients == self.coefficients:
+                    tables = mapped[0][f"{name}.row"], mapped[0][f"{name}.column"]
+                    break
+        self._row_table, self._column_table = tables or self.weighted_tables()
+        self._max_table = row_feature_tables()['max_tile']
+        import bitboard  # The list-of-lists path does not need the move tables
+        self._transpose = bitboard.transpose
+
+    def evaluate_bitboard(self, board):
+        if self.size != 4:
+            raise ValueError("Bitboard evaluation needs a 4x4 evaluator")
+        if self._row_table is None:
+            self._build_tables()
+        rows = (board & 0xFFFF, (board >> 16) & 0xFFFF, (board >> 32) & 0xFFFF, board >> 48)
+        score = sum(self._row_table[row] for row in rows)
+        if 'v_diff' in self.coefficients:
+            transposed = self._transpose(board)
+            score += sum(self._column_table[(transposed >> (16 * i)) & 0xFFFF] for i in range(4))
+        if 'max_tile' in self.coefficients:
+            score += self.coefficients['max_tile'] * max(self._max_table[row] for row in rows)
+        return score
+
+    def _build_packed_tables(self):
+        import packed
+        engine = packed.engine_for(self.size)
+        size, bits, mask = self.size, engine.cell_bits, engine.cell_mask
+
+        def features(row):
+            return _row_features([1 << exponent if exponent else 0
+                                  for exponent in ((row >> (bits * j)) & mask for j in range(size))])
+
+        # Same terms, in the same order, as weighted_tables
+        row_coefficients = [(feature, coefficient) for feature, coefficient in self.coefficients.items()
+                            if feature not in ('v_diff', 'max_tile')]
+        v_diff = self.coefficients.get('v_diff', 0)
+
+        def row_value(row):
+            values = features(row)
+            return sum(coefficient * values[feature] for feature, coefficient in row_coefficients)
+
+        self._packed_tables = (
+            engine,
+            [engine.row_bits * i for i in range(size)],
+            engine.row_table(row_value, lazy=True),
+            engine.row_table(lambda row: v_diff * features(row)['h_diff'], lazy=True),
+            engine.row_table(lambda row: features(row)['max_tile'], lazy=True)
+        )
+
+    def evaluate_packed(self, board):
+        if self.size == 4:
+            return self.evaluate_bitboard(board)
+        if self._packed_tables is None:
+            self._build_packed_tables()
+        engine, shifts, row_table, column_table, max_table = self._packed_tables
+        row_mask = engine.row_mask
+        rows = [(board >> shift) & row_mask for shift in shifts]
+        score = sum(row_table[row] for row in rows)
+        if 'v_diff' in self.coefficients:
+            transposed = engine.transpose(board)
+            score += sum(column_table[(transposed >> shift) & row_mask] for shift in shifts)
+        if 'max_tile' in self.coefficients:
+            score += self.coefficients['max_tile'] * max(max_table[row] for row in rows)
+        return score
+
+
+def compile_evaluator(strategies, weights, strategy_features, size=c.GRID_LEN, skip_unknown=False):
+    """Compile weighted strategies (names from ``strategy_features``) into a CompiledEvaluator."""
+    return CompiledEvaluator(feature_coefficients(strategies, weights, strategy_features, skip_unknown), size)
+
+
+if __name__ == "__main__":
+    import argparse
+    from AI_heuristicsForExpectimax import AI_Heuristics
+
+    parser = argparse.ArgumentParser(description="Write the memory-mapped row tables for the current best weights")
+    parser.add_argument("--path", default=TABLE_FILE)
+    args = parser.parse_args()
+
+    heuristics = AI_Heuristics()
+    path = write_tables(args.path, {'weighted': heuristics.evaluate, 'unweighted': heuristics.evaluate_unweighted})
+    print(f"Row tables saved to '{path}' ({os.path.getsize(path) / 2 ** 20:.1f} MB)")
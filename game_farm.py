@@ -0,0 +1,99 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from simulator import Simulator
+
+
+def game_seed(base_seed, game):
+    """Seed of game number ``game``: it depends only on the base seed and the game, never on the worker."""
+    return f"{base_seed}-{game}"
+
+
+class Job:
+    """A batch of games played with the AI built by ``ai_factory()``.
+
+    ``ai_factory`` and ``simulator_kwargs`` are sent to the worker processes,
+    so the factory must be picklable: a module-level function or a
+    functools.partial of one.
+    The games are numbered from ``first_game``, so a later job can continue
+    the seeded games of an earlier one.
+    """
+
+    def __init__(self, label, ai_factory, run_count, simulator_kwargs=None, first_game=1):
+        self.label = label
+        self.ai_factory = ai_factory
+        self.run_count = run_count
+        self.simulator_kwargs = simulator_kwargs or {}
+        self.first_game = first_game
+
+
+def play_chunk(label, ai_factory, games, base_seed, simulator_kwargs):
+    """Play the given game numbers of one job with a single AI instance and return their records."""
+    simulator = Simulator(ai_factory(), **simulator_kwargs)
+    records = []
+    for game in games:
+        record = simulator.play_game(game, seed=game_seed(base_seed, game))
+        record['Job'] = label
+        records.append(record)
+    return records
+
+
+def _chunks(jobs, chunk_size):
+    for job in jobs:
+        games = list(range(job.first_game, job.first_game + job.run_count))
+        for start in range(0, len(games), chunk_size):
+            yield job, games[start:start + chunk_size]
+
+
+def run_games(jobs, workers=None, chunk_size=16, base_seed=0):
+    """Play every game of ``jobs`` on a process pool and yield the records as they finish.
+
+    Records arrive in completion order, but game ``n`` of a job always uses
+    the same seed, so the set of records does not depend on ``workers`` or
+    ``chunk_size``. With ``workers=1`` the games run in this process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for job, games in _chunks(jobs, chunk_size):
+            yield from play_chunk(job.label, job.ai_factory, games, base_seed, job.simulator_kwargs)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_chunk, job.label, job.ai_factory, games, base_seed, job.simulator_kwargs)
+                   for job, games in _chunks(jobs, chunk_size)]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+class RunningAggregate:
+    """Partial per-job aggregates of a stream of game records, for progress reports."""
+
+    def __init__(self):
+        self.games = {}
+        self.score_sums = {}
+        self.max_tiles = {}
+
+    def add(self, record):
+        label = record['Job']
+        self.games[label] = self.games.get(label, 0) + 1
+        self.score_sums[label] = self.score_sums.get(label, 0) + record['Total Score']
+        self.max_tiles[label] = max(self.max_tiles.get(label, 0), record['Max Tile'])
+
+    def summary(self, label):
+        games = self.games.get(label, 0)
+        return {
+            'Job': label,
+            'Games': games,
+            'Max Tile': self.max_tiles.get(label, 0),
+            'Avg Score': self.score_sums[label] / games if games else 0.0
+        }
+
+
+def collect(records):
+    """Group a stream of records by job, each list sorted by game number so that results are order independent."""
+    by_job = {}
+    for record in records:
+        by_job.setdefault(record['Job'], []).append(record)
+    for job_records in by_job.values():
+        job_records.sort(key=lambda record: record['Game'])
+    return by_job
@@ -0,0 +1,316 @@
+import json
+import struct
+import zlib
+import logic
+
+# Binary game records: every game played by a recording Simulator, stored so
+# that it can be replayed move by move. A file is MAGIC, a version byte and
+# a sequence of entries, each a kind byte and a u16 config id followed by:
+#   CONFIG: u32 length and the JSON of an AI config (strategies,
+#           weights, depth...). Games refer to the latest config with their id;
+#           writers number new configs after the ones already in the file.
+#   GAME:   the fixed GAME_HEADER fields, the seed as JSON,
+#           the start spawns and the body: one turn code per move, then a
+#           checkpoint board (one exponent byte per cell) after every
+#           checkpoint_every turns, zlib-compressed when that makes it smaller.
+# A turn code is move index + 4 * spawn code, with moves in the order of
+# logic.commands and spawn code 0 for no spawn, or 1 + 2 * cell + (tile == 4)
+# for cell i * size + j. Boards up to 5x5 need one byte per turn.
+# Entries are only ever appended, so a writer that crashes leaves at most one
+# incomplete entry at the end; readers drop it and the next writer cuts it off.
+
+MAGIC = b"2048GREC"
+VERSION = 1
+CONFIG = 1
+GAME = 2
+CHECKPOINT_EVERY = 256
+# Key under which a recording Simulator adds the encoded game to its result record
+REPLAY_KEY = 'Replay'
+MOVES = list(logic.commands)
+_MOVE_INDEX = {key: index for index, key in enumerate(MOVES)}
+_ZLIB = 1
+
+# game, size, turns, checkpoint_every, flags, max tile exponent, score, tile sum, seed length, start tiles, body length
+GAME_HEADER = struct.Struct('<IBIHBBQQBBI')
+MAX_SEED_LENGTH = 255
+_KIND = struct.Struct('<BH')
+_START = MAGIC + bytes([VERSION])
+
+
+def turn_width(size):
+    """Bytes per turn code on a ``size`` x ``size`` board."""
+    return 1 if 4 * (2 * size * size + 1) <= 256 else 2
+
+
+def spawn_code(size, i, j, value):
+    return 1 + 2 * (i * size + j) + (value == 4)
+
+
+def decode_spawn(size, code):
+    """(row, column, tile) of a spawn code, or None for code 0."""
+    if not code:
+        return None
+    cell, four = divmod(code - 1, 2)
+    i, j = divmod(cell, size)
+    return i, j, 4 if four else 2
+
+
+def _exponents(matrix):
+    return bytes(value.bit_length() - 1 if value else 0 for row in matrix for value in row)
+
+
+class GameEncoder:
+    """Collects the turns of one game; a recording Simulator keeps one per game."""
+
+    def __init__(self, size, config=None, checkpoint_every=CHECKPOINT_EVERY):
+        self.size = size
+        self.config = config or {}
+        self.checkpoint_every = checkpoint_every
+        self.width = turn_width(size)
+        self.start = []
+        self.turns = bytearray()
+        self.checkpoints = bytearray()
+        self.count = 0
+
+    def start_tile(self, i, j, value):
+        self.start.append(spawn_code(self.size, i, j, value))
+
+    def turn(self, move, spawn, matrix):
+        """Record ``move`` and the ``spawn`` (i, j, tile) or None that followed it; ``matrix`` is the board after both."""
+        code = _MOVE_INDEX[move] + 4 * (spawn_code(self.size, *spawn) if spawn else 0)
+        self.turns += code.to_bytes(self.width, 'little')
+        self.count += 1
+        if self.checkpoint_every and self.count % self.checkpoint_every == 0:
+            self.checkpoints += _exponents(matrix)
+
+    def encode(self, seed, game, matrix, score):
+        """The finished game as (config JSON, game bytes), ready for GameRecordWriter.write.
+
+        ``matrix`` is the final board and ``score`` the points of the game.
+        """
+        body = bytes(self.turns + self.checkpoints)
+        flags = 0
+        compressed = zlib.compress(body, 6)
+        if len(compressed) < len(body):
+            body, flags = compressed, _ZLIB
+        seed = json.dumps(seed).encode('utf-8')
+        if len(seed) > MAX_SEED_LENGTH:
+            raise ValueError(f"The seed of a recorded game takes at most {MAX_SEED_LENGTH} bytes of JSON, not {len(seed)}")
+        start = b"".join(code.to_bytes(self.width, 'little') for code in self.start)
+        max_tile = max(max(row) for row in matrix)
+        header = GAME_HEADER.pack(game or 0, self.size, self.count, self.checkpoint_every, flags,
+                                  max_tile.bit_length() - 1 if max_tile else 0, score,
+                                  sum(sum(row) for row in matrix), len(seed), len(self.start), len(body))
+        config = json.dumps(self.config, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return config, header + seed + start + body
+
+
+class GameRecordWriter:
+    """Append-only writer of encoded games; every game is flushed as soon as it is written.
+
+    Opening an existing file cuts off a game left incomplete by a crashed
+    writer and picks up the configs already stored, so that a config is
+    written once per file, before the first game that uses it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            self.file = open(path, 'r+b')
+        except FileNotFoundError:
+            self.file = open(path, 'w+b')
+        self.config_ids = {}
+        self.next_config_id = 0
+        try:
+            end = self._read_configs()
+        except ValueError:
+            self.file.close()
+            raise
+        self.file.seek(end)
+        self.file.truncate()
+        if end == 0:
+            self.file.write(_START)
+        self.games = 0
+
+    def _read_configs(self):
+        """Collect the configs of the file and return the offset after its last complete entry."""
+        f = self.file
+        start = f.read(len(_START))
+        if len(start) < len(_START) and _START.startswith(start):
+            # An empty file, or one whose writer crashed before finishing the first bytes
+            return 0
+        f.seek(0)
+        _read_start(f, self.path)
+        latest = {}
+        end = f.tell()
+        for kind, config_id, data in _entries(f, self.path, True):
+            if kind == CONFIG:
+                latest[config_id] = data
+            end = f.tell()
+        self.config_ids = {config: config_id for config_id, config in latest.items()}
+        self.next_config_id = max(latest) + 1 if latest else 0
+        return end
+
+    def write(self, encoded):
+        config, game = encoded
+        config_id = self.config_ids.get(config)
+        if config_id is None:
+            if self.next_config_id > 0xFFFF:
+                raise ValueError(f"{self.path} already holds {self.next_config_id} configs")
+            config_id = self.config_ids[config] = self.next_config_id
+            self.next_config_id += 1
+            self.file.write(_KIND.pack(CONFIG, config_id) + struct.pack('<I', len(config)) + config)
+        self.file.write(_KIND.pack(GAME, config_id) + game)
+        self.file.flush()
+        self.games += 1
+
+    def write_record(self, record):
+        """Write the game carried by a Simulator result record and remove it from the record."""
+        encoded = record.pop(REPLAY_KEY, None)
+        if encoded is not None:
+            self.write(encoded)
+        return record
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class GameRecord:
+    """One stored game: ``header`` is a dict of its seed, config and result; the body is decoded on first use."""
+
+    def __init__(self, header, body, compressed):
+        self.header = header
+        self._body = body
+        self._compressed = compressed
+
+    def _decoded(self):
+        if self._compressed:
+            self._body = zlib.decompress(self._body)
+            self._compressed = False
+        return self._body
+
+    def turns(self):
+        """Yield (move, spawn) per turn, with spawn (i, j, tile) or None."""
+        body = self._decoded()
+        size = self.header['size']
+        width = turn_width(size)
+        for offset in range(0, self.header['turns'] * width, width):
+            code = int.from_bytes(body[offset:offset + width], 'little')
+            yield MOVES[code & 3], decode_spawn(size, code >> 2)
+
+    def checkpoints(self):
+        """List of the checkpoint boards as exponent bytes, one per ``checkpoint_every`` turns."""
+        body = self._decoded()
+        cells = self.header['size'] ** 2
+        start = self.header['turns'] * turn_width(self.header['size'])
+        return [body[offset:offset + cells] for offset in range(start, len(body), cells)]
+
+
+def _read_exactly(f, length):
+    data = f.read(length)
+    if len(data) < length:
+        raise EOFError
+    return data
+
+
+def _read_start(f, path):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f"{path} is not a game record file")
+    version = f.read(1)
+    if version != bytes([VERSION]):
+        raise ValueError(f"{path} has game record version {version[0] if version else None}, expected {VERSION}")
+
+
+def _entries(f, path, headers_only):
+    """Yield (kind, config id, data) for every complete entry after the start of a file.
+
+    ``data`` is the config JSON of a CONFIG entry, and for a GAME the header
+    fields, seed JSON, start tiles and body (None with ``headers_only``).
+    Stops before an entry cut off at the end of the file.
+    """
+    try:
+        while True:
+            kind, config_id = _KIND.unpack(_read_exactly(f, _KIND.size))
+            if kind == CONFIG:
+                length = struct.unpack('<I', _read_exactly(f, 4))[0]
+                yield kind, config_id, _read_exactly(f, length)
+                continue
+            if kind != GAME:
+                raise ValueError(f"{path} has an entry of unknown kind {kind}")
+            fields = GAME_HEADER.unpack(_read_exactly(f, GAME_HEADER.size))
+            size, seed_length, start_tiles, body_length = fields[1], fields[8], fields[9], fields[10]
+            seed = _read_exactly(f, seed_length)
+            start = _read_exactly(f, start_tiles * turn_width(size))
+            if headers_only:
+                # Seeking past the end succeeds, so the last byte of the body is read to see that it is there
+                if body_length:
+                    f.seek(body_length - 1, 1)
+                    _read_exactly(f, 1)
+                body = None
+            else:
+                body = _read_exactly(f, body_length)
+            yield kind, config_id, (fields, seed, start, body)
+    except EOFError:
+        return
+
+
+def read_games(path, headers_only=False):
+    """Yield the GameRecords of a file one at a time, without loading the whole file.
+
+    With ``headers_only`` the bodies are skipped on disk and the records have no turns.
+    A game cut off at the end of the file (by a crash of the writer) is dropped.
+    """
+    with open(path, 'rb') as f:
+        _read_start(f, path)
+        configs = {}
+        for kind, config_id, data in _entries(f, path, headers_only):
+            if kind == CONFIG:
+                configs[config_id] = json.loads(data)
+                continue
+            fields, seed, start, body = data
+            (game, size, turns, checkpoint_every, flags, max_exponent, score, tile_sum,
+             seed_length, start_tiles, body_length) = fields
+            width = turn_width(size)
+            header = {
+                'game': game,
+                'seed': json.loads(seed),
+                'size': size,
+                'config': configs.get(config_id),
+                'start': [int.from_bytes(start[k:k + width], 'little') for k in range(0, len(start), width)],
+                'turns': turns,
+                'checkpoint_every': checkpoint_every,
+                'result': {'Max Tile': 1 << max_exponent if max_exponent else 0, 'Total Score': score,
+                           'Tile Sum': tile_sum, 'Total Moves': turns}
+            }
+            yield GameRecord(header, body, bool(flags & _ZLIB))
+
+
+def replay(record):
+    """Replay a GameRecord through logic.commands.
+
+    Yields (turn, move, board, points) after every turn, the board including
+    the spawned tile; turn 0 is the start position with move None. Raises
+    ValueError when a checkpoint does not match the replayed board.
+    """
+    size = record.header['size']
+    matrix = [[0] * size for _ in range(size)]
+    for code in record.header['start']:
+        i, j, value = decode_spawn(size, code)
+        matrix[i][j] = value
+    yield 0, None, matrix, 0
+    checkpoints = record.checkpoints()
+    every = record.header['checkpoint_every']
+    for turn, (move, spawn) in enumerate(record.turns(), 1):
+        matrix, done, points = logic.commands[move](matrix)
+        if spawn is not None:
+            i, j, value = spawn
+            matrix[i][j] = value
+        if every and turn % every == 0 and _exponents(matrix) != checkpoints[turn // every - 1]:
+            raise ValueError(f"Game {record.header['game']} does not match its checkpoint at turn {turn}")
+        yield turn, move, matrix, points
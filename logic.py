@@ -119,13 +119,28 @@ def get_empty_cells(board):
             if board[i][j] == 0:
                 empty_cells.append((i, j))
     return empty_cells
-def add_two(mat):
-    a, b = random.randint(0, len(mat)-1), random.randint(0, len(mat)-1)
-    while mat[a][b] != 0:
-        a, b = random.randint(0, len(mat)-1), random.randint(0, len(mat)-1)
-    mat[a][b] = 4 if random.randint(0, 9) == 9 else 2
+def add_two(mat, rng=random):
+    """
+    Place a 2 (90%) or a 4 (10%) on a uniformly chosen empty cell; a full board is left as it is.
+    :param rng: anything with a random() method: the global random module by default, a random.Random,
+                a NumPy Generator or a seeding.SeedStream
+    """
+    empty_cells = get_empty_cells(mat)
+    if empty_cells:
+        spawn_tile(mat, empty_cells, rng)
     return mat
 
+def spawn_tile(mat, empty_cells, rng=random):
+    """
+    Place a 2 (90%) or a 4 (10%) on one of ``empty_cells`` in constant time.
+    Uses exactly two draws, the cell and then the tile, in the same way as the bitboard and batch engines.
+    :param empty_cells: non-empty list of the (row, column) positions of the empty cells, in row-major order
+    :return: the (row, column) of the new tile
+    """
+    i, j = empty_cells[int(rng.random() * len(empty_cells))]
+    mat[i][j] = 4 if rng.random() < 0.1 else 2
+    return i, j
+
 def game_state(mat):
     for row in mat:
         if 2048 in row:
@@ -133,8 +148,9 @@ def game_state(mat):
     for row in mat:
         if 0 in row:
             return 'not over'
-    for i in range(c.GRID_LEN):
-        for j in range(c.GRID_LEN - 1):
+    n = len(mat)
+    for i in range(n):
+        for j in range(n - 1):
             if mat[i][j] == mat[i][j + 1]:
                 return 'not over'
             if mat[j][i] == mat[j + 1][i]:
@@ -145,14 +161,16 @@ def reverse(mat):
     return [row[::-1] for row in mat]
 
 def transpose(mat):
-    return [[mat[j][i] for j in range(c.GRID_LEN)] for i in range(c.GRID_LEN)]
+    n = len(mat)
+    return [[mat[j][i] for j in range(n)] for i in range(n)]
 
 def cover_up(mat):
-    new = [[0] * c.GRID_LEN for _ in range(c.GRID_LEN)]
+    n = len(mat)
+    new = [[0] * n for _ in range(n)]
     done = False
-    for i in range(c.GRID_LEN):
+    for i in range(n):
         count = 0
-        for j in range(c.GRID_LEN):
+        for j in range(n):
             if mat[i][j] != 0:
                 new[i][count] = mat[i][j]
                 if j != count:
@@ -162,8 +180,9 @@ def cover_up(mat):
 
 def merge(mat, done):
     points = 0
-    for i in range(c.GRID_LEN):
-        for j in range(c.GRID_LEN-1):
+    n = len(mat)
+    for i in range(n):
+        for j in range(n-1):
             if mat[i][j] == mat[i][j+1] and mat[i][j] != 0:
                 mat[i][j] *= 2
                 mat[i][j+1] = 0
@@ -201,6 +220,106 @@ def right(game):
     game = reverse(game)
     return game, done, points
 
+def _move_rows_into(game, out, backwards):
+    n = len(game)
+    order = range(n - 1, -1, -1) if backwards else range(n)
+    done = False
+    points = 0
+    for i in range(n):
+        source = game[i]
+        target = out[i]
+        write = 0
+        pending = 0
+        for k in order:
+            value = source[k]
+            if not value:
+                continue
+            if pending == value:
+                # Two equal tiles meet: the pending one becomes their sum
+                pending *= 2
+                points += pending
+            elif pending:
+                position = order[write]
+                done = done or source[position] != pending
+                target[position] = pending
+                write += 1
+                pending = value
+                continue
+            else:
+                pending = value
+                continue
+            position = order[write]
+            done = done or source[position] != pending
+            target[position] = pending
+            write += 1
+            pending = 0
+        if pending:
+            position = order[write]
+            done = done or source[position] != pending
+            target[position] = pending
+            write += 1
+        for k in range(write, n):
+            position = order[k]
+            done = done or source[position] != 0
+            target[position] = 0
+    return done, points
+
+def _move_columns_into(game, out, backwards):
+    n = len(game)
+    order = range(n - 1, -1, -1) if backwards else range(n)
+    done = False
+    points = 0
+    for j in range(n):
+        write = 0
+        pending = 0
+        for k in order:
+            value = game[k][j]
+            if not value:
+                continue
+            if pending == value:
+                pending *= 2
+                points += pending
+            elif pending:
+                position = order[write]
+                done = done or game[position][j] != pending
+                out[position][j] = pending
+                write += 1
+                pending = value
+                continue
+            else:
+                pending = value
+                continue
+            position = order[write]
+            done = done or game[position][j] != pending
+            out[position][j] = pending
+            write += 1
+            pending = 0
+        if pending:
+            position = order[write]
+            done = done or game[position][j] != pending
+            out[position][j] = pending
+            write += 1
+        for k in range(write, n):
+            position = order[k]
+            done = done or game[position][j] != 0
+            out[position][j] = 0
+    return done, points
+
+def move_into(game, key, out):
+    """
+    Apply the move ``key`` to ``game`` and write the resulting board into ``out``.
+    Gives the same board, done and points as commands[key], without allocating a new board.
+    :param out: board of the same size to overwrite; it may be ``game`` itself
+    :return: (done, points)
+    """
+    if key == c.KEY_LEFT:
+        return _move_rows_into(game, out, False)
+    if key == c.KEY_RIGHT:
+        return _move_rows_into(game, out, True)
+    if key == c.KEY_UP:
+        return _move_columns_into(game, out, False)
+    return _move_columns_into(game, out, True)
+
 # Define the commands dictionary to map keys to functions
 commands = {
     c.KEY_UP: up,
@@ -208,3 +327,38 @@ commands = {
     c.KEY_LEFT: left,
     c.KEY_RIGHT: right
 }
+
+def has_won(game):
+    """Whether a 2048 tile is on the board, the 'win' case of game_state."""
+    for row in game:
+        if 2048 in row:
+            return True
+    return False
+
+def legal_moves(game):
+    """
+    Apply every move once and keep the ones that change the board.
+    :return: list of (key, new board, points), in the order of commands
+    """
+    n = len(game)
+    moves = []
+    for key in commands:
+        new = [[0] * n for _ in range(n)]
+        done, points = move_into(game, key, new)
+        if done:
+            moves.append((key, new, points))
+    return moves
+
+def analyze(game):
+    """
+    Game state and legal moves of a board from a single pass over the four moves.
+    A board with legal moves is not over; one without is lost unless it still has an empty cell,
+    which only happens on the all-empty board.
+    :return: (state, moves) with state as in game_state and moves as in legal_moves
+    """
+    moves = legal_moves(game)
+    if has_won(game):
+        return 'win', moves
+    if moves or any(0 in row for row in game):
+        return 'not over', moves
+    return 'lose', moves
@@ -0,0 +1,220 @@
+import argparse
+import bisect
+import functools
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+import bitboard
+import logic
+import constants as c
+import symmetry
+import AI_expectimax
+from search_stats import SearchStats
+
+# Opening book: the deep-search move of every early 4x4 position, computed
+# once and looked up by AI_both.AI.get_move before it searches. The file is an
+# 8-byte magic, a 4-byte header length, a JSON header (padded so that the keys
+# start on an 8-byte boundary), the sorted board keys as native u64 and one
+# move byte per key, the index of the move in logic.commands. A key is the
+# bitboard of the position, or its canonical bitboard when the evaluator is
+# symmetric, in which case the move is the one for the canonical board.
+# Only the images of a position have the same value, not their float sums, so
+# a canonical position whose best moves score within TIE_TOLERANCE of each
+# other is left out: the search could break the tie either way on another image.
+
+BOOK_MAGIC = b"2048BOOK"
+BOOK_FILE = c.OPENING_BOOK_FILE
+VERSION = 1
+# The scripts start their games with four tiles; the book covers them until the board holds more than DEFAULT_MAX_TILES
+DEFAULT_START_TILES = 4
+DEFAULT_MAX_TILES = 6
+DEFAULT_DEPTH = 4
+# Relative difference of root scores under which the best move of a canonical position counts as a tie
+TIE_TOLERANCE = 1e-9
+MOVES = list(logic.commands)
+_MOVE_INDEX = {key: index for index, key in enumerate(MOVES)}
+# Positions sent to a pool worker at a time
+CHUNK_SIZE = 64
+
+
+def book_config(depth=DEFAULT_DEPTH, prob_threshold=None):
+    """The search settings a book is valid for: the evaluator coefficients, depth and prob_threshold."""
+    return {'coefficients': AI_expectimax.get_heuristics().evaluate_unweighted.coefficients,
+            'depth': depth, 'prob_threshold': prob_threshold}
+
+
+def _tile_count(board):
+    return 16 - bitboard.count_empty(board)
+
+
+def start_positions(start_tiles):
+    """Every bitboard with ``start_tiles`` tiles of 2 or 4."""
+    boards = [0]
+    for _ in range(start_tiles):
+        boards = {board | (exponent << (4 * cell)) for board in boards
+                  for cell in range(16) if not (board >> (4 * cell)) & 0xF for exponent in (1, 2)}
+    return boards
+
+
+def _book_moves(depth, prob_threshold, symmetric, board):
+    """Indexes of the moves expectimax_decision may pick for a bitboard; empty when there is none.
+
+    That is the move it picks and, with a ``symmetric`` evaluator, every move
+    scoring within TIE_TOLERANCE of it, which the search may pick instead on
+    another image of the board.
+    """
+    stats = SearchStats() if symmetric else None
+    move = AI_expectimax.expectimax_decision(bitboard.from_bitboard(board), depth, prob_threshold=prob_threshold,
+                                             stats=stats)
+    if move is None:
+        return []
+    if stats is None:
+        return [_MOVE_INDEX[move]]
+    scores = {key: result['score'] for key, result in stats.iterations[0]['root_moves'].items()}
+    best = scores[move]
+    return [_MOVE_INDEX[key] for key, score in scores.items()
+            if key == move or best - score <= TIE_TOLERANCE * max(1.0, abs(best))]
+
+
+def build_book(max_tiles=DEFAULT_MAX_TILES, start_tiles=DEFAULT_START_TILES, depth=DEFAULT_DEPTH,
+               prob_threshold=None, executor=None, on_level=None):
+    """Search every position the AI can reach with at most ``max_tiles`` tiles; returns {key: move index}.
+
+    The positions are the boards with ``start_tiles`` tiles and, turn by turn,
+    every spawn after the move the book picked, as long as the board holds no
+    more than ``max_tiles`` tiles. Following only the book's own move keeps
+    the book to the boards the AI can actually face, a small fraction of all
+    boards with that many tiles. A position with tied best moves is not
+    stored, and the spawns after every one of them are followed.
+    With an ``executor`` (a process pool) the positions of a turn are
+    searched in parallel.
+    ``on_level(turn, positions, book size)`` is called after every turn.
+    """
+    symmetric = AI_expectimax.get_heuristics().evaluate_unweighted.is_symmetric
+    key = symmetry.canonical_key if symmetric else (lambda board: board)
+    search = functools.partial(_book_moves, depth, prob_threshold, symmetric)
+    book = {}
+    searched = set()
+    frontier = sorted({key(board) for board in start_positions(start_tiles)})
+    turn = 0
+    while frontier:
+        if executor is None:
+            moves = map(search, frontier)
+        else:
+            moves = executor.map(search, frontier, chunksize=CHUNK_SIZE)
+        following = set()
+        for board, best_moves in zip(frontier, moves):
+            searched.add(board)
+            if len(best_moves) == 1:
+                book[board] = best_moves[0]
+            for move in best_moves:
+                new_board = bitboard.commands[MOVES[move]](board)[0]
+                if _tile_count(new_board) >= max_tiles:
+                    continue  # Every spawn would leave more than max_tiles tiles
+                for i, j in bitboard.get_empty_cells(new_board):
+                    for value in (2, 4):
+                        following.add(key(bitboard.set_cell(new_board, i, j, value)))
+        frontier = sorted(following.difference(searched))
+        turn += 1
+        if on_level is not None:
+            on_level(turn, len(frontier), len(book))
+    return book
+
+
+def write_book(book, path=BOOK_FILE, config=None, **header):
+    """Write {key: move index} to ``path``; ``config`` is the book_config it was built with.
+
+    Like evaluator.write_tables, the file is written to a temporary file first.
+    """
+    keys = sorted(book)
+    header = json.dumps(dict(header, version=VERSION, byteorder=sys.byteorder, config=config,
+                             symmetric=AI_expectimax.get_heuristics().evaluate_unweighted.is_symmetric,
+                             count=len(keys))).encode('utf-8')
+    header += b" " * (-(len(BOOK_MAGIC) + 4 + len(header)) % 8)
+    temporary = path + ".tmp"
+    with open(temporary, 'wb') as f:
+        f.write(BOOK_MAGIC)
+        f.write(len(header).to_bytes(4, 'little'))
+        f.write(header)
+        f.write(array('Q', keys).tobytes())
+        f.write(bytes(book[board] for board in keys))
+    os.replace(temporary, path)
+    return path
+
+
+class OpeningBook:
+    """A memory-mapped book file; ``move(board)`` is the book move of a list-of-lists board, or None."""
+
+    def __init__(self, path=BOOK_FILE):
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        if bytes(view[:len(BOOK_MAGIC)]) != BOOK_MAGIC:
+            raise ValueError(f"{path} is not an opening book file")
+        start = len(BOOK_MAGIC) + 4
+        header_length = int.from_bytes(view[len(BOOK_MAGIC):start], 'little')
+        self.header = json.loads(bytes(view[start:start + header_length]).decode('utf-8'))
+        if self.header['version'] != VERSION:
+            raise ValueError(f"{path} has opening book version {self.header['version']}, expected {VERSION}")
+        if self.header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path} was written on a {self.header['byteorder']}-endian machine")
+        self.config = self.header['config']
+        self.symmetric = self.header['symmetric']
+        count = self.header['count']
+        offset = start + header_length
+        self.keys = view[offset:offset + 8 * count].cast('Q')
+        self.moves = view[offset + 8 * count:offset + 9 * count]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def move(self, board):
+        if len(board) != 4:
+            return None
+        if self.symmetric:
+            key, transform_id = symmetry.canonical_matrix(board)
+        else:
+            key, transform_id = bitboard.to_bitboard(board), symmetry.IDENTITY
+        index = bisect.bisect_left(self.keys, key)
+        if index == len(self.keys) or self.keys[index] != key:
+            return None
+        return symmetry.move_from_canonical(MOVES[self.moves[index]], transform_id)
+
+
+def load_book(path, config):
+    """The OpeningBook at ``path`` if it exists and was built with ``config``, else None."""
+    if path is None or not os.path.exists(path):
+        return None
+    book = OpeningBook(path)
+    # A book built with other weights or another depth would play different moves than the search
+    if book.config != config:
+        print(f"Not using the opening book '{path}': it was built for other weights or search settings")
+        return None
+    return book
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the opening book of the expectimax AI")
+    parser.add_argument("--max-tiles", type=int, default=DEFAULT_MAX_TILES,
+                        help="most tiles on a position in the book")
+    parser.add_argument("--start-tiles", type=int, default=DEFAULT_START_TILES, help="tiles on the first board of a game")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--prob-threshold", type=float, default=None)
+    parser.add_argument("--workers", type=int, default=None, help="search processes (default: one per CPU, 1 for no pool)")
+    parser.add_argument("--path", default=BOOK_FILE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    on_level = lambda turn, positions, size: print(f"Turn {turn}: {size} positions searched, {positions} next")
+    if args.workers == 1:
+        book = build_book(args.max_tiles, args.start_tiles, args.depth, args.prob_threshold, on_level=on_level)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(args.workers) as executor:
+            book = build_book(args.max_tiles, args.start_tiles, args.depth, args.prob_threshold, executor, on_level)
+    write_book(book, args.path, book_config(args.depth, args.prob_threshold),
+               max_tiles=args.max_tiles, start_tiles=args.start_tiles)
+    print(f"{len(book)} positions written to '{args.path}' in {time.perf_counter() - started:.1f}s")
@@ -1,114 +1,161 @@
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import StandardScaler
-import numpy as np
+import argparse
+import math
 import random
-import logic
+import functools
 import constants as c
 import AI_heuristics as AI
-from tkinter import Frame
-
-class GameGrid(Frame):
-    def __init__(self):
-        super().__init__()
-        self.grid()
-        self.master.title('2048')
-        self.done = False
-
-        # Only use the primary movement keys (remove references to alternative keys)
-        self.commands = {
-            c.KEY_UP: logic.up,
-            c.KEY_DOWN: logic.down,
-            c.KEY_LEFT: logic.left,
-            c.KEY_RIGHT: logic.right
-        }
-
-        self.matrix = logic.new_game(c.GRID_LEN)
-        self.history_matrixs = []
-        self.run_simulation()
-
-    def run_simulation(self):
-        # List of strategies available from AI_heuristics.py
-        strategies = ["empty_tile", "monotonicity", "smoothness",
-                       "merge_opportunities", "max_score", 
-                      "max_free_lines", 
-                       "same_row_col", "tile_grouping",
-                       "adjacent_same_tiles", "balance_spread"]
-
-        # This will store aggregated results for each strategy
-        aggregated_results = {
-            'Strategy': [],
-            'Max Tile': [],
-            'Avg Score': []
-        }
-
-        for strategy in strategies:
-            max_tiles = []  # Store max tile for each run
-            scores = []  # Store scores for each run
-
-            # Running 100 simulations for each strategy
-            for i in range(1000):  # Loop over 100 runs per strategy
-                self.matrix = logic.new_game(c.GRID_LEN)
-                self.done = False
-                self.points = 0
-
-                while not self.done:
-                    # AI_play returns the best move based on the strategy
-                    key = AI.AI_play(self.matrix, strategy)
-
-                    if key is None:
-                        key = random.choice([c.KEY_UP, c.KEY_DOWN, c.KEY_LEFT, c.KEY_RIGHT])
-
-                    # Perform the move using the logic commands (up, down, left, right)
-                    self.matrix, done, points = self.commands[key](self.matrix)
-                    self.points += points
-                    if done:
-                        self.matrix = logic.add_two(self.matrix)
-
-                    # Check game state
-                    if logic.game_state(self.matrix) == 'win' or logic.game_state(self.matrix) == 'lose':
-                        self.done = True
-
-                # Get the maximum tile achieved during the game
-                max_tile = max(max(row) for row in self.matrix)
-
-                # Ensure the max_tile is a power of 2
-                if max_tile > 0:
-                    max_tile = 2 ** round(np.log2(max_tile))  # Ensure it's a power of 2
-
-                # Append the max tile and score for this run
-                max_tiles.append(max_tile)
-                scores.append(self.points)
-
-            # Append the aggregated results (max of max_tiles and average score)
-            aggregated_results['Strategy'].append(strategy)
-            aggregated_results['Max Tile'].append(max(max_tiles))  # Max of max tiles
-            aggregated_results['Avg Score'].append(np.mean(scores))  # Average score over 100 runs
-
-        # Save aggregated results of all strategies to an Excel file
-        df = pd.DataFrame(aggregated_results)
-        df.to_excel("aggregated_simulation_results.xlsx", index=False)
-        print("Aggregated simulation results saved to 'aggregated_simulation_results.xlsx'")
-
-    def find_top_strategies(self, n=5):
-        # Read the Excel file with aggregated results
-        df = pd.read_excel("aggregated_simulation_results.xlsx")
-
-        # Sort first by 'Max Tile' (descending), and in case of ties, by 'Avg Score' (descending)
-        df_sorted = df.sort_values(by=['Max Tile', 'Avg Score'], ascending=[False, False])
-
-        # Select the top 'n' strategies
-        top_strategies = df_sorted.head(n)
-
-        # Save top strategies to a new Excel file
-        top_strategies.to_excel("top_strategies.xlsx", index=False)
-
-        print(f"Top {n} Strategies based on Max Tile and Avg Score saved to 'top_strategies.xlsx'")
-        print(top_strategies[['Strategy', 'Max Tile', 'Avg Score']])
-        return top_strategies
+import game_farm
+import results_store
+import seeding
+import racing
+
+# List of strategies available from AI_heuristics.py
+STRATEGIES = ["empty_tile", "monotonicity", "smoothness",
+              "merge_opportunities", "max_score",
+              "max_free_lines",
+              "same_row_col", "tile_grouping",
+              "adjacent_same_tiles", "balance_spread"]
+
+class StrategyAI:
+    """Exposes a single AI_heuristics strategy through the get_move interface used by Simulator."""
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+
+    def get_move(self, matrix):
+        # AI_play returns the best move based on the strategy
+        key = AI.AI_play(matrix, self.strategy)
+        if key is None:
+            key = random.choice([c.KEY_UP, c.KEY_DOWN, c.KEY_LEFT, c.KEY_RIGHT])
+        return key
+
+def game_max_tile(record):
+    """Max tile of one game, as a power of 2."""
+    max_tile = record['Max Tile']
+    # Ensure the max_tile is a power of 2
+    if max_tile > 0:
+        max_tile = 2 ** round(math.log2(max_tile))
+    return max_tile
+
+def summarize_games(strategy, records):
+    """Aggregate the per-game records of one strategy into a row of the results table."""
+    max_tiles = []  # Store max tile for each run
+    scores = []  # Store scores for each run
+    for record in records:
+        max_tiles.append(game_max_tile(record))
+        scores.append(record['Total Score'])
+    # Max of max_tiles and average score
+    return {'Strategy': strategy, 'Max Tile': int(max(max_tiles)), 'Avg Score': sum(scores) / len(scores), 'Games': len(scores)}
+
+def play_strategy_batch(strategy, run_count, seed=0, first_game=1):
+    """Play games ``first_game`` .. ``first_game + run_count - 1`` of one strategy in lockstep with the NumPy batch engine.
+
+    Game ``n`` uses the spawn stream of game_farm.game_seed(seed, n), the same as in the 'farm' engine.
+    """
+    import batch_engine  # NumPy is only loaded by the batch engine, not by farm workers importing this module
+    games = range(first_game, first_game + run_count)
+    streams = seeding.BatchStreams([game_farm.game_seed(seed, game) for game in games])
+    game = batch_engine.BatchGame(run_count, streams)
+    game.run(functools.partial(AI.batch_AI_play, strategy=strategy))
+    records = game.records()
+    for record in records:
+        record['Game'] += first_game - 1
+    return records
+
+def play_strategies_farm(strategies, run_count, workers=None, seed=0, progress_every=1000, first_game=1):
+    """Play ``run_count`` games per strategy, numbered from ``first_game``, on ``workers`` processes with the list-based engine."""
+    jobs = [game_farm.Job(strategy, functools.partial(StrategyAI, strategy), run_count, first_game=first_game)
+            for strategy in strategies]
+    progress = game_farm.RunningAggregate()
+    records = []
+    for n, record in enumerate(game_farm.run_games(jobs, workers, base_seed=seed), 1):
+        records.append(record)
+        progress.add(record)
+        if n % progress_every == 0:
+            current = progress.summary(record['Job'])
+            print(f"{n}/{run_count * len(strategies)} games - {current['Job']}: {current['Games']} games, "
+                  f"Max Tile {current['Max Tile']}, Avg Score {current['Avg Score']:.1f}")
+    return game_farm.collect(records)
+
+def print_race_round(games_played, alive, dropped):
+    if dropped:
+        print(f"After {games_played} games: dropped {', '.join(dropped)}; {len(alive)} strategies left")
+
+def run_simulation(strategies=STRATEGIES, run_count=1000, engine='batch', workers=None, seed=0, progress_every=1000, excel=False,
+                   race=True, keep=5, round_games=50, race_tile=None):
+    """Play up to ``run_count`` games per strategy and save the aggregated results.
+
+    ``engine`` is 'batch' (all games of a strategy advanced together with
+    NumPy) or 'farm' (one game per call, spread over ``workers`` processes).
+    Every strategy plays with the same seed, so the results only depend on ``seed``.
+    With ``race`` the strategies play rounds of ``round_games`` games, and a
+    strategy stops as soon as ``keep`` others have a higher average score
+    with 99% confidence (see racing.race), or with ``race_tile`` a higher rate
+    of reaching that tile. The strategies that can still make the top ``keep``
+    play all ``run_count`` games; the Max Tile of a dropped one only covers the
+    games it played.
+    """
+    if engine == 'batch':
+        def play(candidates, first_game, games):
+            return {strategy: play_strategy_batch(strategy, games, seed, first_game) for strategy in candidates}
+    elif engine == 'farm':
+        def play(candidates, first_game, games):
+            return play_strategies_farm(candidates, games, workers, seed, progress_every, first_game)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+
+    if race:
+        score = racing.reached(race_tile) if race_tile else racing.game_score
+        records_by_strategy, games_played = racing.race(strategies, play, keep, run_count, round_games, score=score,
+                                                        on_round=print_race_round)
+        full = run_count * len(strategies)
+        print(f"Racing played {games_played} of {full} games ({full - games_played} saved)")
+    else:
+        records_by_strategy = play(strategies, 1, run_count)
+
+    # This will store aggregated results for each strategy
+    aggregated_results = [summarize_games(strategy, records_by_strategy[strategy]) for strategy in strategies]
+
+    # Save aggregated results of all strategies for find_top_strategies
+    path = results_store.write_rows("aggregated_simulation_results", aggregated_results)
+    print(f"Aggregated simulation results saved to '{path}'")
+    if excel:
+        print(f"Exported to '{results_store.export_excel('aggregated_simulation_results')}'")
+
+def find_top_strategies(n=5, excel=False):
+    # Read the aggregated results saved by run_simulation
+    rows = results_store.read_rows("aggregated_simulation_results")
+
+    # Sort first by 'Max Tile' (descending), and in case of ties, by 'Avg Score' (descending)
+    rows_sorted = sorted(rows, key=lambda row: (-row['Max Tile'], -row['Avg Score']))
+
+    # Select the top 'n' strategies
+    top_strategies = rows_sorted[:n]
+
+    # Save top strategies for the weight search
+    path = results_store.write_rows("top_strategies", top_strategies)
+    if excel:
+        results_store.export_excel("top_strategies")
+
+    print(f"Top {n} Strategies based on Max Tile and Avg Score saved to '{path}'")
+    for row in top_strategies:
+        print(f"{row['Strategy']:<22} {row['Max Tile']:>6} {row['Avg Score']:>10.2f}")
+    return top_strategies
 
 
 if __name__ == "__main__":
-    gamegrid = GameGrid()
-
-    top_strategies = gamegrid.find_top_strategies(5)
+    parser = argparse.ArgumentParser(description="Compare the single-heuristic strategies")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--engine", choices=["batch", "farm"], default="batch")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-race", action="store_true", help="play every game of every strategy instead of racing them")
+    parser.add_argument("--race-tile", type=int, default=None,
+                        help="race on the rate of reaching this tile instead of the average score")
+    parser.add_argument("--excel", action="store_true", help="also export the result tables to .xlsx")
+    args = parser.parse_args()
+
+    run_simulation(run_count=args.games, engine=args.engine, workers=args.workers, seed=args.seed, excel=args.excel,
+                   race=not args.no_race, race_tile=args.race_tile)
+
+    top_strategies = find_top_strategies(5, excel=args.excel)
@@ -1,90 +1,107 @@
+import argparse
 import tkinter as tk
-from tkinter import Frame
-import logic
-import constants as c
 import AI_both as AI
-import pandas as pd
+import AI_expectimax
+from simulator import Simulator
+import viewer
+import results_store
+import search_stats
+import game_records
 
-class GameGrid(Frame):
-    def __init__(self, ai, run_count=1 , delay=1, master=None):
-        Frame.__init__(self, master)
-        self.grid()
-        self.master.title('2048')
-        self.grid_cells = []
-        self.ai = ai  # Expectimax AI or any other AI passed to the game
-        self.run_count = run_count
-        self.delay = delay  # delay in milliseconds, use with after()
-        self.all_results = []
-        self.current_game = 0
-        self.init_grid()
-        self.init_matrix()
-        self.run_game_step()
+def print_game_result(record):
+    # 'Total Score' in this script has always been the sum of the tiles on the final board
+    print(f"Game {record['Game']}: Max Tile: {record['Max Tile']}, Total Score: {record['Tile Sum']}")
+
+class ResultsSaver:
+    """Prints every finished game and appends it to the results table right away.
 
-    def init_grid(self):
-        background = Frame(self, bg=c.BACKGROUND_COLOR_GAME, width=c.SIZE, height=c.SIZE)
-        background.grid()
-        for i in range(c.GRID_LEN):
-            grid_row = []
-            for j in range(c.GRID_LEN):
-                cell = Frame(background, bg=c.BACKGROUND_COLOR_CELL_EMPTY, width=c.SIZE / c.GRID_LEN, height=c.SIZE / c.GRID_LEN)
-                cell.grid(row=i, column=j, padx=c.GRID_PADDING, pady=c.GRID_PADDING)
-                t = tk.Label(master=cell, text="", bg=c.BACKGROUND_COLOR_CELL_EMPTY, justify=tk.CENTER, font=c.FONT, width=4, height=2)
-                t.grid()
-                grid_row.append(t)
-            self.grid_cells.append(grid_row)
+    With a game_records.GameRecordWriter as ``recorder`` the recorded games are appended to it too.
+    """
 
-    def init_matrix(self):
-        self.matrix = logic.new_game(c.GRID_LEN)
-        self.add_random_tile()
-        self.add_random_tile()
-        self.update_grid_cells()
+    def __init__(self, results_format='csv', excel=False, recorder=None):
+        self.writer = results_store.ResultsWriter("multiple_game_results", results_format)
+        self.excel = excel
+        self.recorder = recorder
 
-    def update_grid_cells(self):
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN):
-                new_number = self.matrix[i][j]
-                if new_number == 0:
-                    self.grid_cells[i][j].configure(text="", bg=c.BACKGROUND_COLOR_CELL_EMPTY)
-                else:
-                    self.grid_cells[i][j].configure(text=str(new_number), bg=c.BACKGROUND_COLOR_DICT.get(new_number, "#3c3a32"),
-                                                    fg=c.CELL_COLOR_DICT.get(new_number, "#f9f6f2"))
-        self.update_idletasks()
+    def game_over(self, record):
+        if self.recorder is not None:
+            self.recorder.write_record(record)
+        print_game_result(record)
+        self.writer.write({'Game': record['Game'], 'Max Tile': record['Max Tile'], 'Total Score': record['Tile Sum']})
 
-    def add_random_tile(self):
-        self.matrix = logic.add_two(self.matrix)
+    def finished(self, all_results=None):
+        self.writer.close()
+        print(f"Results saved to '{self.writer.path}'")
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"{self.recorder.games} games recorded to '{self.recorder.path}'")
+        if self.excel:
+            print(f"Exported to '{results_store.export_excel('multiple_game_results')}'")
 
-    def run_game_step(self):
-        if logic.game_state(self.matrix) == 'not over':
-            move = self.ai.get_move(self.matrix)
-            self.matrix, done, points = logic.commands[move](self.matrix)
-            if done:
-                self.add_random_tile()
+def record_config(ai, time_budget_ms=None):
+    """Settings of the expectimax AI stored in the header of every recorded game."""
+    heuristics = AI_expectimax.get_heuristics()
+    return {'ai': 'AI_both', 'depth': ai.depth, 'max_depth': ai.max_depth, 'prob_threshold': ai.prob_threshold,
+            'time_budget_ms': time_budget_ms, 'strategies': list(heuristics.strategies),
+            'weights': [float(weight) for weight in heuristics.heuristic_weights]}
 
-            self.update_grid_cells()
-            self.after(self.delay, self.run_game_step)  # Schedule the next step
-        else:
-            max_tile = max([max(row) for row in self.matrix])
-            total_score = sum(sum(row) for row in self.matrix)
-            self.all_results.append({'Game': self.current_game + 1, 'Max Tile': max_tile, 'Total Score': total_score})
-            print(f"Game {self.current_game + 1}: Max Tile: {max_tile}, Total Score: {total_score}")
+def make_simulator(ai, run_count=1, time_budget_ms=None, record=False):
+    # The Tk version always put two extra tiles on top of logic.new_game's two
+    return Simulator(ai, run_count=run_count, start_tiles=4, time_budget_ms=time_budget_ms,
+                     record_config=record_config(ai, time_budget_ms) if record else None)
 
-            self.current_game += 1
-            if self.current_game < self.run_count:
-                self.init_matrix()  # Start a new game
-                self.run_game_step()  # Continue to next game
-            else:
-                self.save_results()  # Save the results after all games are done
+def run_headless(ai, run_count=100, time_budget_ms=None, saver=None):
+    """Play the games without a window and save the results."""
+    saver = saver or ResultsSaver()
+    simulator = make_simulator(ai, run_count, time_budget_ms, saver.recorder is not None)
+    all_results = []
+    for game in range(1, run_count + 1):
+        record = simulator.play_game(game)
+        saver.game_over(record)
+        all_results.append(record)
+    saver.finished(all_results)
+    return all_results
 
-    def save_results(self):
-        df = pd.DataFrame(self.all_results)
-        df.to_excel("multiple_game_results.xlsx", index=False)
-        print(f"Results saved to 'multiple_game_results.xlsx'")
+class GameGrid(viewer.GameGrid):
+    """Tk viewer that plays ``run_count`` games with ``ai`` and saves every game as it ends."""
+
+    def __init__(self, ai, run_count=1, delay=1, master=None, time_budget_ms=None, saver=None,
+                 lookahead=viewer.DEFAULT_LOOKAHEAD, fast_forward=False, fps=viewer.DEFAULT_FPS):
+        self.ai = ai  # Expectimax AI or any other AI passed to the game
+        self.run_count = run_count
+        self.saver = saver or ResultsSaver()
+        simulator = make_simulator(ai, run_count, time_budget_ms, self.saver.recorder is not None)
+        viewer.GameGrid.__init__(self, simulator, delay=delay, on_game_over=self.saver.game_over,
+                                 on_finished=self.saver.finished, master=master,
+                                 lookahead=lookahead, fast_forward=fast_forward, fps=fps)
 
-def start_game():
+def start_game(headless=False, run_count=100, time_budget_ms=None, results_format='csv', excel=False, stats=False,
+               fast_forward=False, record_games=None):
+    # With stats, the search statistics of every move are appended to search_stats.jsonl
+    stats_sink = search_stats.JsonlSink() if stats else None
+    ai = AI.AI(stats_sink=stats_sink)  # Use the Expectimax AI or any other AI you want
+    recorder = game_records.GameRecordWriter(record_games) if record_games else None
+    saver = ResultsSaver(results_format, excel, recorder)
+    if headless:
+        run_headless(ai, run_count, time_budget_ms, saver)
+        return
     root = tk.Tk()
-    ai = AI.AI()  # Use the Expectimax AI or any other AI you want
-    game_grid = GameGrid(ai, run_count=100, delay=5, master=root)  # Run 10 games with a delay of 200ms between steps
+    # Show a board every 5ms; the AI plays in a background thread
+    game_grid = GameGrid(ai, run_count=run_count, delay=5, master=root, time_budget_ms=time_budget_ms, saver=saver,
+                         fast_forward=fast_forward)
     root.mainloop()
 
 if __name__ == "__main__":
-    start_game()
+    parser = argparse.ArgumentParser(description="Play 2048 games with the expectimax AI")
+    parser.add_argument("--headless", action="store_true", help="play without opening a window")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--time-budget-ms", type=int, default=None)
+    parser.add_argument("--format", choices=results_store.FORMATS, default="csv", help="format of the results table")
+    parser.add_argument("--excel", action="store_true", help="also export the results to .xlsx")
+    parser.add_argument("--search-stats", action="store_true", help="log the search statistics of every move to search_stats.jsonl")
+    parser.add_argument("--fast-forward", action="store_true",
+                        help="show only the latest board instead of every move (toggle with F in the window)")
+    parser.add_argument("--record-games", metavar="PATH", help="append every game, move by move, to this game record file")
+    args = parser.parse_args()
+    start_game(args.headless, args.games, args.time_budget_ms, args.format, args.excel, args.search_stats,
+               args.fast_forward, args.record_games)
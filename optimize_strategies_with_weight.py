@@ -1,187 +1,175 @@
-import tkinter as tk
-from tkinter import Frame, Label, CENTER
-import logic
-import constants as c
+import argparse
 import AI_heuristics1 as AI  # Import the AI with combined heuristics
-import pandas as pd
-import numpy as np
-import time
-import itertools
+import functools
+import game_farm
+import game_records
+import weight_search
+import results_store
+from simulator import Simulator
+import viewer
 
 def get_top_strategies(n=5):
+    return AI.get_top_strategies(n)
 
-    df = pd.read_excel("top_strategies.xlsx")
-    df_grouped = df.groupby('Strategy').agg({'Max Tile': 'max', 'Avg Score': 'mean'}).reset_index()
-    df_sorted = df_grouped.sort_values(by=['Max Tile', 'Avg Score'], ascending=[False, False])
-    top_strategies = df_sorted.head(n)
-    strategy_names = top_strategies['Strategy'].values
-    return strategy_names
-
-class GameGrid(Frame):
-    def __init__(self, ai, weights, strategies, run_count=2, delay=0.01, master=None):
-        Frame.__init__(self, master)
-        self.grid()
-        self.master.title('2048')
-        self.grid_cells = []
+def make_simulator(ai, run_count=1):
+    # The Tk version always put two extra tiles on top of logic.new_game's two
+    return Simulator(ai, run_count=run_count, start_tiles=4)
+
+class GameGrid(viewer.GameGrid):
+    """Optional Tk viewer that plays ``run_count`` games with the weighted AI."""
+
+    def __init__(self, ai, weights, strategies, run_count=2, delay=0.01, master=None,
+                 lookahead=viewer.DEFAULT_LOOKAHEAD, fast_forward=False, fps=viewer.DEFAULT_FPS):
         self.ai = ai  # Pass the AI with combined heuristics
         self.weights = weights
         self.strategies = strategies
         self.run_count = run_count
-        self.delay = delay
-        self.all_results = []
-        self.init_grid()
-        self.run_multiple_games()
-
-    def init_grid(self):
-        background = Frame(self, bg=c.BACKGROUND_COLOR_GAME, width=c.SIZE, height=c.SIZE)
-        background.grid()
-
-        for i in range(c.GRID_LEN):
-            grid_row = []
-            for j in range(c.GRID_LEN):
-                cell = Frame(background, bg=c.BACKGROUND_COLOR_CELL_EMPTY, width=c.SIZE / c.GRID_LEN, height=c.SIZE / c.GRID_LEN)
-                cell.grid(row=i, column=j, padx=c.GRID_PADDING, pady=c.GRID_PADDING)
-                t = Label(master=cell, text="", bg=c.BACKGROUND_COLOR_CELL_EMPTY, justify=CENTER, font=c.FONT, width=4, height=2)
-                t.grid()
-                grid_row.append(t)
-            self.grid_cells.append(grid_row)
-
-    def init_matrix(self):
-        self.matrix = logic.new_game(c.GRID_LEN)
-        self.add_random_tile()
-        self.add_random_tile()
-
-    def update_grid_cells(self):
-        for i in range(c.GRID_LEN):
-            for j in range(c.GRID_LEN):
-                new_number = self.matrix[i][j]
-                if new_number == 0:
-                    self.grid_cells[i][j].configure(text="", bg=c.BACKGROUND_COLOR_CELL_EMPTY)
-                else:
-                    self.grid_cells[i][j].configure(text=str(new_number), bg=c.BACKGROUND_COLOR_DICT.get(new_number, "#3c3a32"),
-                                                    fg=c.CELL_COLOR_DICT.get(new_number, "#f9f6f2"))
-        self.update_idletasks()
-
-    def add_random_tile(self):
-        self.matrix = logic.add_two(self.matrix)
-
-    def run_game(self):
-        max_tile = 0
-        total_score = 0
-        moves = 0
-
-        self.init_matrix()
-
-        while logic.game_state(self.matrix) == 'not over':
-            move = self.ai.get_move(self.matrix)
-            self.matrix, done, points = logic.commands[move](self.matrix)
-            total_score += points
-            moves += 1
-            if done:
-                self.add_random_tile()
-
-            self.update_grid_cells()
-            self.update()  # Ensure the GUI updates
-            time.sleep(self.delay)  # Optional delay for visualization
-
-        max_tile = max([max(row) for row in self.matrix])
-        return max_tile, total_score, moves
-
-    def run_multiple_games(self):
-        for i in range(self.run_count):
-            max_tile, total_score, moves = self.run_game()
-            print(f"Weights: {self.weights}, Strategies: {self.strategies} - Max Tile: {max_tile}, Total Score: {total_score}, Moves: {moves}")
-            self.all_results.append({
-                'Weights': self.weights,
-                'Strategies': self.strategies,
-                'Max Tile': max_tile,
-                'Total Score': total_score,
-                'Total Moves': moves
-            })
-
-    def get_average_performance(self):
-        df = pd.DataFrame(self.all_results)
-        max_max_tile = df['Max Tile'].max()  # Find the max tile achieved across all games
-        avg_score = df['Total Score'].mean()  # Average score across games
-        return max_max_tile, avg_score
-
-# Function to evaluate different weight combinations
-def evaluate_weights(weights, strategies, num_games=1):
-    ai = AI.AI_Heuristics()  # Instantiate the AI class with combined heuristics
-    ai.set_weights(weights, strategies) 
-
-    all_results = []
-    for _ in range(num_games):
-        root = tk.Tk()  # Create a new window for each game
-        gamegrid = GameGrid(ai, weights, strategies, run_count=1, master=root, delay=0)  # Set delay to 0 for fast execution
-        max_tile, total_score, moves = gamegrid.run_game()
-        all_results.append({
-            'Max Tile': max_tile,
-            'Total Score': total_score,
-            'Total Moves': moves,
-            'Weights': weights,
-            'Strategies': strategies
-        })
-        root.destroy()  # Destroy the window after each game finishes
-
-    # Calculate performance metrics
-    df = pd.DataFrame(all_results)
-    max_max_tile = df['Max Tile'].max()
-    avg_score = df['Total Score'].mean()
-    return max_max_tile, avg_score, df  # Return the DataFrame containing the results
-
-# دریافت استراتژی‌های پویا
-top_strategies = get_top_strategies(n=5)
-
-# Define possible weight values
-weights_range = np.arange(0.0, 1.1, 0.1)
-
-# Generate all valid combinations of weights for the top strategies
-combinations = itertools.product(weights_range, repeat=len(top_strategies)) 
-valid_combinations = [combo for combo in combinations if np.isclose(sum(combo), 1.0)]
-
-best_weights = None
-best_performance = -float('inf')
-best_avg_score = -float('inf')  # To track the best average score
-results = []
-all_results_df = pd.DataFrame()  # To store all results
-
-for weights in valid_combinations:
-    max_max_tile, avg_score, df = evaluate_weights(weights, top_strategies)
-    
-    # Use max_max_tile as the primary performance metric
-    performance = max_max_tile
-
-    print(f"Weights {weights} - Max Max Tile: {max_max_tile}, Avg Score: {avg_score}")
-    
-    results.append({
-        'Weights': weights,
-        'Max Max Tile': max_max_tile,
-        'Avg Score': avg_score
-    })
+        # delay is in seconds here, the viewer schedules its steps in milliseconds
+        viewer.GameGrid.__init__(self, make_simulator(ai, run_count), delay=int(delay * 1000),
+                                 on_game_over=self.print_game_result, master=master,
+                                 lookahead=lookahead, fast_forward=fast_forward, fps=fps)
 
-    # Append the results for this combination to the all_results_df DataFrame
-    all_results_df = pd.concat([all_results_df, df])
+    def print_game_result(self, record):
+        print(f"Weights: {self.weights}, Strategies: {self.strategies} - Max Tile: {record['Max Tile']}, Total Score: {record['Total Score']}, Moves: {record['Total Moves']}")
 
-    # First, select based on Max Max Tile, then based on Avg Score if Max Max Tile is the same
-    if performance > best_performance or (performance == best_performance and avg_score > best_avg_score):
-        best_performance = performance
-        best_avg_score = avg_score
-        best_weights = weights
-
-print(f"\nBest Weights: {best_weights} with Max Max Tile: {best_performance} and Avg Score: {best_avg_score}")
-
-
-best_results = pd.DataFrame({
-    'strategy': top_strategies,
-    'weights': best_weights,  # This will work if best_weights is the same length as top_strategies
-    'performance': [best_performance] * len(top_strategies)  # Repeat the performance for each strategy
-})
+    def get_average_performance(self):
+        """(max max tile, average score) of the games shown so far, as summarize_weights computes them."""
+        return summarize_weights(self.all_results)
 
-best_results.to_excel("best_weights.xlsx", index=False)  # Save the best strategies and weights
-print("Best strategies and weights saved to 'best_weights.xlsx'")
+# Defined in AI_heuristics1 so that game farm workers do not import this script (and tkinter)
+make_weighted_ai = AI.make_weighted_ai
 
-# Save results to Excel
-df_results = pd.DataFrame(results)
-all_results_df.to_excel("detailed_game_results.xlsx", index=False)
-print("Results saved to 'best_weights.xlsx' and 'detailed_game_results.xlsx'")
+def game_row(weights, strategies, record):
+    return {
+        'Max Tile': record['Max Tile'],
+        'Total Score': record['Total Score'],
+        'Total Moves': record['Total Moves'],
+        'Weights': weights,
+        'Strategies': strategies
+    }
+
+def summarize_weights(records):
+    """Performance of one weight combination: (max max tile, average score) over its games."""
+    max_max_tile = max(record['Max Tile'] for record in records)
+    avg_score = sum(record['Total Score'] for record in records) / len(records)
+    return max_max_tile, avg_score
+
+def play_weights(candidates, first_game, games, strategies, workers=None, seed=0, detailed=None, progress_every=100,
+                 recorder=None):
+    """Play games ``first_game`` .. ``first_game + games - 1`` of every weight vector on the game farm.
+
+    Game ``n`` has the same seed for every weight vector. Every game is written
+    to ``detailed`` as soon as it finishes, so a crash keeps everything played so far.
+    With a game_records.GameRecordWriter as ``recorder`` every game is also stored move by move.
+    """
+    jobs = []
+    for weights in candidates:
+        simulator_kwargs = {'start_tiles': 4}
+        if recorder is not None:
+            simulator_kwargs['record_config'] = {'ai': 'AI_heuristics1', 'strategies': list(strategies),
+                                                 'weights': list(weights)}
+        jobs.append(game_farm.Job(tuple(weights), functools.partial(make_weighted_ai, weights, strategies),
+                                  games, simulator_kwargs, first_game))
+    records = []
+    for n, record in enumerate(game_farm.run_games(jobs, workers, base_seed=seed), 1):
+        if recorder is not None:
+            recorder.write_record(record)
+        records.append(record)
+        if detailed is not None:
+            detailed.write(game_row(record['Job'], strategies, record))
+        if n % progress_every == 0:
+            print(f"{n}/{len(jobs) * games} games played")
+    return game_farm.collect(records)
+
+def print_round(round_number, survivors, games, records):
+    best = survivors[0]
+    max_max_tile, avg_score = summarize_weights(records[best])
+    print(f"Round {round_number}: {len(survivors)} weight vectors played {games} more games each - "
+          f"leader {best} with Max Max Tile: {max_max_tile}, Avg Score: {avg_score:.1f} over {len(records[best])} games")
+
+def main(games_per_combination=1, workers=None, seed=0, progress_every=100, results_format='jsonl', excel=False,
+         optimizer='halving', budget=3000, eta=3, record_games=None):
+    """Search the weights of the top strategies and save the best ones.
+
+    ``optimizer`` is 'halving' (successive halving: about ``budget`` games in
+    total, the best 1/eta of the weight vectors go on to play more games, and
+    the winner has the best average score) or 'grid' (``games_per_combination``
+    games for every weight vector, ranked on max tile and then average score).
+    ``record_games`` is the path of a game record file that every game is appended to.
+    """
+    # دریافت استراتژی‌های پویا
+    top_strategies = get_top_strategies(n=5)
+
+    # All weight vectors of multiples of 0.1 that sum to 1
+    valid_combinations = weight_search.weight_grid(len(top_strategies))
+
+    best_weights = None
+    best_performance = -float('inf')
+    best_avg_score = -float('inf')  # To track the best average score
+
+    recorder = game_records.GameRecordWriter(record_games) if record_games else None
+    with results_store.ResultsWriter("detailed_game_results", results_format) as detailed:
+        def play(candidates, first_game, games):
+            return play_weights(candidates, first_game, games, top_strategies, workers, seed, detailed, progress_every,
+                                recorder)
+
+        if optimizer == 'grid':
+            records_by_weights = weight_search.grid_search(valid_combinations, play, games_per_combination)
+        elif optimizer == 'halving':
+            best_weights, records_by_weights, games_played = weight_search.successive_halving(
+                valid_combinations, play, budget, eta, on_round=print_round)
+            print(f"{games_played} games played for {len(valid_combinations)} weight vectors")
+        else:
+            raise ValueError(f"Unknown optimizer: {optimizer}")
+    if recorder is not None:
+        recorder.close()
+        print(f"{recorder.games} games recorded to '{recorder.path}'")
+
+    if optimizer == 'grid':
+        for weights in valid_combinations:
+            max_max_tile, avg_score = summarize_weights(records_by_weights[weights])
+
+            # Use max_max_tile as the primary performance metric
+            performance = max_max_tile
+
+            print(f"Weights {weights} - Max Max Tile: {max_max_tile}, Avg Score: {avg_score}")
+
+            # First, select based on Max Max Tile, then based on Avg Score if Max Max Tile is the same
+            if performance > best_performance or (performance == best_performance and avg_score > best_avg_score):
+                best_performance = performance
+                best_avg_score = avg_score
+                best_weights = weights
+    else:
+        best_performance, best_avg_score = summarize_weights(records_by_weights[best_weights])
+
+    print(f"\nBest Weights: {best_weights} with Max Max Tile: {best_performance} and Avg Score: {best_avg_score}")
+
+
+    best_results = [{
+        'strategy': strategy,
+        'weights': weight,
+        'performance': best_performance
+    } for strategy, weight in zip(top_strategies, best_weights)]
+
+    path = results_store.write_rows("best_weights", best_results)  # Save the best strategies and weights
+    print(f"Best strategies and weights saved to '{path}'")
+    print(f"Per-game results saved to '{detailed.path}'")
+    if excel:
+        for name in ("best_weights", "detailed_game_results"):
+            print(f"Exported to '{results_store.export_excel(name)}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the weights of the top strategies")
+    parser.add_argument("--optimizer", choices=["halving", "grid"], default="halving")
+    parser.add_argument("--budget", type=int, default=3000, help="total games of the halving optimizer")
+    parser.add_argument("--eta", type=int, default=3, help="the halving optimizer keeps 1/eta of the weights after each round")
+    parser.add_argument("--games", type=int, default=1, help="games per weight combination of the grid optimizer")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=results_store.FORMATS, default="jsonl", help="format of the per-game results")
+    parser.add_argument("--excel", action="store_true", help="also export the result tables to .xlsx")
+    parser.add_argument("--record-games", metavar="PATH", help="append every game, move by move, to this game record file")
+    args = parser.parse_args()
+    main(args.games, args.workers, args.seed, results_format=args.format, excel=args.excel,
+         optimizer=args.optimizer, budget=args.budget, eta=args.eta, record_games=args.record_games)
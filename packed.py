@@ -0,0 +1,287 @@
+import random
+import constants as c
+
+# Packed boards of any size: the n x n grid is one Python int (a multi-word
+# int past 64 bits) that holds the exponent of every tile in CELL_BITS bits,
+# with cell (i, j) at cell index i * n + j, so row i is the word of n cells at
+# bit offset i * n * CELL_BITS. The 4x4 board is the bitboard module; other
+# sizes get a PackedEngine with row tables built for their row width.
+
+CELL_BITS = 5  # Exponents up to 31, as the larger boards reach tiles past 32768
+# Rows of up to this many bits get complete tables; wider rows are filled in on first use
+FULL_TABLE_BITS = 16
+WIN_EXPONENT = 11  # 2 ** 11 == 2048
+
+_engines = {}
+
+# Set bits of every byte and their positions, to find the k-th empty cell of a cell mask one byte at a time
+_BYTE_COUNTS = [bin(byte).count("1") for byte in range(256)]
+_BYTE_BITS = [[j for j in range(8) if (byte >> j) & 1] for byte in range(256)]
+
+
+def select_bit(mask, k):
+    """Position of the k-th (from 0) lowest set bit of ``mask``, which has more than k set bits."""
+    offset = 0
+    while True:
+        byte = mask & 0xFF
+        count = _BYTE_COUNTS[byte]
+        if k < count:
+            return offset + _BYTE_BITS[byte][k]
+        k -= count
+        mask >>= 8
+        offset += 8
+
+
+class _RowTable(dict):
+    """Row code -> value, computed by ``function`` the first time a row is looked up."""
+
+    def __init__(self, function):
+        super().__init__()
+        self.function = function
+
+    def __missing__(self, row):
+        value = self[row] = self.function(row)
+        return value
+
+
+class PackedEngine:
+    """Move, spawn and state functions for packed n x n boards, with the same names as the bitboard module."""
+
+    def __init__(self, size, cell_bits=CELL_BITS):
+        self.size = size
+        self.cell_bits = cell_bits
+        self.cell_mask = (1 << cell_bits) - 1
+        self.row_bits = size * cell_bits
+        self.row_mask = (1 << self.row_bits) - 1
+        self.max_exponent_value = self.cell_mask
+        # Lowest bit of every cell, for empty_mask
+        self._low_bits = sum(1 << (cell_bits * k) for k in range(size * size))
+        self._shifts = [self.row_bits * i for i in range(size)]
+        self._win_pattern = sum(WIN_EXPONENT << (cell_bits * k) for k in range(size * size))
+        # The left and right tables hold (shifted row, points), so a row takes one lookup and one merge to fill
+        functions = (self._merge, self._right_row, self._spread_row, self._empty_row, self._row_values)
+        tables = [self.row_table(function) for function in functions]
+        self.row_left_table, self.row_right_table, self._spread_table, self._empty_table, self._values_table = tables
+        self.commands = {
+            c.KEY_UP: self.up,
+            c.KEY_DOWN: self.down,
+            c.KEY_LEFT: self.left,
+            c.KEY_RIGHT: self.right
+        }
+        # (key, row table, whether the rows are those of the transposed board), in the order of commands
+        self._moves = ((c.KEY_UP, self.row_left_table, True), (c.KEY_DOWN, self.row_right_table, True),
+                       (c.KEY_LEFT, self.row_left_table, False), (c.KEY_RIGHT, self.row_right_table, False))
+
+    # Row tables
+
+    def row_table(self, function, lazy=False):
+        """Lookup table of ``function(row code)``: complete for narrow rows, filled in on first use otherwise.
+
+        With ``lazy`` every row is filled in on first use, for functions too slow to run on all row codes.
+        """
+        if self.row_bits <= FULL_TABLE_BITS and not lazy:
+            return [function(row) for row in range(1 << self.row_bits)]
+        # In play only a small fraction of the 2 ** row_bits rows ever occurs
+        return _RowTable(function)
+
+    def _cells(self, row):
+        return [(row >> (self.cell_bits * j)) & self.cell_mask for j in range(self.size)]
+
+    def _pack(self, cells):
+        row = 0
+        for j, exponent in enumerate(cells):
+            row |= exponent << (self.cell_bits * j)
+        return row
+
+    def _merge(self, row):
+        # Same steps as logic.cover_up / logic.merge / logic.cover_up on one row
+        tiles = [tile for tile in self._cells(row) if tile != 0]
+        merged = []
+        points = 0
+        j = 0
+        while j < len(tiles):
+            if j + 1 < len(tiles) and tiles[j] == tiles[j + 1] and tiles[j] < self.max_exponent_value:
+                merged.append(tiles[j] + 1)
+                points += 1 << (tiles[j] + 1)
+                j += 2
+            else:
+                merged.append(tiles[j])
+                j += 1
+        return self._pack(merged), points
+
+    def _reverse(self, row):
+        return self._pack(self._cells(row)[::-1])
+
+    def _right_row(self, row):
+        new, points = self._merge(self._reverse(row))
+        return self._reverse(new), points
+
+    def _spread_row(self, row):
+        # The cells of a row moved to the positions of the same cells in column 0
+        spread = 0
+        for j, exponent in enumerate(self._cells(row)):
+            spread |= exponent << (self.row_bits * j)
+        return spread
+
+    def _row_values(self, row):
+        return tuple(1 << exponent if exponent else 0 for exponent in self._cells(row))
+
+    def _empty_row(self, row):
+        # Bit j set when cell j of the row is empty
+        return sum(1 << j for j, exponent in enumerate(self._cells(row)) if not exponent)
+
+    # Conversions
+
+    def to_bitboard(self, mat):
+        """Convert a list-of-lists board into a packed board."""
+        board = 0
+        shift = 0
+        for row in mat:
+            for value in row:
+                if value:
+                    board |= (value.bit_length() - 1) << shift
+                shift += self.cell_bits
+        return board
+
+    def from_bitboard(self, board):
+        """Convert a packed board back into the list-of-lists form used by logic and the GUI."""
+        values = self._values_table
+        return [list(values[(board >> shift) & self.row_mask]) for shift in self._shifts]
+
+    def transpose(self, board):
+        """Swap the rows and columns of a packed board, one table lookup per row."""
+        spread = self._spread_table
+        result = 0
+        for i, shift in enumerate(self._shifts):
+            result |= spread[(board >> shift) & self.row_mask] << (self.cell_bits * i)
+        return result
+
+    # Moves
+
+    def _shift_rows(self, board, table):
+        new = 0
+        points = 0
+        for shift in self._shifts:
+            row, row_points = table[(board >> shift) & self.row_mask]
+            new |= row << shift
+            points += row_points
+        return new, points
+
+    def left(self, board):
+        new, points = self._shift_rows(board, self.row_left_table)
+        return new, new != board, points
+
+    def right(self, board):
+        new, points = self._shift_rows(board, self.row_right_table)
+        return new, new != board, points
+
+    def up(self, board):
+        new, points = self._shift_rows(self.transpose(board), self.row_left_table)
+        new = self.transpose(new)
+        return new, new != board, points
+
+    def down(self, board):
+        new, points = self._shift_rows(self.transpose(board), self.row_right_table)
+        new = self.transpose(new)
+        return new, new != board, points
+
+    # Cells and state
+
+    def empty_mask(self, board):
+        """Mask with the lowest bit of every empty cell set."""
+        occupied = 0
+        for bit in range(self.cell_bits):
+            occupied |= board >> bit
+        return ~occupied & self._low_bits
+
+    def empty_cells_mask(self, board):
+        """Mask with bit k set for every empty cell k = i * size + j, one table lookup per row."""
+        mask = 0
+        for i, shift in enumerate(self._shifts):
+            mask |= self._empty_table[(board >> shift) & self.row_mask] << (self.size * i)
+        return mask
+
+    def get_empty_cells(self, board):
+        """Return the (row, column) positions of the empty cells of a packed board."""
+        return [divmod(k, self.size) for k in range(self.size * self.size)
+                if not (board >> (self.cell_bits * k)) & self.cell_mask]
+
+    def set_cell(self, board, i, j, value):
+        """Return the packed board with cell (i, j) set to the tile ``value`` (0, 2, 4, ...)."""
+        shift = self.cell_bits * (i * self.size + j)
+        exponent = value.bit_length() - 1 if value else 0
+        return (board & ~(self.cell_mask << shift)) | (exponent << shift)
+
+    def count_empty(self, board):
+        return bin(self.empty_mask(board)).count("1")
+
+    def max_exponent(self, board):
+        best = 0
+        while board:
+            exponent = board & self.cell_mask
+            if exponent > best:
+                best = exponent
+            board >>= self.cell_bits
+        return best
+
+    def spawn_tile(self, board, rng=random, empty=None):
+        """Place a 2 (90%) or a 4 (10%) on a uniformly chosen empty cell in constant time, like bitboard.spawn_tile.
+
+        Returns (new board, cell index, tile), or (board, None, None) on a full board.
+        """
+        if empty is None:
+            empty = self.empty_cells_mask(board)
+        if not empty:
+            return board, None, None
+        cell = select_bit(empty, int(rng.random() * bin(empty).count("1")))
+        exponent = 2 if rng.random() < 0.1 else 1
+        return board | (exponent << (self.cell_bits * cell)), cell, 1 << exponent
+
+    def add_two(self, board, rng=random):
+        """Place a 2 (90%) or a 4 (10%) on a uniformly chosen empty cell, drawing from ``rng`` like logic.add_two."""
+        return self.spawn_tile(board, rng)[0]
+
+    def new_game(self):
+        return self.add_two(self.add_two(0))
+
+    def has_won(self, board):
+        # The cells holding the win exponent are the empty cells of the xor
+        return bool(self.empty_mask(board ^ self._win_pattern))
+
+    def game_state(self, board):
+        """Return 'win', 'not over' or 'lose', matching logic.game_state."""
+        if self.has_won(board):
+            return 'win'
+        if self.empty_mask(board) or self.left(board)[1] or self.up(board)[1]:
+            return 'not over'
+        return 'lose'
+
+    def legal_moves(self, board):
+        """List of (key, new board, points) for the moves that change the board, like logic.legal_moves."""
+        # Up and down shift the rows of the same transposed board
+        transposed = self.transpose(board)
+        moves = []
+        for key, table, vertical in self._moves:
+            new, points = self._shift_rows(transposed if vertical else board, table)
+            if vertical:
+                new = self.transpose(new)
+            if new != board:
+                moves.append((key, new, points))
+        return moves
+
+    def analyze(self, board):
+        moves = self.legal_moves(board)
+        if self.has_won(board):
+            return 'win', moves
+        return ('not over' if moves or self.empty_mask(board) else 'lose'), moves
+
+
+def engine_for(size):
+    """The packed engine for ``size`` x ``size`` boards: the bitboard module for 4x4, a PackedEngine otherwise."""
+    if size == 4:
+        import bitboard  # Its row tables are built on import
+        return bitboard
+    engine = _engines.get(size)
+    if engine is None:
+        engine = _engines[size] = PackedEngine(size)
+    return engine
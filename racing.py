@@ -0,0 +1,78 @@
+import math
+from statistics import NormalDist
+
+# Statistical racing: candidates play the same seeded games in rounds, and a
+# candidate is dropped as soon as enough others are shown to be better.
+# Because game n has the same tile spawns for every candidate (common random
+# numbers), candidates are compared on their per-game differences, whose
+# variance is much smaller than that of the scores themselves.
+# Any per-game statistic can be raced on through its mean: the score, or
+# with ``reached`` the rate of reaching a tile. A max over all games (such as
+# the highest tile) cannot be raced on, since a game still to be played can
+# always raise it.
+
+
+def game_score(record):
+    return record['Total Score']
+
+
+def reached(tile):
+    """Per-game statistic that is 1 for a game whose max tile is at least ``tile`` and 0 otherwise."""
+    def statistic(record):
+        return 1.0 if record['Max Tile'] >= tile else 0.0
+    return statistic
+
+
+def _paired_lower_bounds(scores, z):
+    """Lower confidence bound of mean(scores[b] - scores[a]) for every ordered pair (a, b)."""
+    n = scores.shape[1]
+    differences = scores[None, :, :] - scores[:, None, :]
+    means = differences.mean(axis=2)
+    deviations = differences.std(axis=2, ddof=1) if n > 1 else means * 0
+    return means - z * deviations / math.sqrt(n)
+
+
+def race(candidates, play, keep, max_games, round_games=50, confidence=0.99, score=game_score, on_round=None):
+    """Play up to ``max_games`` games per candidate, dropping those that cannot finish in the top ``keep``.
+
+    ``play(candidates, first_game, games)`` plays games ``first_game`` ..
+    ``first_game + games - 1`` of every candidate and returns {candidate: [records]}.
+    The first round has ``round_games`` games and every later round twice as
+    many, which keeps the number of rounds (and of batches to play) small.
+    After every round, a candidate is dropped when at least ``keep`` others
+    have a higher mean of the per-game ``score`` with the given ``confidence``
+    (Bonferroni-corrected over all pairs). Once no more than ``keep`` are left,
+    the survivors play the rest of the ``max_games`` without further checks, so
+    their records are the same as without racing.
+    ``on_round(games_played, alive, dropped)`` is called after every round.
+
+    Returns ({candidate: records}, games played in total).
+    """
+    import numpy as np
+
+    alive = list(candidates)
+    records = {candidate: [] for candidate in alive}
+    pairs = max(1, len(alive) * (len(alive) - 1) // 2)
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / pairs)
+    played = 0
+    used = 0
+    while played < max_games:
+        games = max_games - played if len(alive) <= keep else min(round_games, max_games - played)
+        round_games *= 2
+        results = play(alive, played + 1, games)
+        for candidate in alive:
+            records[candidate].extend(results[candidate])
+        played += games
+        used += games * len(alive)
+
+        dropped = []
+        if len(alive) > keep and 1 < played < max_games:
+            scores = np.array([[score(record) for record in records[candidate]] for candidate in alive],
+                              dtype=np.float64)
+            # Entry [a, b] says that b has the higher mean, so a is dropped once keep others are ahead of it
+            better = (_paired_lower_bounds(scores, z) > 0).sum(axis=1)
+            dropped = [candidate for candidate, count in zip(alive, better) if count >= keep]
+            alive = [candidate for candidate, count in zip(alive, better) if count < keep]
+        if on_round is not None:
+            on_round(played, alive, dropped)
+    return records, used
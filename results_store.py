@@ -0,0 +1,187 @@
+import csv
+import json
+import os
+
+# Results tables are passed between the pipeline stages by name
+# ("top_strategies", "best_weights", ...). A name is stored as <name>.csv,
+# <name>.jsonl or <name>.parquet; Excel files are only written on request.
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+# Rows buffered before a Parquet row group is written; CSV and JSONL flush every row
+PARQUET_BATCH_SIZE = 256
+
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _plain(value):
+    """Turn NumPy scalars and tuples into plain Python values that every format can store."""
+    if hasattr(value, 'item') and not isinstance(value, (list, tuple, dict)):
+        try:
+            return value.item()
+        except (TypeError, ValueError):
+            pass
+    if isinstance(value, (list, tuple)) or hasattr(value, 'tolist'):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _parse_csv_value(text):
+    if text == '':
+        return None
+    if text[0] in '[{':
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def path_for(name, fmt):
+    return f"{name}.{fmt}"
+
+
+def find(name):
+    """Path of the stored table ``name``, trying every format and finally Excel; None if there is none.
+
+    When the table is stored in several formats (a .csv left by an older run
+    next to a newer .jsonl, say) the most recently written one is used.
+    Excel files are exports, so they are only read when nothing else is stored.
+    """
+    paths = [path_for(name, fmt) for fmt in FORMATS if os.path.exists(path_for(name, fmt))]
+    if paths:
+        # max keeps the first of equally old files, so FORMATS order breaks ties
+        return max(paths, key=os.path.getmtime)
+    path = path_for(name, 'xlsx')
+    return path if os.path.exists(path) else None
+
+
+class ResultsWriter:
+    """Append-only writer that saves every row as soon as it is written.
+
+    CSV and JSONL rows are flushed one by one, so a crash loses nothing that
+    was written. Parquet needs pyarrow and is written in row groups of
+    PARQUET_BATCH_SIZE rows.
+    """
+
+    def __init__(self, name, fmt='csv', columns=None, append=False):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown results format: {fmt}")
+        if fmt == 'parquet' and append:
+            raise ValueError("Parquet files cannot be appended to")
+        self.path = path_for(name, fmt)
+        self.fmt = fmt
+        self.columns = list(columns) if columns else None
+        self.rows_written = 0
+        self._pending = []
+        self._parquet_writer = None
+        self._csv_writer = None
+        self._file = None
+        if fmt != 'parquet':
+            exists = append and os.path.exists(self.path) and os.path.getsize(self.path) > 0
+            self._file = open(self.path, 'a' if append else 'w', newline='', encoding='utf-8')
+            if fmt == 'csv' and exists:
+                with open(self.path, newline='', encoding='utf-8') as existing:
+                    self.columns = next(csv.reader(existing))
+
+    def write(self, row):
+        row = {key: _plain(value) for key, value in row.items()}
+        if self.columns is None:
+            self.columns = list(row)
+        if self.fmt == 'jsonl':
+            self._file.write(json.dumps(row) + '\n')
+            self._file.flush()
+        elif self.fmt == 'csv':
+            if self._csv_writer is None:
+                self._csv_writer = csv.DictWriter(self._file, fieldnames=self.columns)
+                if self._file.tell() == 0:
+                    self._csv_writer.writeheader()
+            self._csv_writer.writerow({key: json.dumps(value) if isinstance(value, (list, dict)) else value
+                                       for key, value in row.items()})
+            self._file.flush()
+        else:
+            self._pending.append(row)
+            if len(self._pending) >= PARQUET_BATCH_SIZE:
+                self._write_parquet_batch()
+        self.rows_written += 1
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def _write_parquet_batch(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = pa.Table.from_pylist(self._pending)
+        if self._parquet_writer is None:
+            self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+        self._parquet_writer.write_table(table)
+        self._pending = []
+
+    def close(self):
+        if self.fmt == 'parquet':
+            if self._pending:
+                self._write_parquet_batch()
+            if self._parquet_writer is not None:
+                self._parquet_writer.close()
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_rows(name, rows, fmt='csv'):
+    """Replace the table ``name`` with ``rows`` and return its path."""
+    with ResultsWriter(name, fmt) as writer:
+        writer.write_many(rows)
+    return writer.path
+
+
+def read_rows(name):
+    """Read the table ``name`` as a list of dicts, from whichever format it was stored in."""
+    path = find(name)
+    if path is None:
+        raise FileNotFoundError(f"No results stored for '{name}'")
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            return [{key: _parse_csv_value(value) for key, value in row.items()} for row in csv.DictReader(f)]
+    if path.endswith('.jsonl'):
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_table(path).to_pylist()
+    # Tables saved by older versions of the pipeline; converted to CSV once,
+    # so that later reads (and imports of the AI modules) do not need pandas
+    import pandas as pd
+    rows = [{key: _plain(value) for key, value in row.items()} for row in pd.read_excel(path).to_dict('records')]
+    write_rows(name, rows)
+    return rows
+
+
+def read_frame(name):
+    """Read the table ``name`` as a pandas DataFrame."""
+    import pandas as pd
+    return pd.DataFrame(read_rows(name))
+
+
+def export_excel(name):
+    """Write the table ``name`` to <name>.xlsx and return its path."""
+    path = path_for(name, 'xlsx')
+    read_frame(name).to_excel(path, index=False)
+    return path
@@ -0,0 +1,85 @@
+import time
+import results_store
+
+
+class SearchStats:
+    """Counters and timings of one move decision of expectimax_decision.
+
+    Pass an instance as ``stats=`` to expectimax_decision; the search then
+    counts its nodes into it. Every call of expectimax_decision is one
+    iteration, so an iterative-deepening move has one entry per depth tried.
+    When no SearchStats is passed the search only pays for an ``is None`` test.
+    """
+
+    def __init__(self):
+        self.root_empty_cells = None
+        self.iterations = []
+        self.cache = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.max_nodes = 0
+        self.chance_nodes = 0
+        self.leaf_evaluations = 0
+        self.root_moves = {}
+        self._start = time.perf_counter()
+
+    def begin_iteration(self, board):
+        if self.root_empty_cells is None:
+            self.root_empty_cells = sum(row.count(0) for row in board)
+        self._reset_counters()
+
+    def add_counts(self, counts):
+        """Add the (max nodes, chance nodes, leaf evaluations) counted by a pool worker."""
+        self.max_nodes += counts[0]
+        self.chance_nodes += counts[1]
+        self.leaf_evaluations += counts[2]
+
+    def counts(self):
+        return self.max_nodes, self.chance_nodes, self.leaf_evaluations
+
+    def root_move(self, move, score, seconds):
+        self.root_moves[move] = {'score': score, 'time': seconds}
+
+    def end_iteration(self, depth, completed=True, table=None):
+        nodes = self.max_nodes + self.chance_nodes + self.leaf_evaluations
+        self.iterations.append({
+            'depth': depth,
+            'completed': completed,
+            'time': time.perf_counter() - self._start,
+            'max_nodes': self.max_nodes,
+            'chance_nodes': self.chance_nodes,
+            'leaf_evaluations': self.leaf_evaluations,
+            # b with b ** depth == nodes searched
+            'branching_factor': nodes ** (1 / depth) if depth > 0 and nodes else 0.0,
+            'root_moves': self.root_moves
+        })
+        if table is not None:
+            self.cache = table.stats()
+
+    def record(self):
+        """The whole decision as a plain dict, as passed to the sinks."""
+        completed = [iteration['depth'] for iteration in self.iterations if iteration['completed']]
+        return {
+            'depth': max(completed) if completed else None,
+            'root_empty_cells': self.root_empty_cells,
+            'time': sum(iteration['time'] for iteration in self.iterations),
+            'max_nodes': sum(iteration['max_nodes'] for iteration in self.iterations),
+            'chance_nodes': sum(iteration['chance_nodes'] for iteration in self.iterations),
+            'leaf_evaluations': sum(iteration['leaf_evaluations'] for iteration in self.iterations),
+            'cache': self.cache,
+            'iterations': self.iterations
+        }
+
+
+class JsonlSink:
+    """Stats sink that appends every record to the results table ``name`` as JSON lines."""
+
+    def __init__(self, name="search_stats"):
+        self.writer = results_store.ResultsWriter(name, 'jsonl', append=True)
+
+    def __call__(self, record):
+        self.writer.write(record)
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,66 @@
+import hashlib
+import numbers
+
+# Counter-based random streams for tile spawns. Draw number n of the
+# stream with key k is a fixed function of (k, n) (the SplitMix64 mixer), so
+# a game seeded with the same value gets the same spawns in the list,
+# bitboard and batch engines, on any worker and in any batch.
+
+MASK_64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+_MIX_1 = 0xBF58476D1CE4E5B9
+_MIX_2 = 0x94D049BB133111EB
+# A uniform float is built from the top 53 bits of a mixed value
+_FLOAT_SCALE = 2.0 ** -53
+
+
+def stream_key(seed):
+    """64-bit stream key of an int or str seed (such as game_farm.game_seed)."""
+    if isinstance(seed, numbers.Integral):
+        return int(seed) & MASK_64
+    digest = hashlib.blake2b(str(seed).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def uniform(key, counter):
+    """Draw number ``counter`` of the stream ``key``, a float in [0, 1)."""
+    z = (key + (counter + 1) * GOLDEN_GAMMA) & MASK_64
+    z = ((z ^ (z >> 30)) * _MIX_1) & MASK_64
+    z = ((z ^ (z >> 27)) * _MIX_2) & MASK_64
+    z ^= z >> 31
+    return (z >> 11) * _FLOAT_SCALE
+
+
+class SeedStream:
+    """Random stream of one game; exposes the random() method used by logic.add_two."""
+
+    def __init__(self, seed):
+        self.key = stream_key(seed)
+        self.counter = 0
+
+    def random(self):
+        value = uniform(self.key, self.counter)
+        self.counter += 1
+        return value
+
+
+class BatchStreams:
+    """One SeedStream per game of a batch, drawn with NumPy for many games at once."""
+
+    def __init__(self, seeds):
+        import numpy as np  # Only the batch engine needs NumPy; Simulator games use SeedStream
+        self.keys = np.array([stream_key(seed) for seed in seeds], dtype=np.uint64)
+        self.counters = np.zeros(len(self.keys), dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def random(self, games):
+        """Next draw of each stream in ``games`` (an index array); each of those streams advances by one."""
+        import numpy as np
+        z = self.keys[games] + (self.counters[games] + np.uint64(1)) * np.uint64(GOLDEN_GAMMA)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX_1)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX_2)
+        z ^= z >> np.uint64(31)
+        self.counters[games] += np.uint64(1)
+        return (z >> np.uint64(11)).astype(np.float64) * _FLOAT_SCALE
@@ -0,0 +1,129 @@
+import random
+import time
+import packed
+import seeding
+import game_records
+import constants as c
+
+
+class Simulator:
+    """Plays 2048 games with any AI exposing ``get_move(matrix)``, without a GUI.
+
+    The game runs on a packed board (packed.engine_for(size), the bitboard
+    engine on 4x4); ``matrix`` is the list-of-lists form handed to the AI,
+    ``on_step`` and the viewer. ``empty`` is the engine's empty_cells_mask of
+    the board, recomputed after a move and updated after a spawn.
+    ``start_tiles`` is the number of tiles on the initial board.
+    ``on_step(matrix)`` is called after every move, so a viewer can follow the game.
+    ``time_budget_ms`` is passed on to ``get_move`` for AIs that search against a clock.
+    ``rng`` is what tile spawns draw from (see logic.add_two), the global random module by default.
+    With a ``record_config`` dict (the AI's settings, stored in the header) every game is
+    recorded, and its result record carries the encoded game under game_records.REPLAY_KEY.
+    """
+
+    def __init__(self, ai, run_count=1, size=c.GRID_LEN, start_tiles=2, on_step=None, time_budget_ms=None, rng=random,
+                 record_config=None):
+        self.ai = ai
+        self.run_count = run_count
+        self.size = size
+        self.start_tiles = start_tiles
+        self.on_step = on_step
+        self.time_budget_ms = time_budget_ms
+        self.rng = rng
+        self.record_config = record_config
+        self.encoder = None
+        self.seed = None
+        self.engine = packed.engine_for(size)
+        self.board = 0
+        self.empty = 0
+        self.score = 0
+        self.moves = 0
+        self.start_time = None
+
+    @property
+    def matrix(self):
+        """The current board as a new list of lists."""
+        return self.engine.from_bitboard(self.board)
+
+    def new_game(self):
+        self.board = 0
+        self.empty = self.engine.empty_cells_mask(0)
+        if self.record_config is not None:
+            self.encoder = game_records.GameEncoder(self.size, self.record_config)
+        for _ in range(self.start_tiles):
+            spawn = self.spawn()
+            if spawn is not None and self.encoder is not None:
+                self.encoder.start_tile(*spawn)
+        self.score = 0
+        self.moves = 0
+        self.start_time = time.perf_counter()
+
+    def spawn(self):
+        """Add a tile like logic.add_two, with the same draws; returns (row, column, tile) or None on a full board."""
+        self.board, cell, value = self.engine.spawn_tile(self.board, self.rng, self.empty)
+        if cell is None:
+            return None
+        self.empty &= ~(1 << cell)
+        i, j = divmod(cell, self.size)
+        return i, j, value
+
+    def is_over(self):
+        return self.engine.game_state(self.board) != 'not over'
+
+    def step(self):
+        """Play one move. Returns False once the game is over."""
+        # The state and the result of every move come from one pass over the board
+        state, legal = self.engine.analyze(self.board)
+        if state != 'not over':
+            return False
+        if self.time_budget_ms is None:
+            move = self.ai.get_move(self.matrix)
+        else:
+            move = self.ai.get_move(self.matrix, time_budget_ms=self.time_budget_ms)
+        if move is None:
+            # The AI found no move to play, so the game cannot go on
+            return False
+        done = False
+        points = 0
+        for key, new_board, new_points in legal:
+            if key == move:
+                self.board, done, points = new_board, True, new_points
+        if done:
+            self.empty = self.engine.empty_cells_mask(self.board)
+        self.score += points
+        self.moves += 1
+        spawn = self.spawn() if done else None
+        if self.encoder is not None:
+            self.encoder.turn(move, spawn, self.matrix)
+        if self.on_step is not None:
+            self.on_step(self.matrix)
+        return True
+
+    def result(self, game=1):
+        """Summary of the current game."""
+        matrix = self.matrix
+        record = {
+            'Game': game,
+            'Max Tile': max(max(row) for row in matrix),
+            'Total Score': self.score,
+            'Tile Sum': sum(sum(row) for row in matrix),
+            'Total Moves': self.moves,
+            'Duration': time.perf_counter() - self.start_time
+        }
+        if self.encoder is not None:
+            record[game_records.REPLAY_KEY] = self.encoder.encode(self.seed, game, matrix, self.score)
+        return record
+
+    def play_game(self, game=1, seed=None):
+        """Play one game; with a ``seed`` its spawns come from a fresh seeding.SeedStream(seed)."""
+        if seed is not None:
+            self.rng = seeding.SeedStream(seed)
+        self.seed = seed
+        self.new_game()
+        while self.step():
+            pass
+        return self.result(game)
+
+    def run(self):
+        """Play ``run_count`` games and return one record per game."""
+        return [self.play_game(game) for game in range(1, self.run_count + 1)]
@@ -0,0 +1,116 @@
+import constants as c
+import bitboard
+
+# The 8 symmetries of the square board (rotations and reflections) are
+# numbered 0-7. A transform id is applied to a board in three steps:
+#   bit 4: transpose (swap rows and columns)
+#   bit 1: mirror (reverse every row)
+#   bit 2: flip (reverse the order of the rows)
+# 0 is the identity. A position and its 7 images have the same value, so
+# caches can store one canonical representative for all of them.
+
+IDENTITY = 0
+MIRROR = 1
+FLIP = 2
+TRANSPOSE = 4
+TRANSFORMS = range(8)
+
+# How a move direction changes under each of the three steps
+_TRANSPOSED_MOVES = {c.KEY_UP: c.KEY_LEFT, c.KEY_LEFT: c.KEY_UP, c.KEY_DOWN: c.KEY_RIGHT, c.KEY_RIGHT: c.KEY_DOWN}
+_MIRRORED_MOVES = {c.KEY_UP: c.KEY_UP, c.KEY_DOWN: c.KEY_DOWN, c.KEY_LEFT: c.KEY_RIGHT, c.KEY_RIGHT: c.KEY_LEFT}
+_FLIPPED_MOVES = {c.KEY_UP: c.KEY_DOWN, c.KEY_DOWN: c.KEY_UP, c.KEY_LEFT: c.KEY_LEFT, c.KEY_RIGHT: c.KEY_RIGHT}
+
+# Every 16-bit row with its four cells in reverse order
+_MIRROR_ROW_TABLE = [bitboard._reverse_row(row) for row in range(65536)]
+
+
+def mirror(board):
+    """Reverse every row of a bitboard (left <-> right)."""
+    table = _MIRROR_ROW_TABLE
+    return (table[board & 0xFFFF] | (table[(board >> 16) & 0xFFFF] << 16)
+            | (table[(board >> 32) & 0xFFFF] << 32) | (table[board >> 48] << 48))
+
+
+def flip(board):
+    """Reverse the order of the rows of a bitboard (top <-> bottom)."""
+    return (((board & 0xFFFF) << 48) | ((board & 0xFFFF0000) << 16)
+            | ((board >> 16) & 0xFFFF0000) | (board >> 48))
+
+
+def transform(board, transform_id):
+    """Apply the symmetry ``transform_id`` to a bitboard."""
+    if transform_id & TRANSPOSE:
+        board = bitboard.transpose(board)
+    if transform_id & MIRROR:
+        board = mirror(board)
+    if transform_id & FLIP:
+        board = flip(board)
+    return board
+
+
+def inverse(transform_id):
+    """Transform id that undoes ``transform_id``."""
+    # Undoing runs the steps backwards; only a transpose does not commute with the others,
+    # and transpose * mirror == flip * transpose
+    if transform_id & TRANSPOSE:
+        return TRANSPOSE | ((transform_id & MIRROR) << 1) | ((transform_id & FLIP) >> 1)
+    return transform_id
+
+
+def canonical(board):
+    """Return (canonical bitboard, transform id) for a bitboard.
+
+    The canonical form is the smallest of the 8 images of the board, and
+    transform(board, transform_id) == canonical bitboard.
+    """
+    best = board
+    best_id = IDENTITY
+    transposed = bitboard.transpose(board)
+    for base, base_id in ((board, IDENTITY), (transposed, TRANSPOSE)):
+        mirrored = mirror(base)
+        for image, image_id in ((base, base_id), (mirrored, base_id | MIRROR),
+                                (flip(base), base_id | FLIP), (flip(mirrored), base_id | MIRROR | FLIP)):
+            if image < best:
+                best = image
+                best_id = image_id
+    return best, best_id
+
+
+def canonical_key(board):
+    """The canonical bitboard alone, for use as a cache key."""
+    return canonical(board)[0]
+
+
+def transform_matrix(mat, transform_id):
+    """Apply the symmetry ``transform_id`` to a list-of-lists board of any size; returns a new board."""
+    n = len(mat)
+    if transform_id & TRANSPOSE:
+        mat = [[mat[j][i] for j in range(n)] for i in range(n)]
+    if transform_id & MIRROR:
+        mat = [row[::-1] for row in mat]
+    if transform_id & FLIP:
+        mat = mat[::-1]
+    return [list(row) for row in mat]
+
+
+def canonical_matrix(mat):
+    """Return (canonical bitboard, transform id) for a 4x4 list-of-lists board."""
+    return canonical(bitboard.to_bitboard(mat))
+
+
+def move_to_canonical(move, transform_id):
+    """The move on the transformed board that matches ``move`` on the original board."""
+    if transform_id & TRANSPOSE:
+        move = _TRANSPOSED_MOVES[move]
+    if transform_id & MIRROR:
+        move = _MIRRORED_MOVES[move]
+    if transform_id & FLIP:
+        move = _FLIPPED_MOVES[move]
+    return move
+
+
+def move_from_canonical(move, transform_id):
+    """Map a move chosen on the transformed board back to the original board."""
+    if move is None:
+        return None
+    return move_to_canonical(move, inverse(transform_id))
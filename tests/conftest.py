@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, next to this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import AI_expectimax
+import results_store
+
+# Tiles of the random boards: mostly empty cells and small tiles, a few large ones
+TILES = (0, 0, 0, 0, 2, 2, 4, 4, 8, 16, 32, 64, 128, 1024, 2048)
+
+
+def random_board(rng, size, tiles=TILES):
+    return [[rng.choice(tiles) for _ in range(size)] for _ in range(size)]
+
+
+def random_boards(size, count, seed=0, tiles=TILES):
+    """``count`` random list-of-lists boards; every tenth one has no empty cell and every twelfth is empty."""
+    rng = random.Random(seed * 1000 + size)
+    boards = []
+    for n in range(count):
+        if n % 12 == 5:
+            boards.append([[0] * size for _ in range(size)])
+        elif n % 10 == 3:
+            boards.append(random_board(rng, size, [tile for tile in tiles if tile]))
+        else:
+            boards.append(random_board(rng, size, tiles))
+    return boards
+
+
+@pytest.fixture
+def results_dir(tmp_path, monkeypatch):
+    """A temporary working directory, so results tables and table files never touch the real ones."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def load_heuristics(results_dir, monkeypatch):
+    """Write a best_weights table and return the AI_expectimax heuristics loaded from it."""
+    def load(strategies, weights=None):
+        weights = weights or [1 / len(strategies)] * len(strategies)
+        results_store.write_rows("best_weights", [{'strategy': strategy, 'weights': weight}
+                                                  for strategy, weight in zip(strategies, weights)])
+        monkeypatch.setattr(AI_expectimax, 'heuristics', None)
+        return AI_expectimax.get_heuristics()
+    return load
@@ -0,0 +1,156 @@
+import random
+
+import pytest
+
+import bitboard
+import game_farm
+import logic
+import packed
+import seeding
+import simulator
+from conftest import random_boards
+
+SIZES = (3, 4, 5, 6)
+
+
+def empty_cells(matrix):
+    return [(i, j) for i, row in enumerate(matrix) for j, value in enumerate(row) if not value]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_conversions_round_trip(size):
+    engine = packed.engine_for(size)
+    for matrix in random_boards(size, 300):
+        board = engine.to_bitboard(matrix)
+        assert engine.from_bitboard(board) == matrix
+        transposed = [list(row) for row in zip(*matrix)]
+        assert engine.transpose(board) == engine.to_bitboard(transposed)
+
+
+def test_engine_for_4x4_is_the_bitboard_module():
+    assert packed.engine_for(4) is bitboard
+    assert packed.engine_for(5) is packed.engine_for(5)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_moves_match_logic(size):
+    engine = packed.engine_for(size)
+    for matrix in random_boards(size, 300):
+        board = engine.to_bitboard(matrix)
+        for key, move in engine.commands.items():
+            new_matrix, done, points = logic.commands[key](matrix)
+            assert move(board) == (engine.to_bitboard(new_matrix), done, points)
+        expected = [(key, engine.to_bitboard(new_matrix), points)
+                    for key, new_matrix, points in logic.legal_moves(matrix)]
+        assert engine.legal_moves(board) == expected
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_state_matches_logic(size):
+    engine = packed.engine_for(size)
+    for matrix in random_boards(size, 300):
+        board = engine.to_bitboard(matrix)
+        state = logic.game_state(matrix)
+        assert engine.game_state(board) == state
+        assert engine.has_won(board) == (state == 'win')
+        assert engine.analyze(board) == (logic.analyze(matrix)[0], engine.legal_moves(board))
+        assert engine.analyze(board)[0] == state
+
+
+def test_analyze_on_a_full_board_without_merges():
+    matrix = [[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]]
+    assert logic.game_state(matrix) == 'lose'
+    assert logic.analyze(matrix) == ('lose', [])
+    assert bitboard.analyze(bitboard.to_bitboard(matrix)) == ('lose', [])
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_empty_cells(size):
+    engine = packed.engine_for(size)
+    for matrix in random_boards(size, 300):
+        board = engine.to_bitboard(matrix)
+        cells = empty_cells(matrix)
+        assert engine.get_empty_cells(board) == cells
+        assert engine.count_empty(board) == len(cells)
+        assert engine.empty_cells_mask(board) == sum(1 << (i * size + j) for i, j in cells)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_spawn_tile_draws_like_logic(size):
+    engine = packed.engine_for(size)
+    for n, matrix in enumerate(random_boards(size, 300)):
+        board = engine.to_bitboard(matrix)
+        new_board, cell, tile = engine.spawn_tile(board, random.Random(n))
+        cells = empty_cells(matrix)
+        if not cells:
+            assert (new_board, cell, tile) == (board, None, None)
+            continue
+        i, j = logic.spawn_tile(matrix, cells, random.Random(n))
+        assert (new_board, cell, tile) == (engine.to_bitboard(matrix), i * size + j, matrix[i][j])
+        assert engine.add_two(board, random.Random(n)) == new_board
+
+
+def test_select_bit():
+    rng = random.Random(1)
+    for _ in range(500):
+        mask = rng.getrandbits(rng.randint(1, 80)) | 1
+        bits = [k for k in range(mask.bit_length()) if (mask >> k) & 1]
+        assert [packed.select_bit(mask, k) for k in range(len(bits))] == bits
+
+
+@pytest.mark.parametrize("size", (4, 5))
+def test_batch_engine_matches_logic(size):
+    batch_engine = pytest.importorskip("batch_engine")
+    matrices = random_boards(size, 200)
+    boards = batch_engine.from_matrices(matrices)
+    assert batch_engine.to_matrices(boards) == matrices
+    new, moved, points = batch_engine.all_moves(boards)
+    for k, key in enumerate(batch_engine.MOVES):
+        new_matrices = batch_engine.to_matrices(new[k])
+        for b, matrix in enumerate(matrices):
+            new_matrix, done, move_points = logic.commands[key](matrix)
+            assert (new_matrices[b], bool(moved[k, b]), int(points[k, b])) == (new_matrix, done, move_points)
+    states = {batch_engine.NOT_OVER: 'not over', batch_engine.WIN: 'win', batch_engine.LOSE: 'lose'}
+    assert [states[state] for state in batch_engine.game_state(boards)] == [logic.game_state(m) for m in matrices]
+
+
+def test_batch_spawns_match_seeded_streams():
+    batch_engine = pytest.importorskip("batch_engine")
+    matrices = random_boards(4, 100)
+    seeds = [game_farm.game_seed(7, game) for game in range(1, len(matrices) + 1)]
+    boards = batch_engine.spawn(batch_engine.from_matrices(matrices), seeding.BatchStreams(seeds))
+    for matrix, seed, spawned in zip(matrices, seeds, batch_engine.to_matrices(boards)):
+        cells = empty_cells(matrix)
+        if cells:
+            logic.spawn_tile(matrix, cells, seeding.SeedStream(seed))
+        assert spawned == matrix
+
+
+@pytest.mark.parametrize("size", (3, 4, 5))
+def test_simulator_games_are_reproducible(size):
+    class FirstMove:
+        def get_move(self, matrix):
+            moves = logic.legal_moves(matrix)
+            return moves[0][0] if moves else None
+
+    def play(seed):
+        record = simulator.Simulator(FirstMove(), size=size).play_game(1, seed=seed)
+        del record['Duration']
+        return record
+
+    assert play(3) == play(3)
+    assert play(3) != play(4)
+
+
+def test_simulator_matches_the_batch_engine():
+    pytest.importorskip("numpy")
+    import optimize_strategies
+
+    for strategy in ('empty_tile', 'smoothness', 'max_score'):
+        batch = optimize_strategies.play_strategy_batch(strategy, 6, seed=5)
+        ai = optimize_strategies.StrategyAI(strategy)
+        for record in batch:
+            game = record['Game']
+            played = simulator.Simulator(ai).play_game(game, seed=game_farm.game_seed(5, game))
+            del played['Duration']
+            assert played == record
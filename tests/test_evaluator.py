@@ -0,0 +1,136 @@
+import pytest
+
+import AI_heuristics1
+import AI_heuristicsForExpectimax
+import evaluator
+import packed
+import symmetry
+from conftest import random_boards
+
+TILES_4X4 = (0, 0, 0, 2, 4, 8, 16, 128, 2048, 32768)
+SIZES = (3, 4, 5, 6)
+
+
+def weighted_sum(functions, strategies, weights, matrix):
+    return sum(weight * functions[strategy](matrix) for strategy, weight in zip(strategies, weights))
+
+
+def expectimax_methods():
+    heuristics = AI_heuristicsForExpectimax.AI_Heuristics.__new__(AI_heuristicsForExpectimax.AI_Heuristics)
+    return {
+        'empty_tile': heuristics.heuristic_empty_tile_score,
+        'smoothness': heuristics.calculate_smoothness,
+        'monotonicity': heuristics.heuristic_monotonicity,
+        'merge_opportunities': heuristics.heuristic_merge_opportunities,
+        'max_score': heuristics.heuristic_max_score,
+        'max_free_lines': heuristics.heuristic_max_free_lines,
+        'same_row_col': heuristics.heuristic_same_row_col,
+        'tile_grouping': heuristics.heuristic_tile_grouping,
+        'adjacent_same_tiles': heuristics.heuristic_adjacent_same_tiles,
+        'balance_spread': heuristics.heuristic_balance_spread
+    }
+
+
+def weighted_methods():
+    heuristics = AI_heuristics1.AI_Heuristics.__new__(AI_heuristics1.AI_Heuristics)
+    functions = {strategy: getattr(heuristics, f"heuristic_{strategy}") for strategy in evaluator.WEIGHTED_STRATEGIES
+                 if strategy != 'smoothness'}
+    functions['smoothness'] = heuristics.calculate_smoothness
+    return functions
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_compiled_evaluator_matches_the_expectimax_heuristics(size):
+    functions = expectimax_methods()
+    strategies = list(evaluator.EXPECTIMAX_STRATEGIES)
+    weights = [0.5 + 0.25 * k for k in range(len(strategies))]
+    compiled = evaluator.compile_evaluator(strategies, weights, evaluator.EXPECTIMAX_STRATEGIES, size=4)
+    for matrix in random_boards(size, 200):
+        assert compiled(matrix) == pytest.approx(weighted_sum(functions, strategies, weights, matrix))
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_compiled_evaluator_matches_the_weighted_heuristics(size):
+    functions = weighted_methods()
+    strategies = list(evaluator.WEIGHTED_STRATEGIES)
+    weights = [0.1 * (k + 1) for k in range(len(strategies))]
+    compiled = evaluator.compile_evaluator(strategies, weights, evaluator.WEIGHTED_STRATEGIES, size=size)
+    for matrix in random_boards(size, 200):
+        assert compiled(matrix) == pytest.approx(weighted_sum(functions, strategies, weights, matrix))
+
+
+def test_unknown_strategies():
+    with pytest.raises(ValueError):
+        evaluator.compile_evaluator(['no_such_strategy'], [1], evaluator.EXPECTIMAX_STRATEGIES)
+    compiled = evaluator.compile_evaluator(['no_such_strategy', 'empty_tile'], [1, 2], evaluator.EXPECTIMAX_STRATEGIES,
+                                           skip_unknown=True)
+    assert compiled.coefficients == {'empty': 2.0}
+
+
+COEFFICIENTS = [
+    {'empty': 1.0, 'h_diff': -1.0, 'v_diff': -1.0, 'tile_sum': 1.0},
+    {'empty': 2.5, 'h_diff': -0.3, 'v_diff': -0.7, 'h_equal': 1.5, 'h_ascending': 0.25, 'tile_sum': 0.01,
+     'max_tile': 0.5, 'free_rows': 3.0},
+]
+
+
+@pytest.mark.parametrize("coefficients", COEFFICIENTS)
+@pytest.mark.parametrize("size", SIZES)
+def test_packed_evaluation_matches_the_compiled_function(results_dir, coefficients, size):
+    compiled = evaluator.CompiledEvaluator(coefficients, 4).for_size(size)
+    engine = packed.engine_for(size)
+    tiles = TILES_4X4 if size == 4 else TILES_4X4 + (65536,)
+    for matrix in random_boards(size, 300, tiles=tiles):
+        assert compiled.evaluate_packed(engine.to_bitboard(matrix)) == pytest.approx(compiled(matrix), rel=1e-12)
+
+
+def test_integer_coefficients_give_exact_table_sums(results_dir):
+    compiled = evaluator.CompiledEvaluator(COEFFICIENTS[0], 4)
+    for matrix in random_boards(4, 300, tiles=TILES_4X4):
+        assert compiled.evaluate_bitboard(packed.engine_for(4).to_bitboard(matrix)) == compiled(matrix)
+
+
+def test_mapped_tables_round_trip(results_dir, monkeypatch):
+    weighted = evaluator.CompiledEvaluator(COEFFICIENTS[1], 4)
+    path = evaluator.write_tables(str(results_dir / "tables.bin"), {'weighted': weighted})
+    tables, coefficients = evaluator.load_tables(path)
+    assert coefficients == {'weighted': weighted.coefficients}
+    built = evaluator.build_row_feature_tables()
+    for feature, values in built.items():
+        assert list(tables[feature]) == values
+    row_table, column_table = weighted.weighted_tables()
+    assert list(tables['weighted.row']) == row_table
+    assert list(tables['weighted.column']) == column_table
+
+    # An evaluator with the same coefficients reads its tables from the mapping
+    monkeypatch.setattr(evaluator, '_mapped_tables', (tables, coefficients))
+    mapped = evaluator.CompiledEvaluator(COEFFICIENTS[1], 4)
+    boards = [packed.engine_for(4).to_bitboard(matrix) for matrix in random_boards(4, 200, tiles=TILES_4X4)]
+    assert [mapped.evaluate_bitboard(board) for board in boards] == [weighted.evaluate_bitboard(b) for b in boards]
+    assert isinstance(mapped._row_table, memoryview)
+
+
+def test_load_tables_rejects_other_files(results_dir):
+    (results_dir / "other.bin").write_bytes(b"not a table file")
+    with pytest.raises(ValueError):
+        evaluator.load_tables(str(results_dir / "other.bin"))
+
+
+def test_symmetric_evaluators_score_every_symmetry_the_same():
+    assert not evaluator.CompiledEvaluator(COEFFICIENTS[1], 4).is_symmetric
+    compiled = evaluator.CompiledEvaluator(COEFFICIENTS[0], 4)
+    assert compiled.is_symmetric
+    for matrix in random_boards(4, 100):
+        scores = {compiled(symmetry.transform_matrix(matrix, transform_id)) for transform_id in symmetry.TRANSFORMS}
+        assert len(scores) == 1
+
+
+def test_canonical_boards():
+    for matrix in random_boards(4, 200, tiles=TILES_4X4):
+        board = packed.engine_for(4).to_bitboard(matrix)
+        key, transform_id = symmetry.canonical(board)
+        assert symmetry.transform(board, transform_id) == key
+        assert symmetry.transform(key, symmetry.inverse(transform_id)) == board
+        images = {packed.engine_for(4).to_bitboard(symmetry.transform_matrix(matrix, t)) for t in symmetry.TRANSFORMS}
+        assert key == min(images)
+        assert symmetry.transform_matrix(matrix, transform_id) == packed.engine_for(4).from_bitboard(key)
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+import AI_expectimax
+import bitboard
+import opening_book
+import symmetry
+
+STRATEGIES = ['empty_tile', 'smoothness', 'monotonicity', 'merge_opportunities', 'max_score']
+SYMMETRIC_STRATEGIES = ['empty_tile', 'smoothness', 'max_score']
+DEPTH = 2
+
+
+def build(results_dir):
+    book = opening_book.build_book(max_tiles=3, start_tiles=2, depth=DEPTH)
+    path = opening_book.write_book(book, str(results_dir / "book.bin"), opening_book.book_config(DEPTH),
+                                   max_tiles=3, start_tiles=2)
+    return book, path
+
+
+@pytest.mark.parametrize("strategies", [STRATEGIES, SYMMETRIC_STRATEGIES])
+def test_book_round_trip(load_heuristics, results_dir, strategies):
+    symmetric = load_heuristics(strategies).evaluate_unweighted.is_symmetric
+    assert symmetric == (strategies is SYMMETRIC_STRATEGIES)
+    book, path = build(results_dir)
+    loaded = opening_book.OpeningBook(path)
+    assert len(loaded) == len(book)
+    assert loaded.symmetric == symmetric
+    assert loaded.header['max_tiles'] == 3
+    assert list(loaded.keys) == sorted(book)
+    for key, move in book.items():
+        assert loaded.move(bitboard.from_bitboard(key)) == opening_book.MOVES[move]
+        if symmetric:
+            assert symmetry.canonical_key(key) == key
+    assert opening_book.load_book(path, opening_book.book_config(DEPTH)) is not None
+
+
+@pytest.mark.parametrize("strategies", [STRATEGIES, SYMMETRIC_STRATEGIES])
+def test_book_moves_are_search_moves(load_heuristics, results_dir, strategies):
+    load_heuristics(strategies)
+    book, path = build(results_dir)
+    loaded = opening_book.OpeningBook(path)
+    for key in sorted(book)[::7]:
+        # Every rotation or reflection of a book position gets the move the search picks on that board
+        for transform_id in symmetry.TRANSFORMS if loaded.symmetric else [symmetry.IDENTITY]:
+            matrix = symmetry.transform_matrix(bitboard.from_bitboard(key), transform_id)
+            assert loaded.move(matrix) == AI_expectimax.expectimax_decision(matrix, DEPTH)
+
+
+def test_tied_positions_are_left_to_the_search(load_heuristics, results_dir):
+    load_heuristics(SYMMETRIC_STRATEGIES)
+    book, _ = build(results_dir)
+    # Both 2s on the middle of the top row: left and right (and down) lead to mirror images
+    matrix = [[0, 2, 2, 0], [0] * 4, [0] * 4, [0] * 4]
+    assert symmetry.canonical_key(bitboard.to_bitboard(matrix)) not in book
+    board = bitboard.to_bitboard([[2, 0, 0, 0], [0] * 4, [0] * 4, [0, 0, 0, 2]])
+    assert len(opening_book._book_moves(DEPTH, None, True, board)) > 1
+
+
+def test_positions_outside_the_book(load_heuristics, results_dir):
+    load_heuristics(STRATEGIES)
+    _, path = build(results_dir)
+    loaded = opening_book.OpeningBook(path)
+    assert loaded.move([[2, 4, 8, 16], [0] * 4, [0] * 4, [0] * 4]) is None
+    assert loaded.move([[2, 0, 0], [0, 0, 0], [0, 0, 2]]) is None
+
+
+def test_load_book_checks_the_config(load_heuristics, results_dir):
+    load_heuristics(STRATEGIES)
+    _, path = build(results_dir)
+    assert opening_book.load_book(path, opening_book.book_config(DEPTH + 1)) is None
+    assert opening_book.load_book(str(results_dir / "missing.bin"), opening_book.book_config(DEPTH)) is None
+    # Other strategies give the search other coefficients, so the book no longer applies
+    load_heuristics(SYMMETRIC_STRATEGIES)
+    assert opening_book.load_book(path, opening_book.book_config(DEPTH)) is None
+
+
+def test_book_rejects_other_files(results_dir):
+    (results_dir / "other.bin").write_bytes(b"not a book at all")
+    with pytest.raises(ValueError):
+        opening_book.OpeningBook(str(results_dir / "other.bin"))
+
+
+def test_ai_plays_book_moves(load_heuristics, results_dir, capsys):
+    import AI_both
+
+    load_heuristics(STRATEGIES)
+    book, path = build(results_dir)
+    key = sorted(book)[0]
+    ai = AI_both.AI(depth=DEPTH, opening_book=path)
+    assert ai.get_move(bitboard.from_bitboard(key)) == opening_book.MOVES[book[key]]
+    assert ai.book_moves == 1
+    assert path in capsys.readouterr().out
+
+
+def test_the_default_book_is_next_to_the_modules(load_heuristics, results_dir):
+    import AI_both
+
+    load_heuristics(STRATEGIES)
+    # Not whatever file of that name is in the directory the AI happens to run in
+    (results_dir / "opening_book.bin").write_bytes(b"not a book at all")
+    ai = AI_both.AI(depth=DEPTH)
+    assert ai.opening_book == opening_book.BOOK_FILE
+    assert os.path.dirname(ai.opening_book) == os.path.dirname(os.path.abspath(AI_both.__file__))
+    assert ai.get_move([[2, 4, 8, 16], [0] * 4, [0] * 4, [0] * 4]) is not None
@@ -0,0 +1,145 @@
+import functools
+
+import pytest
+
+import game_records
+import logic
+import simulator
+
+CONFIG = {'ai': 'first legal move', 'depth': 0}
+
+
+class FirstMove:
+    def get_move(self, matrix):
+        moves = logic.legal_moves(matrix)
+        return moves[-1][0] if moves else None
+
+
+def play_recorded(size, games, seed=0):
+    """Recorded Simulator games as (result record without Replay, encoded game, final board)."""
+    sim = simulator.Simulator(FirstMove(), size=size, record_config=CONFIG)
+    played = []
+    for game in range(1, games + 1):
+        record = sim.play_game(game, seed=seed + game)
+        encoded = record.pop(game_records.REPLAY_KEY)
+        played.append((record, encoded, sim.matrix))
+    return played
+
+
+@pytest.fixture
+def short_checkpoints(monkeypatch):
+    # Checkpoint every few turns, so that short games carry several of them
+    monkeypatch.setattr(game_records, 'GameEncoder', functools.partial(game_records.GameEncoder, checkpoint_every=8))
+
+
+@pytest.mark.parametrize("size", (3, 4, 5, 6))
+def test_records_round_trip(results_dir, short_checkpoints, size):
+    played = play_recorded(size, 3)
+    path = str(results_dir / "games.grec")
+    with game_records.GameRecordWriter(path) as writer:
+        for _, encoded, _ in played:
+            writer.write(encoded)
+
+    stored = list(game_records.read_games(path))
+    assert len(stored) == len(played)
+    for (record, _, final), game in zip(played, stored):
+        assert game.header['config'] == CONFIG
+        assert game.header['seed'] == record['Game']
+        assert game.header['size'] == size
+        assert game.header['result'] == {key: record[key] for key in game.header['result']}
+        assert len(game.checkpoints()) == record['Total Moves'] // 8
+        turns = list(game_records.replay(game))
+        assert turns[-1][0] == record['Total Moves']
+        assert turns[-1][2] == final
+        assert sum(points for _, _, _, points in turns) == record['Total Score']
+
+    headers = list(game_records.read_games(path, headers_only=True))
+    assert [game.header for game in headers] == [game.header for game in stored]
+
+
+def test_replay_matches_the_simulator_boards(results_dir, short_checkpoints):
+    boards = []
+    sim = simulator.Simulator(FirstMove(), record_config=CONFIG, on_step=boards.append)
+    record = sim.play_game(1, seed=11)
+    path = str(results_dir / "games.grec")
+    with game_records.GameRecordWriter(path) as writer:
+        writer.write_record(record)
+    assert game_records.REPLAY_KEY not in record
+    game, = game_records.read_games(path)
+    assert [board for _, _, board, _ in game_records.replay(game)][1:] == boards
+
+
+def test_replay_detects_a_wrong_checkpoint(results_dir, short_checkpoints):
+    (record, encoded, _), = play_recorded(4, 1)
+    assert record['Total Moves'] >= 8
+    path = str(results_dir / "games.grec")
+    with game_records.GameRecordWriter(path) as writer:
+        writer.write(encoded)
+    game, = game_records.read_games(path)
+    body = game._decoded()
+    # The last byte is a cell of the last checkpoint board
+    corrupted = game_records.GameRecord(game.header, body[:-1] + bytes([body[-1] ^ 1]), False)
+    with pytest.raises(ValueError):
+        list(game_records.replay(corrupted))
+
+
+def entry_kinds(path):
+    with open(path, 'rb') as f:
+        game_records._read_start(f, path)
+        return [kind for kind, _, _ in game_records._entries(f, path, True)]
+
+
+def test_several_configs_and_a_cut_off_game(results_dir):
+    path = str(results_dir / "games.grec")
+    first = play_recorded(4, 2)
+    with game_records.GameRecordWriter(path) as writer:
+        for _, encoded, _ in first:
+            writer.write(encoded)
+    other = simulator.Simulator(FirstMove(), record_config={'ai': 'other'})
+    record = other.play_game(1, seed=5)
+    _, game = record[game_records.REPLAY_KEY]
+    with game_records.GameRecordWriter(path) as writer:
+        writer.write_record(record)
+        # A new config is numbered after the one already in the file
+        assert sorted(writer.config_ids.values()) == [0, 1]
+    assert [game.header['config'] for game in game_records.read_games(path)] == [CONFIG, CONFIG, {'ai': 'other'}]
+
+    # A writer that crashed in the middle of a game leaves a partial entry at the end
+    with open(path, 'rb') as f:
+        data = f.read()
+    for cut in (3, len(game), len(game) + 1):
+        with open(path, 'wb') as f:
+            f.write(data[:-cut])
+        assert len(list(game_records.read_games(path))) == 2
+        assert len(list(game_records.read_games(path, headers_only=True))) == 2
+
+    # The next writer cuts it off before appending, and does not store the configs again
+    with game_records.GameRecordWriter(path) as writer:
+        writer.write(first[0][1])
+        writer.write_record(other.play_game(2, seed=6))
+    games = list(game_records.read_games(path))
+    assert [game.header['config'] for game in games] == [CONFIG, CONFIG, CONFIG, {'ai': 'other'}]
+    assert [game.header['seed'] for game in games] == [1, 2, 1, 6]
+    assert all(len(list(game_records.replay(game))) == game.header['turns'] + 1 for game in games)
+    assert entry_kinds(path) == [game_records.CONFIG, game_records.GAME, game_records.GAME, game_records.CONFIG,
+                                 game_records.GAME, game_records.GAME]
+
+
+def test_seeds_that_do_not_fit(results_dir):
+    encoder = game_records.GameEncoder(4)
+    encoder.encode("x" * 200, 1, [[0] * 4 for _ in range(4)], 0)
+    with pytest.raises(ValueError):
+        encoder.encode("x" * 300, 1, [[0] * 4 for _ in range(4)], 0)
+
+
+def test_read_games_rejects_other_files(results_dir):
+    (results_dir / "other.grec").write_bytes(b"something else entirely")
+    with pytest.raises(ValueError):
+        list(game_records.read_games(str(results_dir / "other.grec")))
+    with pytest.raises(ValueError):
+        game_records.GameRecordWriter(str(results_dir / "other.grec"))
+    assert (results_dir / "other.grec").read_bytes() == b"something else entirely"
+    # A file cut off within its first bytes is started again
+    (results_dir / "short.grec").write_bytes(game_records.MAGIC[:3])
+    game_records.GameRecordWriter(str(results_dir / "short.grec")).close()
+    assert list(game_records.read_games(str(results_dir / "short.grec"))) == []
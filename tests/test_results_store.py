@@ -0,0 +1,36 @@
+import os
+
+import results_store
+
+ROWS = [{'strategy': 'empty_tile', 'weights': 0.5, 'scores': [1, 2]},
+        {'strategy': 'max_score', 'weights': 0.25, 'scores': []}]
+
+
+def test_rows_round_trip(results_dir):
+    for fmt in ('csv', 'jsonl'):
+        path = results_store.write_rows(f"table_{fmt}", ROWS, fmt)
+        assert path == f"table_{fmt}.{fmt}"
+        assert results_store.read_rows(f"table_{fmt}") == ROWS
+
+
+def test_find_prefers_the_newest_file(results_dir):
+    assert results_store.find("table") is None
+    results_store.write_rows("table", ROWS, 'jsonl')
+    results_store.write_rows("table", ROWS[:1], 'csv')
+    # A .csv left over from an older run must not hide the newer .jsonl
+    os.utime("table.csv", (1000, 1000))
+    assert results_store.find("table") == "table.jsonl"
+    assert results_store.read_rows("table") == ROWS
+    os.utime("table.jsonl", (500, 500))
+    assert results_store.read_rows("table") == ROWS[:1]
+    # Files written at the same time go in FORMATS order
+    os.utime("table.jsonl", (1000, 1000))
+    assert results_store.find("table") == "table.csv"
+
+
+def test_excel_exports_are_read_last(results_dir):
+    results_store.write_rows("table", ROWS, 'jsonl')
+    (results_dir / "table.xlsx").write_bytes(b"")
+    assert results_store.find("table") == "table.jsonl"
+    os.remove("table.jsonl")
+    assert results_store.find("table") == "table.xlsx"
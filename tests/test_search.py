@@ -0,0 +1,194 @@
+import pytest
+
+import AI_expectimax
+import logic
+import symmetry
+from conftest import random_boards
+from search_stats import SearchStats
+from transposition import TranspositionTable
+
+STRATEGIES = ['empty_tile', 'smoothness', 'monotonicity', 'merge_opportunities', 'max_score']
+# Heuristics whose evaluation is the same for every rotation and reflection
+SYMMETRIC_STRATEGIES = ['empty_tile', 'smoothness', 'max_score']
+DEPTHS = {3: 3, 4: 2, 5: 2}
+
+
+def spawns(matrix):
+    """(probability weight, board) of every spawn on a list-of-lists board, in the order the search visits them."""
+    for i, row in enumerate(matrix):
+        for j, value in enumerate(row):
+            if not value:
+                for tile, weight in ((2, 0.9), (4, 0.1)):
+                    child = [list(r) for r in matrix]
+                    child[i][j] = tile
+                    yield weight, child
+
+
+def reference_expectimax(matrix, depth, is_max, evaluate):
+    """Expectimax on list-of-lists boards with logic's moves and game_state."""
+    if depth == 0 or logic.game_state(matrix) == 'win':
+        return evaluate(matrix)
+    if is_max:
+        scores = [reference_expectimax(new, depth - 1, False, evaluate) for _, new, _ in logic.legal_moves(matrix)]
+        return max(scores) if scores else evaluate(matrix)
+    children = list(spawns(matrix))
+    if not children:
+        return evaluate(matrix)
+    total = 0
+    for weight, child in children:
+        total += weight * reference_expectimax(child, depth - 1, True, evaluate)
+    return total / (len(children) // 2)
+
+
+def reference_pruned(matrix, depth, probability, is_max, threshold, evaluate):
+    if is_max:
+        if depth == 0 or logic.game_state(matrix) == 'win':
+            return evaluate(matrix)
+        scores = [reference_pruned(new, depth - 1, probability, False, threshold, evaluate)
+                  for _, new, _ in logic.legal_moves(matrix)]
+        return max(scores) if scores else evaluate(matrix)
+    if probability < threshold:
+        return evaluate(matrix)
+    children = list(spawns(matrix))
+    if not children:
+        return evaluate(matrix)
+    cells = len(children) // 2
+    total = 0
+    for weight, child in children:
+        total += weight * reference_pruned(child, depth, probability * weight / cells, True, threshold, evaluate)
+    return total / cells
+
+
+def search_positions(size):
+    # Mid-game boards: some empty cells, so that the chance nodes have work to do
+    tiles = (0, 0, 0, 2, 2, 4, 8, 16, 32)
+    return [board for board in random_boards(size, 40, seed=2, tiles=tiles) if 0 < sum(row.count(0) for row in board)
+            and logic.legal_moves(board)][:4]
+
+
+def root_scores(board, depth, **kwargs):
+    stats = SearchStats()
+    move = AI_expectimax.expectimax_decision(board, depth, stats=stats, **kwargs)
+    return move, {key: result['score'] for key, result in stats.iterations[0]['root_moves'].items()}
+
+
+def best(scores):
+    best_move = None
+    best_score = -float('inf')
+    for move, score in scores.items():
+        if score > best_score:
+            best_move, best_score = move, score
+    return best_move
+
+
+@pytest.mark.parametrize("size", sorted(DEPTHS))
+def test_search_matches_the_list_reference(load_heuristics, size):
+    evaluate = load_heuristics(STRATEGIES).evaluate_unweighted
+    depth = DEPTHS[size]
+    for board in search_positions(size):
+        expected = {key: reference_expectimax(new, depth - 1, False, evaluate) for key, new, _ in logic.legal_moves(board)}
+        move, scores = root_scores(board, depth)
+        assert scores == pytest.approx(expected, rel=1e-12)
+        assert move == best(expected)
+
+
+@pytest.mark.parametrize("size", sorted(DEPTHS))
+def test_pruned_search_matches_the_list_reference(load_heuristics, size):
+    evaluate = load_heuristics(STRATEGIES).evaluate_unweighted
+    for board in search_positions(size):
+        expected = {key: reference_pruned(new, 1, 1.0, False, 0.05, evaluate) for key, new, _ in logic.legal_moves(board)}
+        move, scores = root_scores(board, 2, prob_threshold=0.05)
+        assert scores == pytest.approx(expected, rel=1e-12)
+        assert move == best(expected)
+
+
+@pytest.mark.parametrize("strategies", [STRATEGIES, SYMMETRIC_STRATEGIES])
+def test_transposition_table_keeps_the_scores(load_heuristics, strategies):
+    load_heuristics(strategies)
+    for board in search_positions(4):
+        table = TranspositionTable(10000)
+        move, scores = root_scores(board, 4)
+        assert root_scores(board, 4, table=table) == (move, pytest.approx(scores, rel=1e-12))
+        assert table.hits > 0
+        assert root_scores(board, 2, prob_threshold=0.01, table=table)[1] == pytest.approx(
+            root_scores(board, 2, prob_threshold=0.01)[1], rel=1e-12)
+
+
+def test_symmetric_search_scores_every_symmetry_the_same(load_heuristics):
+    load_heuristics(SYMMETRIC_STRATEGIES)
+    for board in search_positions(4):
+        move, scores = root_scores(board, 2)
+        for transform_id in symmetry.TRANSFORMS:
+            transformed = symmetry.transform_matrix(board, transform_id)
+            _, transformed_scores = root_scores(transformed, 2)
+            assert transformed_scores == pytest.approx(
+                {symmetry.move_to_canonical(key, transform_id): score for key, score in scores.items()}, rel=1e-12)
+
+
+def test_pool_search_matches_the_serial_search(load_heuristics):
+    load_heuristics(STRATEGIES)
+    executor = AI_expectimax.make_executor(2)
+    try:
+        for size in (3, 4, 5):
+            for board in search_positions(size)[:2]:
+                assert root_scores(board, 2, executor=executor) == root_scores(board, 2)
+    finally:
+        executor.shutdown()
+
+
+def test_pruned_search_with_a_filled_table(load_heuristics):
+    load_heuristics(STRATEGIES)
+    for board in search_positions(4)[:2]:
+        # The boards after a move and a spawn, searched first as roots, come back with a lower path probability
+        table = TranspositionTable(100000)
+        for _, new, _ in logic.legal_moves(board):
+            for _, child in spawns(new):
+                AI_expectimax.expectimax_pruned(child, 2, 1.0, True, 0.05, table)
+        assert root_scores(board, 3, prob_threshold=0.05, table=table) == root_scores(board, 3, prob_threshold=0.05)
+        assert table.hits > 0
+
+
+def test_empty_transposition_table(load_heuristics):
+    load_heuristics(STRATEGIES)
+    board = search_positions(4)[0]
+    table = TranspositionTable(0)
+    assert root_scores(board, 3, table=table) == root_scores(board, 3)
+    assert len(table) == 0
+    assert table.stats()['hits'] == 0
+
+
+def test_ai_moves_with_and_without_a_pool(load_heuristics):
+    import AI_both
+    import simulator
+
+    def play(ai):
+        records = []
+        ai.stats_sink = records.append
+        moves = [ai.get_move(board) for board in boards]
+        return moves, [{move: result['score'] for move, result in record['iterations'][0]['root_moves'].items()}
+                       for record in records]
+
+    load_heuristics(STRATEGIES)
+    boards = []
+    # The boards of a game, which the AI searches one after another with the same table
+    simulator.Simulator(AI_both.AI(depth=2, opening_book=None), on_step=boards.append).play_game(1, seed=3)
+    boards = boards[:40]
+    executor = AI_expectimax.make_executor(2)
+    try:
+        for depth, prob_threshold in ((3, None), (2, 0.01)):
+            serial = AI_both.AI(depth=depth, prob_threshold=prob_threshold, opening_book=None)
+            parallel = AI_both.AI(depth=depth, prob_threshold=prob_threshold, executor=executor, opening_book=None)
+            assert play(serial) == play(parallel)
+    finally:
+        executor.shutdown()
+
+
+def test_no_move_on_a_lost_board(load_heuristics):
+    load_heuristics(STRATEGIES)
+    assert AI_expectimax.expectimax_decision([[2, 4, 2, 4], [4, 2, 4, 2], [2, 4, 2, 4], [4, 2, 4, 2]], 2) is None
+
+
+def test_deadline(load_heuristics):
+    load_heuristics(STRATEGIES)
+    with pytest.raises(AI_expectimax.SearchTimeout):
+        AI_expectimax.expectimax_decision(search_positions(4)[0], 4, deadline=0)
@@ -0,0 +1,106 @@
+import itertools
+import math
+import random
+
+import pytest
+
+import racing
+import results_store
+import weight_search
+
+
+def make_play(strengths, tiles=None, calls=None):
+    """A ``play`` function whose game n has the same luck for every candidate, plus a little of its own."""
+    def record(candidate, game):
+        luck = random.Random(game).gauss(5000, 1500)
+        own = random.Random(f"{candidate}/{game}").gauss(0, 100)
+        tile = (tiles or {}).get(candidate, 512)
+        return {'Game': game, 'Total Score': luck + strengths[candidate] + own,
+                'Max Tile': tile * 2 if game % 97 == 0 else tile}
+
+    def play(candidates, first_game, games):
+        if calls is not None:
+            calls.append((list(candidates), first_game, games))
+        return {candidate: [record(candidate, game) for game in range(first_game, first_game + games)]
+                for candidate in candidates}
+    return play
+
+
+def test_compositions():
+    for total, parts in ((0, 1), (3, 2), (10, 3), (10, 5)):
+        found = list(weight_search.compositions(total, parts))
+        assert len(found) == math.comb(total + parts - 1, parts - 1)
+        assert found == sorted(found)
+        assert all(sum(parts_) == total for parts_ in found)
+
+
+def test_weight_grid_matches_the_filtered_product():
+    values = [step / 10 for step in range(11)]
+    expected = [weights for weights in itertools.product(values, repeat=3) if math.isclose(sum(weights), 1)]
+    assert weight_search.weight_grid(3) == expected
+
+
+def test_successive_halving_finds_the_best_candidate():
+    strengths = {candidate: 40 * candidate for candidate in range(12)}
+    rounds = []
+    best, records, used = weight_search.successive_halving(
+        list(strengths), make_play(strengths), 600, on_round=lambda *args: rounds.append(args[1][:]))
+    assert best == 11
+    assert used <= 600
+    assert sum(len(games) for games in records.values()) == used
+    # Survivors keep their earlier games and continue with the next game numbers
+    assert [record['Game'] for record in records[best]] == list(range(1, len(records[best]) + 1))
+    # Every round keeps the best third, ranked on the mean score
+    assert [len(survivors) for survivors in rounds] == [12, 4, 2, 1]
+    assert rounds[1] == [11, 10, 9, 8]
+
+
+def test_successive_halving_needs_a_game_per_candidate():
+    with pytest.raises(ValueError):
+        weight_search.successive_halving(list(range(10)), make_play({n: 0 for n in range(10)}), 5)
+
+
+def test_race_drops_the_weak_candidates():
+    strengths = {candidate: 300 * candidate for candidate in range(6)}
+    calls = []
+    records, used = racing.race(list(strengths), make_play(strengths, calls=calls), keep=2, max_games=400)
+    survivors = [candidate for candidate, games in records.items() if len(games) == 400]
+    assert survivors == [4, 5]
+    assert used < 6 * 400
+    assert used == sum(len(games) for games in records.values())
+    # Survivors play the same games as without racing
+    full = make_play(strengths)(survivors, 1, 400)
+    assert all(records[candidate] == full[candidate] for candidate in survivors)
+    assert calls[0] == (list(strengths), 1, 50)
+
+
+def test_race_keeps_candidates_it_cannot_separate():
+    strengths = {candidate: 0 for candidate in range(5)}
+    records, used = racing.race(list(strengths), make_play(strengths), keep=2, max_games=200)
+    assert used == 5 * 200
+
+
+def test_race_on_the_rate_of_reaching_a_tile():
+    # The candidates that reach 2048 have the lowest scores; raced on reaching it they must survive
+    strengths = {candidate: 300 * candidate for candidate in range(5)}
+    tiles = {0: 2048, 1: 2048}
+    dropped = []
+    records, used = racing.race(list(strengths), make_play(strengths, tiles), keep=2, max_games=400,
+                                score=racing.reached(2048), on_round=lambda played, alive, out: dropped.extend(out))
+    assert sorted(dropped) == [2, 3, 4]
+    assert [len(records[candidate]) for candidate in strengths] == [400, 400, 50, 50, 50]
+
+
+def test_run_simulation_drops_a_worse_strategy(results_dir, monkeypatch):
+    import optimize_strategies
+
+    strategies = ['weak', 'a', 'b', 'c', 'd', 'e']
+    strengths = {'weak': -1000, 'a': 0, 'b': 100, 'c': 200, 'd': 300, 'e': 400}
+    play = make_play(strengths)
+    monkeypatch.setattr(optimize_strategies, 'play_strategy_batch',
+                        lambda strategy, games, seed, first_game: play([strategy], first_game, games)[strategy])
+    # The defaults: 1000 games, the top 5 kept, rounds of 50, 100, 200 and 400 games
+    optimize_strategies.run_simulation(strategies)
+    games = {row['Strategy']: row['Games'] for row in results_store.read_rows("aggregated_simulation_results")}
+    assert games['weak'] < 1000
+    assert all(games[strategy] == 1000 for strategy in strategies[1:])
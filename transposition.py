@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+# How many of the oldest entries the 'depth' policy looks at to pick a victim
+DEPTH_SCAN_WINDOW = 8
+
+
+class TranspositionTable:
+    """Bounded cache of expectimax values keyed by board hash and node type.
+
+    An entry stores the remaining depth it was searched at, and a lookup
+    succeeds for any entry searched at an equal or greater depth.
+    When the table is full, 'lru' evicts the least recently used entry and
+    'depth' evicts the shallowest of the least recently used entries.
+    With ``exact_depth`` a lookup only succeeds for the very same depth, so a
+    cached search returns exactly what an uncached one would.
+    A table of ``max_entries`` <= 0 caches nothing.
+    """
+
+    def __init__(self, max_entries=200000, replacement='lru', exact_depth=False):
+        if replacement not in ('lru', 'depth'):
+            raise ValueError(f"Unknown replacement policy: {replacement}")
+        self.max_entries = max_entries
+        self.replacement = replacement
+        self.exact_depth = exact_depth
+        self.entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def clear(self):
+        self.entries.clear()
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key, depth):
+        """Return the cached score for ``key`` if it was searched at least ``depth`` deep, else None."""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth or (self.exact_depth and entry[0] != depth):
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def store(self, key, depth, score):
+        if self.max_entries <= 0:
+            return
+        entry = self.entries.get(key)
+        if entry is not None:
+            # Never overwrite a deeper result with a shallower one, unless only exact depths are reused
+            if self.exact_depth or entry[0] <= depth:
+                self.entries[key] = (depth, score)
+            self.entries.move_to_end(key)
+            return
+        if len(self.entries) >= self.max_entries:
+            self._evict()
+        self.entries[key] = (depth, score)
+
+    def _evict(self):
+        if self.replacement == 'lru':
+            self.entries.popitem(last=False)
+        else:
+            victim = None
+            victim_depth = None
+            for n, (key, entry) in enumerate(self.entries.items()):
+                if n >= DEPTH_SCAN_WINDOW:
+                    break
+                if victim is None or entry[0] < victim_depth:
+                    victim = key
+                    victim_depth = entry[0]
+            del self.entries[victim]
+        self.evictions += 1
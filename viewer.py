@@ -0,0 +1,190 @@
+import queue
+import threading
+import time
+import tkinter as tk
+from tkinter import Frame
+import constants as c
+
+# Boards computed ahead of the one on screen; the worker waits once the queue is full
+DEFAULT_LOOKAHEAD = 64
+# Most redraws per second; boards that arrive faster are only drawn when they are the latest
+DEFAULT_FPS = 30
+
+# Kinds of the items the worker puts in its queue
+FRAME = 'frame'
+GAME_OVER = 'game over'
+FINISHED = 'finished'
+
+
+class MoveWorker(threading.Thread):
+    """Plays the games of a Simulator in a background thread.
+
+    Every board is put in ``frames`` as (kind, board, record): a FRAME after
+    every move, a GAME_OVER with the final board and the record of a game,
+    and a FINISHED at the end. At most ``lookahead`` items wait in the queue;
+    in fast-forward mode the worker does not wait for the viewer and skips
+    the FRAMEs that do not fit, so the viewer never slows the games down.
+    """
+
+    def __init__(self, simulator, lookahead=DEFAULT_LOOKAHEAD, fast_forward=False):
+        threading.Thread.__init__(self, daemon=True)
+        self.simulator = simulator
+        self.frames = queue.Queue(maxsize=lookahead)
+        self.fast_forward = fast_forward
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        simulator = self.simulator
+        for game in range(1, simulator.run_count + 1):
+            simulator.new_game()
+            self._put(FRAME, simulator.matrix)
+            while simulator.step():
+                if self.stopped.is_set():
+                    return
+                self._put(FRAME, simulator.matrix)
+            self._put(GAME_OVER, simulator.matrix, simulator.result(game))
+        self._put(FINISHED)
+
+    def _put(self, kind, matrix=None, record=None):
+        # The viewer gets its own copy; the simulator's board belongs to this thread
+        item = (kind, [list(row) for row in matrix] if matrix is not None else None, record)
+        if kind == FRAME and self.fast_forward:
+            try:
+                self.frames.put_nowait(item)
+            except queue.Full:
+                pass  # The viewer shows a later board instead
+            return
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+# Tile value -> (text, background, foreground) of its Label, built on first use
+_cell_styles = {}
+
+
+def cell_style(value):
+    """The (text, bg, fg) Label options of a cell holding ``value``."""
+    style = _cell_styles.get(value)
+    if style is None:
+        if value == 0:
+            style = ("", c.BACKGROUND_COLOR_CELL_EMPTY, c.CELL_COLOR_DICT[2])
+        else:
+            style = (str(value), c.BACKGROUND_COLOR_DICT.get(value, "#3c3a32"), c.CELL_COLOR_DICT.get(value, "#f9f6f2"))
+        _cell_styles[value] = style
+    return style
+
+
+class GameGrid(Frame):
+    """Tk window that shows the games of a Simulator while a MoveWorker plays them.
+
+    The viewer is optional: the Simulator runs the same games without it.
+    The AI runs in the worker thread, so a long search never freezes the
+    window. Every ``delay`` milliseconds the window shows the next board; in
+    fast-forward mode (toggled with the F key) it shows only the newest one.
+    The grid is redrawn at most ``fps`` times per second, and only the cells
+    whose value changed are reconfigured.
+    ``on_game_over(record)`` is called after every game and
+    ``on_finished(results)`` once all ``simulator.run_count`` games are done.
+    """
+
+    def __init__(self, simulator, delay=1, on_game_over=None, on_finished=None, master=None,
+                 lookahead=DEFAULT_LOOKAHEAD, fast_forward=False, fps=DEFAULT_FPS):
+        Frame.__init__(self, master)
+        self.grid()
+        self.master.title('2048')
+        self.grid_cells = []
+        self.simulator = simulator
+        self.delay = delay  # delay in milliseconds, use with after()
+        self.on_game_over = on_game_over
+        self.on_finished = on_finished
+        self.all_results = []
+        self.current_game = 0
+        self.matrix = [[0] * simulator.size for _ in range(simulator.size)]
+        # Values the Labels show now; None forces the first draw of every cell
+        self.shown = [[None] * simulator.size for _ in range(simulator.size)]
+        self.frame_interval = 1 / fps
+        self.last_draw = 0.0
+        self.dirty = False
+        self.fast_forward = fast_forward
+        self.worker = MoveWorker(simulator, lookahead, fast_forward)
+        self.init_grid()
+        self.update_grid_cells()
+        self.master.bind('<f>', lambda event: self.set_fast_forward(not self.fast_forward))
+        self.bind('<Destroy>', lambda event: self.worker.stop())
+        self.worker.start()
+        self.after(self.delay, self.show_next_frame)
+
+    def set_fast_forward(self, fast_forward):
+        self.fast_forward = fast_forward
+        self.worker.fast_forward = fast_forward
+
+    def init_grid(self):
+        background = Frame(self, bg=c.BACKGROUND_COLOR_GAME, width=c.SIZE, height=c.SIZE)
+        background.grid()
+        for i in range(self.simulator.size):
+            grid_row = []
+            for j in range(self.simulator.size):
+                cell = Frame(background, bg=c.BACKGROUND_COLOR_CELL_EMPTY, width=c.SIZE / self.simulator.size, height=c.SIZE / self.simulator.size)
+                cell.grid(row=i, column=j, padx=c.GRID_PADDING, pady=c.GRID_PADDING)
+                t = tk.Label(master=cell, text="", bg=c.BACKGROUND_COLOR_CELL_EMPTY, justify=tk.CENTER, font=c.FONT, width=4, height=2)
+                t.grid()
+                grid_row.append(t)
+            self.grid_cells.append(grid_row)
+
+    def update_grid_cells(self):
+        """Reconfigure the cells whose value differs from the one on screen; returns how many changed."""
+        changed = 0
+        for i, (row, shown) in enumerate(zip(self.matrix, self.shown)):
+            for j, new_number in enumerate(row):
+                if new_number != shown[j]:
+                    text, bg, fg = cell_style(new_number)
+                    self.grid_cells[i][j].configure(text=text, bg=bg, fg=fg)
+                    shown[j] = new_number
+                    changed += 1
+        # Tk repaints the changed Labels when it is next idle
+        self.last_draw = time.perf_counter()
+        self.dirty = False
+        return changed
+
+    def show_next_frame(self):
+        """Take the boards the worker has played since the last call and show the latest one."""
+        matrix = None
+        finished = False
+        while True:
+            try:
+                kind, board, record = self.worker.frames.get_nowait()
+            except queue.Empty:
+                break
+            if board is not None:
+                matrix = board
+            if kind == GAME_OVER:
+                self.game_over(record)
+            elif kind == FINISHED:
+                finished = True
+                break
+            if not self.fast_forward:
+                break  # One board per frame
+        if matrix is not None:
+            self.matrix = matrix
+            self.dirty = True
+        # Boards that come faster than the frame rate are coalesced into the next redraw
+        if self.dirty and (finished or time.perf_counter() - self.last_draw >= self.frame_interval):
+            self.update_grid_cells()
+        if finished:
+            if self.on_finished is not None:
+                self.on_finished(self.all_results)
+            return
+        self.after(self.delay, self.show_next_frame)  # Schedule the next frame
+
+    def game_over(self, record):
+        self.all_results.append(record)
+        self.current_game += 1
+        if self.on_game_over is not None:
+            self.on_game_over(record)
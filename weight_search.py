@@ -0,0 +1,77 @@
+import math
+
+# Search stages for the weights of the top strategies. A stage gets the
+# candidate weight vectors and a ``play(candidates, first_game, games)``
+# function that plays games ``first_game`` .. ``first_game + games - 1`` of
+# every candidate and returns {candidate: [records]}. Every candidate plays
+# the same seeded games, so they are compared on the same tile spawns.
+
+
+def compositions(total, parts):
+    """Every tuple of ``parts`` non-negative ints that sum to ``total``, in lexicographic order."""
+    if parts == 1:
+        yield (total,)
+        return
+    for first in range(total + 1):
+        for rest in compositions(total - first, parts - 1):
+            yield (first,) + rest
+
+
+def weight_grid(count, steps=10):
+    """Every weight vector of ``count`` multiples of 1/steps that sum to 1.
+
+    The vectors are built directly, in the order of the former filtered
+    itertools.product over 0.0, 0.1, ..., 1.0.
+    """
+    return [tuple(part / steps for part in parts) for parts in compositions(steps, count)]
+
+
+def mean_score(records):
+    return sum(record['Total Score'] for record in records) / len(records)
+
+
+def grid_search(candidates, play, games):
+    """Play ``games`` games with every candidate."""
+    results = play(candidates, 1, games)
+    return {candidate: results[candidate] for candidate in candidates}
+
+
+def successive_halving(candidates, play, budget, eta=3, score=mean_score, on_round=None):
+    """Spend about ``budget`` games, keeping the best 1/eta of the candidates after every round.
+
+    The budget is split evenly over the ceil(log_eta(n)) rounds, so the few
+    candidates that survive to the end play many more games than the
+    first-round field. Survivors keep the games of the earlier rounds and
+    continue with the next game numbers. ``on_round(round, survivors, games,
+    records)`` is called after every round.
+
+    Returns (best candidate, {candidate: records}, games played).
+    """
+    survivors = list(candidates)
+    if budget < len(survivors):
+        raise ValueError(f"A budget of {budget} games cannot play each of the {len(survivors)} candidates once")
+    records = {candidate: [] for candidate in survivors}
+    rounds = max(1, math.ceil(math.log(len(survivors), eta))) if len(survivors) > 1 else 1
+    games_per_round = budget / rounds
+    used = 0
+    round_number = 0
+    while True:
+        games = max(1, int(games_per_round // len(survivors)))
+        games = min(games, (budget - used) // len(survivors))
+        if games == 0:
+            break
+        first_game = len(records[survivors[0]]) + 1
+        results = play(survivors, first_game, games)
+        for candidate in survivors:
+            records[candidate].extend(results[candidate])
+        used += games * len(survivors)
+        round_number += 1
+        # Stable sort: ties keep the order of the candidates
+        survivors.sort(key=lambda candidate: score(records[candidate]), reverse=True)
+        if on_round is not None:
+            on_round(round_number, survivors, games, records)
+        if len(survivors) == 1:
+            break
+        survivors = survivors[:max(1, math.ceil(len(survivors) / eta))]
+    best = max(survivors, key=lambda candidate: score(records[candidate]))
+    return best, records, used